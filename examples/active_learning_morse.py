@@ -0,0 +1,81 @@
+"""Active learning of an energy-gradient ensemble with a Morse potential in place of quantum chemistry.
+
+Trains two models on a few geometries near equilibrium, then scores a memory-mapped file of distorted candidate
+geometries by the ensemble uncertainty, labels a diverse selection with the analytic potential and retrains. Usage:
+
+    python active_learning_morse.py --directory TestActiveLearning/ --candidates 1000000 --iterations 3
+"""
+import os
+import copy
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Active learning with an analytic potential.')
+parser.add_argument("--directory", default="TestActiveLearning", help="Directory of the ensemble")
+parser.add_argument("--candidates", default=100000, type=int, help="Number of candidate geometries")
+parser.add_argument("--iterations", default=3, type=int, help="Number of active learning iterations")
+parser.add_argument("--num_select", default=20, type=int, help="Number of geometries to label per iteration")
+parser.add_argument("--threshold", default=0.05, type=float, help="Minimum uncertainty of selected geometries")
+parser.add_argument("--epochs", default=100, type=int, help="Number of epochs of each fit")
+args = vars(parser.parse_args())
+
+from pyNNsMD.src.device import set_gpu
+
+set_gpu([-1])
+
+from pyNNsMD.NNsMD import NeuralNetEnsemble
+from pyNNsMD.hypers.hyper_mlp_eg import DEFAULT_HYPER_PARAM_ENERGY_GRADS
+from pyNNsMD.src.active import ActiveLearning, MorsePotential
+
+rng = np.random.default_rng(0)
+potential = MorsePotential(states=2, distance=1.5)
+equilibrium = np.array([[0.0, 0.0, 0.0], [1.5, 0.0, 0.0], [0.75, 1.3, 0.0], [0.75, 0.43, 1.22]])
+
+
+def distort(num, scale):
+    return equilibrium[None] + rng.normal(scale=scale, size=(num,) + equilibrium.shape)
+
+
+hyper = copy.deepcopy(DEFAULT_HYPER_PARAM_ENERGY_GRADS)
+hyper["model"]["config"].update({"atoms": 4, "states": 2, "nn_size": 50, "depth": 2})
+hyper["training"].update({"epo": args["epochs"], "epostep": 10, "batch_size": 32})
+
+nn = NeuralNetEnsemble(args["directory"], 2)
+nn.create(models=[hyper["model"]] * 2, scalers=[hyper["scaler"]] * 2)
+nn.save()
+geos = distort(200, 0.05)
+labels = potential(geos)
+nn.data(geometries=geos, energies=labels["energies"], forces=labels["forces"])
+nn.train_test_split(dataset_size=len(geos), n_splits=5)
+nn.training([hyper["training"]] * 2, fit_mode="training")
+print("Initial fit:", nn.fit(["training_mlp_eg"] * 2, fit_mode="training"))
+
+# Candidates are streamed from disk in batches and only the most uncertain ones are kept in memory.
+candidates_path = os.path.join(args["directory"], "candidates.npy")
+candidates = np.lib.format.open_memmap(candidates_path, mode="w+", dtype="float64",
+                                       shape=(args["candidates"],) + equilibrium.shape)
+for start in range(0, args["candidates"], 65536):
+    candidates[start:start + 65536] = distort(len(candidates[start:start + 65536]), 0.07)
+candidates.flush()
+candidates = np.load(candidates_path, mmap_mode="r")
+
+active = ActiveLearning(nn, oracle=potential, training_scripts=["training_mlp_eg"] * 2, threshold=args["threshold"],
+                        num_select=args["num_select"], batch_size=8192, max_candidates=5000, random_state=0)
+test_geos = distort(1000, 0.07)
+test_labels = potential(test_geos)
+
+
+def test_error():
+    y = nn.predict(test_geos, verbose=0)
+    return [np.mean(np.abs(np.mean([y_i[k] for y_i in y], axis=0) - test_labels[key]))
+            for k, key in enumerate(["energies", "forces"])]
+
+
+print("Test MAE energy %.4f gradient %.4f" % tuple(test_error()))
+for i in range(args["iterations"]):
+    info = active.step(candidates)
+    if len(info["selected"]) == 0:
+        print("No candidates above threshold.")
+        break
+    print("Iteration %s: %s of %s above threshold, max score %.4f, selected %s, test MAE energy %.4f gradient %.4f" % (
+        i, info["num_above_threshold"], info["num_scored"], info["max_score"], len(info["selected"]), *test_error()))
@@ -0,0 +1,50 @@
+"""Wall time of parallel ensemble fits on a CPU node with core partitioning compared to naive oversubscription.
+
+Usage:
+
+    python benchmark_cpu_partition.py --models 4 8 --epochs 20
+
+"""
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark cpu partitioning for parallel fits.')
+parser.add_argument("--models", default=[4, 8], type=int, nargs="+", help="Number of models in ensemble")
+parser.add_argument("--epochs", default=20, type=int, help="Number of epochs")
+parser.add_argument("--cores_per_model", default=None, type=int, help="Cores for each model")
+args = vars(parser.parse_args())
+
+from pyNNsMD.src.device import set_gpu, get_available_cpus, get_cpu_partition
+set_gpu([-1])
+
+from pyNNsMD.NNsMD import NeuralNetEnsemble
+from pyNNsMD.hypers.hyper_mlp_eg import DEFAULT_HYPER_PARAM_ENERGY_GRADS as hyper
+
+atoms = [["C", "C", "H", "H", "C", "F", "F", "F", "C", "F", "H", "H"]]*2701
+geos = np.load("butene/butene_x.npy")
+energy = np.load("butene/butene_energy.npy")
+grads = np.load("butene/butene_force.npy")
+
+hyper["model"]["config"].update({"atoms": 12, "states": 2, "model_module": "mlp_eg"})
+hyper["training"].update({"epo": args["epochs"], "epostep": args["epochs"], "callbacks": []})
+print("Available cpus:", len(get_available_cpus()))
+
+for num_models in args["models"]:
+    nn = NeuralNetEnsemble("TestCpuPartition/", num_models)
+    nn.create(models=[hyper["model"]]*num_models, scalers=[hyper["scaler"]]*num_models)
+    nn.save()
+    nn.data(atoms=atoms, geometries=geos, energies=energy, forces=grads)
+    nn.train_test_split(dataset_size=len(energy), n_splits=5)
+    nn.training([hyper["training"]]*num_models, fit_mode="training")
+
+    start = time.perf_counter()
+    nn.fit(["training_mlp_eg"]*num_models, fit_mode="training", proc_async=True)
+    time_naive = time.perf_counter() - start
+
+    cpu_dist = get_cpu_partition(num_models, cores_per_model=args["cores_per_model"])
+    start = time.perf_counter()
+    nn.fit(["training_mlp_eg"]*num_models, fit_mode="training", proc_async=True, cpu_dist=cpu_dist)
+    time_partition = time.perf_counter() - start
+    print("%3s models, oversubscribed: %8.1f s, %s core sets of %s cores: %8.1f s" % (
+        num_models, time_naive, len(cpu_dist), len(cpu_dist[0]), time_partition))
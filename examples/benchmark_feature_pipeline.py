@@ -0,0 +1,89 @@
+"""Peak memory and throughput of the feature pipelines "precompute", "stream" and "cache" for training.
+
+Larger molecules are emulated by copies of butene that are shifted in space. Each pipeline runs in a separate process
+to measure its peak memory. Usage:
+
+    python benchmark_feature_pipeline.py --copies 1 4 --epochs 3
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import resource
+import argparse
+import subprocess
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark feature pipelines for precomputed feature training.')
+parser.add_argument("--copies", default=[1, 4], type=int, nargs="+", help="Number of butene copies per molecule")
+parser.add_argument("--epochs", default=3, type=int, help="Number of epochs")
+parser.add_argument("--batch_size", default=64, type=int, help="Batch size")
+parser.add_argument("--pipelines", default=["precompute", "stream", "cache"], nargs="+", help="Pipelines to compare")
+parser.add_argument("--run", default=None, help="Internal: run a single pipeline")
+
+
+def run_pipeline(pipeline, copies, epochs, batch_size):
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+    from pyNNsMD.models.mlp_eg import EnergyGradientModel
+    from pyNNsMD.scaler.energy import EnergyGradientStandardScaler
+    from pyNNsMD.datasets.store import save_dataset
+    from pyNNsMD.datasets.access import IndexedDataset
+    from pyNNsMD.datasets.pipeline import make_feature_input
+
+    geos = np.load("butene/butene_x.npy")
+    energy = np.load("butene/butene_energy.npy")
+    grads = np.load("butene/butene_force.npy")
+    geos = np.concatenate([geos + np.array([[10.0 * i, 0.0, 0.0]]) for i in range(copies)], axis=1)
+    grads = np.concatenate([grads] * copies, axis=2)
+    directory = os.path.realpath("TestFeaturePipeline_%s" % copies)
+    if not os.path.exists(directory):
+        save_dataset(directory, geometries=geos, energies=energy, forces=grads)
+
+    dataset = IndexedDataset.from_directory(directory, ["geometries", "energies", "forces"])
+    i_train, i_val = np.arange(len(dataset))[:int(0.8 * len(dataset))], np.arange(len(dataset))[int(0.8 * len(dataset)):]
+    data_train, data_val = dataset.subset(i_train), dataset.subset(i_val)
+    model = EnergyGradientModel(atoms=geos.shape[1], states=energy.shape[1], invd_index=True, model_module="mlp_eg")
+    model.precomputed_features = True
+    model.output_as_dict = True
+    scaler = EnergyGradientStandardScaler()
+    scaler.fit(data_train["geometries"], [data_train["energies"], data_train["forces"]])
+
+    def scale(batch):
+        return scaler.transform(batch["geometries"], [batch["energies"], batch["forces"]])
+
+    start = time.perf_counter()
+    fit_data, _, _ = make_feature_input(data_train, data_val, model, scale, batch_size=batch_size, pipeline=pipeline,
+                                        cache_dir=os.path.join(directory, "feature_cache"),
+                                        target_names=["energy", "force"])
+    time_prepare = time.perf_counter() - start
+    model.compile(optimizer=tf.keras.optimizers.Adam(), loss={'energy': 'mean_squared_error',
+                                                              'force': 'mean_squared_error'})
+    start = time.perf_counter()
+    model.fit(**fit_data, epochs=epochs, verbose=0)
+    time_fit = time.perf_counter() - start
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"prepare": time_prepare, "fit": time_fit, "samples_per_second": epochs * len(i_train) / time_fit,
+            "peak_memory": peak_memory}
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    if args["run"] is not None:
+        copies = args["copies"][0]
+        result = run_pipeline(args["run"], copies, args["epochs"], args["batch_size"])
+        print(json.dumps(result))
+        sys.exit(0)
+
+    for copies in args["copies"]:
+        for pipeline in args["pipelines"]:
+            out = subprocess.run([sys.executable, __file__, "--run", pipeline, "--copies", str(copies),
+                                  "--epochs", str(args["epochs"]), "--batch_size", str(args["batch_size"])],
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().split("\n")[-1])
+            print("%3s atoms, %10s: prepare %7.1f s, fit %7.1f s, %8.0f samples/s, peak memory %8.0f MB" % (
+                12 * copies, pipeline, result["prepare"], result["fit"], result["samples_per_second"],
+                result["peak_memory"]))
+        shutil.rmtree("TestFeaturePipeline_%s" % copies, ignore_errors=True)
@@ -0,0 +1,57 @@
+"""Prediction and training step time of the gradient modes "batch_jacobian", "vjp" and "forward" of the
+energy-gradient model for different number of states. Usage:
+
+    python benchmark_gradient_mode.py --states 1 2 5 10 --batch_size 64
+"""
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark gradient modes of the energy-gradient model.')
+parser.add_argument("--states", default=[1, 2, 5, 10], type=int, nargs="+", help="Number of states")
+parser.add_argument("--modes", default=["batch_jacobian", "vjp", "forward"], nargs="+", help="Gradient modes")
+parser.add_argument("--atoms", default=12, type=int, help="Number of atoms")
+parser.add_argument("--batch_size", default=64, type=int, help="Batch size")
+parser.add_argument("--repeats", default=20, type=int, help="Number of timed steps")
+
+
+def time_function(function, repeats):
+    function()  # Trace and warm up.
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+    from pyNNsMD.models.mlp_eg import EnergyGradientModel
+
+    x = tf.constant(np.random.normal(size=(args["batch_size"], args["atoms"], 3)), dtype="float32")
+    for states in args["states"]:
+        y_energy = tf.zeros((args["batch_size"], states))
+        y_force = tf.zeros((args["batch_size"], states, args["atoms"], 3))
+        for mode in args["modes"]:
+            model = EnergyGradientModel(atoms=args["atoms"], states=states, invd_index=True, model_module="mlp_eg",
+                                        gradient_mode=mode)
+            optimizer = tf.keras.optimizers.Adam()
+
+            @tf.function
+            def predict_step():
+                return model(x, training=False)
+
+            @tf.function
+            def train_step():
+                with tf.GradientTape() as tape:
+                    energy, force = model(x, training=True)
+                    loss = tf.reduce_mean(tf.square(energy - y_energy)) + tf.reduce_mean(tf.square(force - y_force))
+                grads = tape.gradient(loss, model.trainable_variables)
+                optimizer.apply_gradients(zip(grads, model.trainable_variables))
+                return loss
+
+            time_predict = time_function(predict_step, args["repeats"])
+            time_train = time_function(train_step, args["repeats"])
+            print("%2s states, %14s: predict %7.2f ms, train step %7.2f ms" % (states, mode, time_predict, time_train))
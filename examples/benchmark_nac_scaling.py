@@ -0,0 +1,74 @@
+"""Time and peak memory of the NAC model for increasing number of atoms.
+
+Compares the diagonal NACs of `NACModel` from the jacobian of the hidden layer with respect to features with the
+previous evaluation, which computed the full jacobian of the virtual potential of shape
+(batch, states, atoms, atoms, 3) and took its diagonal. Each method runs in a separate process to measure its peak
+memory. Usage:
+
+    python benchmark_nac_scaling.py --atoms 12 24 48 96 --states 2 --batch_size 32
+"""
+import sys
+import time
+import json
+import resource
+import argparse
+import subprocess
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark NAC evaluation over number of atoms.')
+parser.add_argument("--atoms", default=[12, 24, 48, 96], type=int, nargs="+", help="Number of atoms")
+parser.add_argument("--states", default=2, type=int, help="Number of couplings")
+parser.add_argument("--batch_size", default=32, type=int, help="Batch size")
+parser.add_argument("--repeats", default=10, type=int, help="Number of timed steps")
+parser.add_argument("--run", default=None, help="Internal: run a single method")
+
+
+def run_method(method, atoms, states, batch_size, repeats):
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+    from pyNNsMD.models.mlp_nac import NACModel
+
+    model = NACModel(atoms=atoms, states=states, invd_index=True, model_module="mlp_nac")
+    x = tf.constant(np.random.default_rng(0).normal(size=(batch_size, atoms, 3)) * atoms ** (1 / 3), dtype="float32")
+
+    @tf.function
+    def call_diagonal():
+        return model(x, training=False)
+
+    @tf.function
+    def call_full_jacobian():
+        with tf.GradientTape() as tape:
+            tape.watch(x)
+            hidden = model.mlp_layer(model.std_layer(model.feat_layer(x), training=False), training=False)
+            virtual = tf.reshape(model.virt_layer(hidden), (-1, states, atoms))
+        grad = tape.batch_jacobian(virtual, x)
+        return tf.concat([tf.expand_dims(grad[:, :, i, i, :], axis=2) for i in range(atoms)], axis=2)
+
+    function = call_diagonal if method == "diagonal" else call_full_jacobian
+    out = function().numpy()  # Trace and warm up.
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    time_call = (time.perf_counter() - start) / repeats * 1000
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"time": time_call, "peak_memory": peak_memory, "checksum": float(np.sum(np.abs(out)))}
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    if args["run"] is not None:
+        result = run_method(args["run"], args["atoms"][0], args["states"], args["batch_size"], args["repeats"])
+        print(json.dumps(result))
+        sys.exit(0)
+
+    for atoms in args["atoms"]:
+        results = {}
+        for method in ["diagonal", "full"]:
+            out = subprocess.run([sys.executable, __file__, "--run", method, "--atoms", str(atoms),
+                                  "--states", str(args["states"]), "--batch_size", str(args["batch_size"]),
+                                  "--repeats", str(args["repeats"])], capture_output=True, text=True, check=True)
+            results[method] = json.loads(out.stdout.strip().split("\n")[-1])
+        print("%3s atoms: diagonal %8.2f ms, peak memory %6.0f MB; full jacobian %8.2f ms, peak memory %6.0f MB" % (
+            atoms, results["diagonal"]["time"], results["diagonal"]["peak_memory"], results["full"]["time"],
+            results["full"]["peak_memory"]))
@@ -0,0 +1,65 @@
+"""Throughput of padding molecules to SchNet input with :obj:`pyNNsMD.utils.padding` compared to a loop per molecule.
+
+Molecules either have a fixed number of atoms or a random number of atoms within a range. Usage:
+
+    python benchmark_padding.py --molecules 1000 10000 --atoms 8 32
+"""
+import time
+import argparse
+import numpy as np
+
+from pyNNsMD.utils.padding import pack_schnet_input
+
+parser = argparse.ArgumentParser(description='Benchmark padding of molecules to batch arrays.')
+parser.add_argument("--molecules", default=[1000, 10000], type=int, nargs="+", help="Number of molecules")
+parser.add_argument("--atoms", default=[8, 32], type=int, nargs=2, help="Range of number of atoms")
+parser.add_argument("--neighbours", default=10, type=int, help="Number of neighbours per atom")
+
+
+def pad_loop(values):
+    max_shape = np.amax([x.shape for x in values], axis=0)
+    final_shape = np.concatenate([np.array([len(values)]), max_shape])
+    padded = np.zeros(final_shape, dtype=values[0].dtype)
+    mask = np.zeros(final_shape, dtype="bool")
+    for i, x in enumerate(values):
+        index = [i] + [slice(0, int(j)) for j in x.shape]
+        padded[tuple(index)] = x
+        mask[tuple(index)] = True
+    return padded, mask
+
+
+def pack_loop(atoms, coordinates, edge_indices, edge_masks):
+    n, mask_n = pad_loop(atoms)
+    pos, _ = pad_loop(coordinates)
+    edi, _ = pad_loop(edge_indices)
+    mask_e, _ = pad_loop(edge_masks)
+    return [pos, n, edi, np.expand_dims(mask_n, axis=-1), np.expand_dims(mask_e, axis=-1)]
+
+
+def make_molecules(num_molecules, num_atoms, num_neighbours, rng):
+    atoms = [rng.integers(1, 10, size=(n,)) for n in num_atoms]
+    coordinates = [rng.normal(size=(n, 3)) for n in num_atoms]
+    edge_indices = [rng.integers(0, n, size=(n, min(num_neighbours, n - 1))) for n in num_atoms]
+    edge_masks = [rng.uniform(size=(n, min(num_neighbours, n - 1))) > 0.2 for n in num_atoms]
+    return atoms, coordinates, edge_indices, edge_masks
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    rng = np.random.default_rng(0)
+    for num_molecules in args["molecules"]:
+        for case in ["fixed", "mixed"]:
+            if case == "fixed":
+                num_atoms = np.full(num_molecules, args["atoms"][1])
+            else:
+                num_atoms = rng.integers(args["atoms"][0], args["atoms"][1] + 1, size=num_molecules)
+            inputs = make_molecules(num_molecules, num_atoms, args["neighbours"], rng)
+            start = time.perf_counter()
+            out_loop = pack_loop(*inputs)
+            time_loop = time.perf_counter() - start
+            start = time.perf_counter()
+            out_vec = pack_schnet_input(*inputs)
+            time_vec = time.perf_counter() - start
+            assert all([np.array_equal(a, b) for a, b in zip(out_loop, out_vec)])
+            print("%6s molecules, %5s atoms: loop %9.0f molecules/s, vectorized %9.0f molecules/s" % (
+                num_molecules, case, num_molecules / time_loop, num_molecules / time_vec))
@@ -0,0 +1,73 @@
+"""Prediction time and accuracy of the precision modes of the energy-gradient and NAC models.
+
+Each mode copies the weights of a float32 model and is compared to the same model in "float64" as reference.
+Note that 16-bit modes are only faster on hardware with native support, e.g. bfloat16 on recent CPUs and TPUs or
+float16 on GPUs with tensor cores. Usage:
+
+    python benchmark_precision.py --modes float32 float64 mixed_bfloat16 mixed_float16 --batch_size 256
+"""
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark precision modes of models.')
+parser.add_argument("--modes", default=["float32", "float64", "mixed_bfloat16", "mixed_float16"], nargs="+",
+                    help="Precision modes")
+parser.add_argument("--atoms", default=12, type=int, help="Number of atoms")
+parser.add_argument("--states", default=2, type=int, help="Number of states")
+parser.add_argument("--nn_size", default=500, type=int, help="Units of hidden layers")
+parser.add_argument("--batch_size", default=256, type=int, help="Batch size")
+parser.add_argument("--repeats", default=20, type=int, help="Number of timed steps")
+
+
+def time_function(function, repeats):
+    function()  # Trace and warm up.
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def relative_error(y, y_ref):
+    y, y_ref = np.asarray(y, dtype="float64"), np.asarray(y_ref, dtype="float64")
+    return np.max(np.abs(y - y_ref)) / np.max(np.abs(y_ref))
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+    from pyNNsMD.models.mlp_eg import EnergyGradientModel
+    from pyNNsMD.models.mlp_nac2 import NACModel2
+
+    activ = {"class_name": "pyNNsMD>leaky_softplus", "config": {"alpha": 0.03}}
+    model_types = {
+        "energy_gradient": lambda precision: EnergyGradientModel(
+            atoms=args["atoms"], states=args["states"], invd_index=True, nn_size=args["nn_size"],
+            activ=activ, model_module="mlp_eg", precision=precision),
+        "nac": lambda precision: NACModel2(
+            atoms=args["atoms"], states=args["states"], invd_index=True, nn_size=args["nn_size"],
+            activ=activ, model_module="mlp_nac2", precision=precision),
+    }
+    x = np.random.normal(size=(args["batch_size"], args["atoms"], 3))
+    for name, make_model in model_types.items():
+        model_float32 = make_model("float32")
+        model_float32.build((None, args["atoms"], 3))
+        models = {}
+        for mode in ["float64"] + [m for m in args["modes"] if m != "float64"]:
+            model = make_model(mode)
+            model.build((None, args["atoms"], 3))
+            model.set_weights(model_float32.get_weights())
+            models[mode] = model
+        y_ref = tf.nest.flatten(models["float64"](tf.constant(x, dtype="float64")))
+
+        for mode in args["modes"]:
+            model = models[mode]
+            x_mode = tf.constant(x, dtype=model.compute_dtype)
+            call = tf.function(lambda: model(x_mode, training=False))
+            time_call = time_function(call, args["repeats"])
+            errors = [relative_error(y.numpy(), y_r.numpy()) for y, y_r in zip(tf.nest.flatten(call()), y_ref)]
+            print("%15s %14s: %8.2f ms, %10.1f samples/s, relative error to float64 %s" % (
+                name, mode, time_call, args["batch_size"] / time_call * 1000,
+                ", ".join(["%.2e" % e for e in errors])))
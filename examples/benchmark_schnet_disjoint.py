@@ -0,0 +1,83 @@
+"""Time of the padded and the disjoint SchNet interaction layers for batches of mixed molecule sizes.
+
+Runs the interaction blocks of :obj:`pyNNsMD.layers.schnet` on padded input with masks and on the flattened nodes and
+edges from :obj:`DenseToDisjoint`, including the gradient with respect to coordinates. Usage:
+
+    python benchmark_schnet_disjoint.py --atoms 5 60 --batch_size 64 --depth 4
+"""
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark padded and disjoint SchNet layers.')
+parser.add_argument("--atoms", default=[5, 60], type=int, nargs=2, help="Range of number of atoms")
+parser.add_argument("--batch_size", default=64, type=int, help="Batch size")
+parser.add_argument("--depth", default=4, type=int, help="Number of interaction blocks")
+parser.add_argument("--units", default=128, type=int, help="Units of interaction blocks")
+parser.add_argument("--max_neighbours", default=16, type=int, help="Maximum number of neighbours")
+parser.add_argument("--repeats", default=10, type=int, help="Number of timed steps")
+
+
+def time_function(function, repeats):
+    function()  # Trace and warm up.
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+    from pyNNsMD.layers.schnet import SchNetInteraction, NodeDistance, PoolingNodes, DenseToDisjoint, \
+        DisjointNodeDistance, DisjointPoolingNodes
+    from pyNNsMD.utils.neighbors import NeighborList
+    from pyNNsMD.utils.padding import pack_schnet_input
+
+    rng = np.random.default_rng(0)
+    for case in ["fixed", "mixed"]:
+        if case == "fixed":
+            sizes = np.full(args["batch_size"], args["atoms"][1])
+        else:
+            sizes = rng.integers(args["atoms"][0], args["atoms"][1] + 1, size=args["batch_size"])
+        coords = [rng.normal(size=(k, 3)) * k ** (1 / 3) for k in sizes]
+        atoms = [rng.integers(1, 10, size=(k,)) for k in sizes]
+        index, mask = NeighborList(cutoff=5.0, max_neighbours=args["max_neighbours"])(coords)
+        x, n, edi, mask_n, mask_e = pack_schnet_input(atoms, coords, index, mask)
+        x = tf.constant(x, dtype="float32")
+        nodes = tf.random.normal(n.shape + (args["units"],)) * tf.cast(mask_n, "float32")
+        edi, mask_n, mask_e = tf.constant(edi), tf.constant(mask_n), tf.constant(mask_e)
+        centers = tf.linspace(0.0, 5.0, 20)
+        blocks = {key: [SchNetInteraction(units=args["units"], activation="softplus", disjoint=key == "disjoint")
+                        for _ in range(args["depth"])] for key in ["padded", "disjoint"]}
+
+        @tf.function
+        def call_padded():
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                ed = NodeDistance()([x, edi], mask=[mask_n, mask_e])
+                ed = tf.exp(-tf.square(ed - centers)) * tf.cast(mask_e, "float32")
+                h = nodes
+                for block in blocks["padded"]:
+                    h = block([h, ed, edi], mask=[mask_n, mask_e, mask_e])
+                energy = PoolingNodes()(h, mask=mask_n)
+            return energy, tape.gradient(energy, x)
+
+        @tf.function
+        def call_disjoint():
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                x_flat, h, edge_index, graph_id = DenseToDisjoint()([x, nodes, edi, mask_n, mask_e])
+                ed = tf.exp(-tf.square(DisjointNodeDistance()([x_flat, edge_index]) - centers))
+                for block in blocks["disjoint"]:
+                    h = block([h, ed, edge_index])
+                energy = DisjointPoolingNodes()([h, graph_id, tf.shape(x, out_type="int64")[0]])
+            return energy, tape.gradient(energy, x)
+
+        time_padded = time_function(call_padded, args["repeats"])
+        time_disjoint = time_function(call_disjoint, args["repeats"])
+        print("%5s sizes: %5.1f%% real atoms, %5.1f%% real edges; padded %8.2f ms, disjoint %8.2f ms" % (
+            case, 100 * np.sum(sizes) / np.prod(mask_n.shape[:2]), 100 * np.mean(mask_e.numpy()),
+            time_padded, time_disjoint))
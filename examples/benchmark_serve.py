@@ -0,0 +1,82 @@
+"""Latency and throughput of the inference server compared to calling the ensemble in-process.
+
+Requires a trained ensemble, e.g. from `nn_butene_mlp_eg.py`. Usage:
+
+    python benchmark_serve.py TestEnergyGradient/ --clients 1 4 16 --steps 200
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark pyNNsMD.serve against in-process ensemble calls.')
+parser.add_argument("directory", help="Directory of the ensemble")
+parser.add_argument("--clients", default=[1, 4, 16], type=int, nargs="+", help="Number of concurrent trajectories")
+parser.add_argument("--steps", default=200, type=int, help="Number of steps per trajectory")
+args = vars(parser.parse_args())
+
+from pyNNsMD.NNsMD import NeuralNetEnsemble
+from pyNNsMD.serve import InferenceClient, _count_models
+
+directory = os.path.realpath(args["directory"])
+socket_path = os.path.join(directory, "benchmark.sock")
+geos = np.load("butene/butene_x.npy")[:1]
+
+
+def report(name, latencies, wall_time):
+    latencies = np.array(latencies) * 1000
+    print("%-28s steps/s: %9.1f   latency ms p50: %7.3f  p90: %7.3f  p99: %7.3f" % (
+        name, len(latencies) / wall_time, np.percentile(latencies, 50), np.percentile(latencies, 90),
+        np.percentile(latencies, 99)))
+
+
+# In-process reference, graph tracing excluded.
+nn = NeuralNetEnsemble(directory, _count_models(directory))
+nn.load()
+nn.call(geos)
+latencies = []
+start = time.perf_counter()
+for _ in range(args["steps"]):
+    t0 = time.perf_counter()
+    nn.call(geos)
+    latencies.append(time.perf_counter() - t0)
+report("in-process call()", latencies, time.perf_counter() - start)
+
+nn.call_fused(geos)
+latencies = []
+start = time.perf_counter()
+for _ in range(args["steps"]):
+    t0 = time.perf_counter()
+    nn.call_fused(geos)
+    latencies.append(time.perf_counter() - t0)
+report("in-process call_fused()", latencies, time.perf_counter() - start)
+
+# Server
+proc = subprocess.Popen([sys.executable, "-m", "pyNNsMD.serve", directory, "-s", socket_path])
+while not os.path.exists(socket_path):
+    time.sleep(0.1)
+
+for num_clients in args["clients"]:
+    latencies = [[] for _ in range(num_clients)]
+
+    def run_trajectory(k):
+        with InferenceClient(socket_path) as client:
+            client.call(geos)
+            for _ in range(args["steps"]):
+                t0 = time.perf_counter()
+                client.call(geos)
+                latencies[k].append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=run_trajectory, args=(k,)) for k in range(num_clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report("server, %s clients" % num_clients, np.concatenate(latencies), time.perf_counter() - start)
+
+proc.terminate()
+proc.wait()
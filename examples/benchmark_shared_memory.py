@@ -0,0 +1,66 @@
+"""Step time of MD workers that exchange coordinates via shared memory compared to the copy-per-call path.
+
+Requires a trained ensemble, e.g. from `nn_butene_mlp_eg.py`. Usage:
+
+    python benchmark_shared_memory.py TestEnergyGradient/ --workers 1 4 16 --steps 500
+"""
+import os
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark shared memory exchange against copy-per-call.')
+parser.add_argument("directory", help="Directory of the ensemble")
+parser.add_argument("--workers", default=[1, 4, 16], type=int, nargs="+", help="Number of worker processes")
+parser.add_argument("--steps", default=500, type=int, help="Number of steps per worker")
+
+
+def run_worker(name, slot, geometry, steps, out_queue):
+    from pyNNsMD.src.shared import SharedMemoryClient
+    client = SharedMemoryClient(name, slot)
+    client.call(geometry)
+    start = time.perf_counter()
+    for _ in range(steps):
+        # Geometry is written in place as an MD integrator would do.
+        client.geometry += 1e-4
+        client.call()
+    out_queue.put(time.perf_counter() - start)
+    client.close()
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.NNsMD import NeuralNetEnsemble
+    from pyNNsMD.serve import _count_models
+    from pyNNsMD.src.shared import SharedMemoryServer
+
+    directory = os.path.realpath(args["directory"])
+    geos = np.load("butene/butene_x.npy")
+    nn = NeuralNetEnsemble(directory, _count_models(directory))
+    nn.load()
+
+    # Copy-per-call: each step converts numpy to tensor, calls every member and converts back.
+    nn.call(geos[:1])
+    start = time.perf_counter()
+    for _ in range(args["steps"]):
+        nn.call(geos[:1])
+    step_time = (time.perf_counter() - start) / args["steps"]
+    print("copy-per-call call():        %8.3f ms/step, %9.1f steps/s" % (step_time * 1000, 1 / step_time))
+
+    for num_workers in args["workers"]:
+        server = SharedMemoryServer(nn, slots=num_workers, atoms=geos.shape[1]).start()
+        out_queue = mp.Queue()
+        procs = [mp.Process(target=run_worker, args=(server.name, k, geos[k], args["steps"], out_queue))
+                 for k in range(num_workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        worker_times = [out_queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+        wall_time = time.perf_counter() - start
+        step_time = np.mean(worker_times) / args["steps"]
+        print("shared memory, %3s workers: %8.3f ms/step, %9.1f steps/s total" % (
+            num_workers, step_time * 1000, num_workers * args["steps"] / max(worker_times)))
+        server.close()
@@ -0,0 +1,61 @@
+"""Throughput of many trajectories stepped through the TrajectoryScheduler compared to one call per trajectory.
+
+Requires a trained ensemble, e.g. from `nn_butene_mlp_eg.py`. Usage:
+
+    python benchmark_trajectories.py TestEnergyGradient/ --trajectories 1 16 64 --steps 200 --timeout 0.001
+"""
+import os
+import time
+import argparse
+import threading
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark batched multi-trajectory stepping.')
+parser.add_argument("directory", help="Directory of the ensemble")
+parser.add_argument("--trajectories", default=[1, 16, 64], type=int, nargs="+", help="Number of trajectories")
+parser.add_argument("--steps", default=200, type=int, help="Number of steps per trajectory")
+parser.add_argument("--batch_size", default=256, type=int, help="Maximum batch size")
+parser.add_argument("--timeout", default=0.002, type=float, help="Batch timeout in seconds")
+args = vars(parser.parse_args())
+
+from pyNNsMD.NNsMD import NeuralNetEnsemble
+from pyNNsMD.serve import _count_models
+from pyNNsMD.src.batching import TrajectoryScheduler
+
+directory = os.path.realpath(args["directory"])
+geos = np.load("butene/butene_x.npy")
+nn = NeuralNetEnsemble(directory, _count_models(directory))
+nn.load()
+
+for num_traj in args["trajectories"]:
+    # Sequential reference: every trajectory calls the ensemble on its own.
+    nn.call_fused(geos[:1])
+    start = time.perf_counter()
+    for _ in range(args["steps"]):
+        for k in range(num_traj):
+            nn.call_fused(geos[k:k + 1])
+    wall_time = time.perf_counter() - start
+    print("%4s trajectories, sequential: %9.1f steps/s" % (num_traj, num_traj * args["steps"] / wall_time))
+
+    scheduler = TrajectoryScheduler(nn, max_batch_size=args["batch_size"], batch_timeout=args["timeout"]).start()
+    scheduler.step(geos[0])
+    scheduler.reset_statistics()
+
+    def run_trajectory(k):
+        x = np.array(geos[k])
+        for _ in range(args["steps"]):
+            (energy, gradient), _ = scheduler.step(x)
+            x = x - 1e-5 * gradient[0]
+
+    threads = [threading.Thread(target=run_trajectory, args=(k,)) for k in range(num_traj)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - start
+    scheduler.stop()
+    stats = scheduler.statistics()
+    print("%4s trajectories, scheduler:  %9.1f steps/s  occupancy: %5.3f  latency ms p50: %7.3f  p99: %7.3f" % (
+        num_traj, num_traj * args["steps"] / wall_time, stats["mean_occupancy"], stats["latency_p50"] * 1000,
+        stats["latency_p99"] * 1000))
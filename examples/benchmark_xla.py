@@ -0,0 +1,89 @@
+"""Train and predict steps per second of the energy-gradient, NAC and SchNet models with and without XLA.
+
+Each model is compiled once with `use_xla=False` and once with `use_xla=True`. The prediction runs on a number of
+samples that is not a multiple of the batch size, so that without bucketing the last batch is traced again.
+The first call of each step compiles the graph and is reported separately. Usage:
+
+    python benchmark_xla.py --models energy_gradient nac schnet --batch_size 64 --samples 1000
+"""
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark models with and without XLA.')
+parser.add_argument("--models", default=["energy_gradient", "nac"], nargs="+",
+                    help="Models 'energy_gradient', 'nac' or 'schnet'. SchNet requires kgcnn.")
+parser.add_argument("--atoms", default=12, type=int, help="Number of atoms")
+parser.add_argument("--states", default=2, type=int, help="Number of states")
+parser.add_argument("--nn_size", default=100, type=int, help="Units of hidden layers")
+parser.add_argument("--batch_size", default=64, type=int, help="Batch size")
+parser.add_argument("--samples", default=1000, type=int, help="Number of samples to predict")
+parser.add_argument("--repeats", default=20, type=int, help="Number of timed steps")
+
+
+def time_steps(function, repeats):
+    start = time.perf_counter()
+    function()  # Trace and compile.
+    time_first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return time_first, repeats / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([-1])
+    import tensorflow as tf
+
+    activ = {"class_name": "pyNNsMD>leaky_softplus", "config": {"alpha": 0.03}}
+    rng = np.random.default_rng(0)
+    num_batches = int(np.ceil(args["samples"] / args["batch_size"]))
+
+    def make_energy_gradient(use_xla):
+        from pyNNsMD.models.mlp_eg import EnergyGradientModel
+        model = EnergyGradientModel(atoms=args["atoms"], states=args["states"], invd_index=True,
+                                    nn_size=args["nn_size"], activ=activ, model_module="mlp_eg", use_xla=use_xla)
+        x = rng.normal(size=(args["samples"], args["atoms"], 3)).astype("float32")
+        y = [rng.normal(size=(args["samples"], args["states"])).astype("float32"),
+             rng.normal(size=(args["samples"], args["states"], args["atoms"], 3)).astype("float32")]
+        return model, x, y
+
+    def make_nac(use_xla):
+        from pyNNsMD.models.mlp_nac2 import NACModel2
+        model = NACModel2(atoms=args["atoms"], states=args["states"], invd_index=True, nn_size=args["nn_size"],
+                          activ=activ, model_module="mlp_nac2", use_xla=use_xla)
+        num_nac = args["states"] * (args["states"] - 1) // 2
+        x = rng.normal(size=(args["samples"], args["atoms"], 3)).astype("float32")
+        y = rng.normal(size=(args["samples"], num_nac, args["atoms"], 3)).astype("float32")
+        return model, x, y
+
+    def make_schnet(use_xla):
+        from pyNNsMD.models.schnet_eg import SchNetEnergy
+        from pyNNsMD.hypers.hyper_schnet_eg import DEFAULT_HYPER_PARAM_SCHNET_EG
+        config = dict(DEFAULT_HYPER_PARAM_SCHNET_EG["model"]["config"])
+        config.update({"use_xla": use_xla, "output_as_dict": False, "energy_only": False})
+        config["output_mlp"] = dict(config["output_mlp"], units=[64, args["states"]])
+        model = SchNetEnergy(**config)
+        atoms = [rng.integers(1, 10, size=(args["atoms"],)) for _ in range(args["samples"])]
+        coords = [rng.normal(size=(args["atoms"], 3)) for _ in range(args["samples"])]
+        x = model.predict_to_tensor_input([atoms, coords])
+        x[0] = x[0].astype("float32")
+        y = [rng.normal(size=(args["samples"], args["states"])).astype("float32"),
+             rng.normal(size=(args["samples"], args["atoms"], args["states"], 3)).astype("float32")]
+        return model, x, y
+
+    model_types = {"energy_gradient": make_energy_gradient, "nac": make_nac, "schnet": make_schnet}
+    for name in args["models"]:
+        for use_xla in [False, True]:
+            model, x, y = model_types[name](use_xla)
+            model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-4), loss="mean_squared_error")
+            x_batch = tf.nest.map_structure(lambda v: v[:args["batch_size"]], x)
+            y_batch = tf.nest.map_structure(lambda v: v[:args["batch_size"]], y)
+            compile_train, train_steps = time_steps(lambda: model.train_on_batch(x_batch, y_batch),
+                                                    args["repeats"])
+            compile_predict, predict_runs = time_steps(
+                lambda: model.predict(x, batch_size=args["batch_size"], verbose=0), max(args["repeats"] // 5, 1))
+            print("%15s xla=%-5s: train %8.1f steps/s (first %6.2f s), predict %8.1f steps/s (first %6.2f s)" % (
+                name, use_xla, train_steps, compile_train, predict_runs * num_batches, compile_predict))
@@ -0,0 +1,65 @@
+"""Time of reading and writing a large xyz trajectory with the line parser and the chunked numpy parser.
+
+Writes a trajectory of random geometries with :obj:`pyNNsMD.utils.xyz.write_xyz_file` and with the previous string
+concatenation, then reads it with :obj:`read_xyz_arrays` and with the previous line-by-line parser. The file of
+1M frames of 12 atoms has about 0.7 GB. Usage:
+
+    python benchmark_xyz.py --frames 1000000 --atoms 12 --file trajectory.xyz
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Benchmark xyz reading and writing.')
+parser.add_argument("--frames", default=1000000, type=int, help="Number of frames")
+parser.add_argument("--atoms", default=12, type=int, help="Number of atoms")
+parser.add_argument("--file", default="benchmark_trajectory.xyz", help="Path of the xyz file")
+parser.add_argument("--legacy_frames", default=None, type=int,
+                    help="Number of frames for the line parser and writer. Default is all frames.")
+
+
+def legacy_parse_list_to_xyz_str(mol, comment=""):
+    atoms, coordinates = mol
+    xyz_str = str(int(len(atoms))) + "\n" + comment + "\n"
+    for a_iter, c_iter in zip(atoms, coordinates):
+        xyz_str = xyz_str + str(a_iter) + (" {:.10f}" * len(c_iter) + "\n").format(*c_iter)
+    return xyz_str
+
+
+if __name__ == "__main__":
+    args = vars(parser.parse_args())
+    from pyNNsMD.utils.data import _read_xyz_file_lines
+    from pyNNsMD.utils.xyz import read_xyz_arrays, write_xyz_file
+
+    rng = np.random.default_rng(0)
+    elements = rng.choice(["C", "H", "O"], size=args["atoms"])
+    coordinates = rng.normal(size=(args["frames"], args["atoms"], 3))
+    legacy_frames = args["frames"] if args["legacy_frames"] is None else args["legacy_frames"]
+    legacy_file = args["file"] + ".legacy"
+
+    start = time.perf_counter()
+    write_xyz_file(args["file"], elements, coordinates)
+    time_write = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(legacy_file, "w") as f:
+        for x in coordinates[:legacy_frames].tolist():
+            f.write(legacy_parse_list_to_xyz_str([elements.tolist(), x]))
+    time_write_legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, coordinates_read, _ = read_xyz_arrays(args["file"])
+    time_read = time.perf_counter() - start
+    start = time.perf_counter()
+    mol_list = _read_xyz_file_lines(legacy_file)
+    time_read_legacy = time.perf_counter() - start
+    assert np.max(np.abs(coordinates_read - coordinates)) < 1e-9
+    assert len(mol_list) == legacy_frames
+
+    size = os.path.getsize(args["file"]) / 1024 ** 2
+    print("File of %s frames with %s atoms: %.1f MB" % (args["frames"], args["atoms"], size))
+    print("Write: numpy %8.2f s, %9.1f frames/s; legacy %8.2f s, %9.1f frames/s" % (
+        time_write, args["frames"] / time_write, time_write_legacy, legacy_frames / time_write_legacy))
+    print("Read:  numpy %8.2f s, %9.1f frames/s; legacy %8.2f s, %9.1f frames/s" % (
+        time_read, args["frames"] / time_read, time_read_legacy, legacy_frames / time_read_legacy))
+    os.remove(legacy_file)
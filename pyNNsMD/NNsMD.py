@@ -1,13 +1,19 @@
 import os
 import sys
+import time
 import numpy as np
 import logging
 import importlib
 import tensorflow as tf
 
-from pyNNsMD.utils.data import save_json_file, load_json_file, write_list_to_xyz_file
+from pyNNsMD.utils.data import save_json_file, load_json_file
 from pyNNsMD.src.fit import fit_model_by_script
+from pyNNsMD.src.device import get_cpu_partition
+from pyNNsMD.src.selection import UncertaintyAccumulator
+from pyNNsMD.datasets.store import save_dataset, append_dataset
 from pyNNsMD.scaler.base import ScalerBase
+from pyNNsMD.models.scaled import ScaledModel
+from pyNNsMD.utils.inference import InferenceFunction, get_input_signature
 from sklearn.model_selection import KFold
 
 logging.basicConfig()
@@ -57,6 +63,13 @@ class NeuralNetEnsemble:
         # Private members of model and scaler list.
         self._models = []
         self._scalers = []
+        # Whether a model was loaded from a `model_tf` that includes the transformation of its scaler.
+        self._scaled_models = []
+
+        # Cached graph for fused ensemble call.
+        self._fused_call = None
+        # Concrete functions with fixed input signature for `call()` of each model.
+        self._inference_functions = []
 
     def _create_single_model(self, kw, i):
         # The module location could be inferred from keras path or module system using '>'
@@ -67,7 +80,7 @@ class NeuralNetEnsemble:
             raise ValueError("Expected model kwargs, got `None` instead.")
 
         if isinstance(kw, tf.keras.Model):
-            self.logger.info("Got `keras.Model` for model index i" % i)
+            self.logger.info("Got `keras.Model` for model index %s" % i)
             return kw
 
         if not isinstance(kw, dict):
@@ -102,7 +115,7 @@ class NeuralNetEnsemble:
             return None
 
         if isinstance(kw, ScalerBase):
-            self.logger.info("Got scaler for model index i" % i)
+            self.logger.info("Got scaler for model index %s" % i)
             return kw
 
         if not isinstance(kw, dict):
@@ -147,11 +160,14 @@ class NeuralNetEnsemble:
         self._scalers = [None]*self._number_models
         for i, kw in enumerate(scalers):
             self._scalers[i] = self._create_single_scaler(kw, i)
+        self._scaled_models = [False]*self._number_models
 
+        self._fused_call = None
+        self._inference_functions = []
         self.logger.info("Models and Scaler created. Must be save before calling fit.")
         return self
 
-    def _save_single_model(self, model, i, model_path, save_weights, save_model):
+    def _save_single_model(self, model, i, model_path, save_weights, save_model, scaler=None, export_scaled=False):
         # Model config saved as json.
 
         model_serialization = {"class_name": self._get_name_of_class(model),
@@ -166,7 +182,10 @@ class NeuralNetEnsemble:
         if save_model:
             if not hasattr(model, "save") or model is None:
                 raise AttributeError("Model is not a keras model with `save()` defined for %s" % i)
-            model.save(os.path.join(model_path, "model_tf"))
+            if export_scaled and scaler is not None:
+                ScaledModel(model, scaler).save(os.path.join(model_path, "model_tf"))
+            else:
+                model.save(os.path.join(model_path, "model_tf"))
 
     @staticmethod
     def _get_name_of_class(class_object):
@@ -195,13 +214,17 @@ class NeuralNetEnsemble:
                 raise AttributeError("Scaler must implement `save()` which is not defined for %s" % i)
             scaler.save(os.path.join(model_path, "scaler_class"))
 
-    def save(self, save_weights: bool = True, save_model: bool = True, save_scaler: bool = True):
+    def save(self, save_weights: bool = True, save_model: bool = True, save_scaler: bool = True,
+             export_scaled: bool = False):
         """Save models, scaler and hyperparameter into class folder.
 
         Args:
             save_weights (bool): Whether to save weights separately. Default is True.
             save_model (bool): Whether to save model as keras model. Default is True.
             save_scaler (bool): Whether to save scaler as scaler (not supported). Default is True.
+            export_scaled (bool): Whether to save the keras model as :obj:`pyNNsMD.models.scaled.ScaledModel`, which
+                includes the transformation of the scaler, so that `model_tf` takes and returns unscaled data.
+                Only for models with coordinate input. Default is False.
 
         Returns:
             self
@@ -214,7 +237,8 @@ class NeuralNetEnsemble:
             model_path = self._get_model_path(i)
             os.makedirs(model_path, exist_ok=True)
 
-            self._save_single_model(self._models[i], i, model_path, save_weights=save_weights, save_model=save_model)
+            self._save_single_model(self._models[i], i, model_path, save_weights=save_weights, save_model=save_model,
+                                    scaler=self._scalers[i], export_scaled=export_scaled)
             self._save_single_scaler(self._scalers[i], i, model_path,
                                      save_weights=save_weights, save_scaler=save_scaler)
 
@@ -231,6 +255,9 @@ class NeuralNetEnsemble:
         # Load model
         if load_model:
             _models = tf.keras.models.load_model(os.path.join(model_path, "model_tf"), compile=False)
+            # Only a saved ScaledModel has the marker, also if `model_tf` was overwritten by a training script.
+            _scaler_included = getattr(_models, "scaler_included", None)
+            self._scaled_models[i] = _scaler_included is not None and bool(_scaler_included.numpy())
 
         if not load_model:
             self.logger.warning("Recreating model from config and loading weights...")
@@ -261,7 +288,7 @@ class NeuralNetEnsemble:
 
         return _scaler
 
-    def load(self, load_model: bool = False, load_scaler: bool = False):
+    def load(self, load_model: bool = False, load_scaler: bool = False, warmup: bool = True):
         """Load model from file that are stored in class folder.
         
         The tensorflow.keras.model is not loaded itself but created new from hyperparameter.
@@ -269,6 +296,7 @@ class NeuralNetEnsemble:
         Args:
             load_model (bool): Whether to load model without remaking the model. Default is False.
             load_scaler (bool): Whether to load model without remaking the scaler. Default is False.
+            warmup (bool): Whether to trace the inference graphs with :obj:`warmup()`. Default is True.
 
         Raises:
             FileNotFoundError: If Directory not found.
@@ -281,8 +309,11 @@ class NeuralNetEnsemble:
         if not os.path.exists(directory):
             raise FileNotFoundError("Can not find file directory %s for this class" % directory)
 
-        _models_hyper = [None]*self._number_models
-        _scaler_hyper = [None]*self._number_models
+        if len(self._models) != self._number_models:
+            self._models = [None]*self._number_models
+        if len(self._scalers) != self._number_models:
+            self._scalers = [None]*self._number_models
+        self._scaled_models = [False]*self._number_models
 
         for i in range(self._number_models):
             model_path = self._get_model_path(i)
@@ -290,20 +321,65 @@ class NeuralNetEnsemble:
             self._models[i] = self._load_single_model(model_path=model_path, i=i, load_model=load_model)
             self._scalers[i] = self._load_single_scaler(model_path=model_path, i=i, load_scaler=load_scaler)
 
+        self._fused_call = None
+        self._inference_functions = []
+        if warmup:
+            self.warmup()
         return self
 
-    @staticmethod
-    def _make_nested_list(in_array):
-        if isinstance(in_array, np.ndarray):
-            return in_array.tolist()
-        elif isinstance(in_array, list):
-            return [x.tolist() if isinstance(x, np.ndarray) else x for x in in_array]
-        return in_array
+    def warmup(self, batch_size: int = 1):
+        """Trace the inference graphs of all models, so that the first call after loading does not trace again.
+
+        Each model that defines `get_input_signature()` gets a concrete function for :obj:`call()`, see
+        :obj:`pyNNsMD.utils.inference`. The keras predict function and, if possible, :obj:`call_fused()` are traced
+        on the same dummy input. The time of tracing and the first calls is logged.
+
+        Args:
+            batch_size (int): Number of samples of the dummy input. Default is 1.
+
+        Returns:
+            list: Dictionary of timings in seconds for each model, or None if the model has no input signature.
+        """
+        self._inference_functions = [None]*len(self._models)
+        timings = []
+        for i, model in enumerate(self._models):
+            if get_input_signature(model) is None:
+                self.logger.warning("Model %s has no input signature, skipping warm-up." % i)
+                timings.append(None)
+                continue
+            self._inference_functions[i] = InferenceFunction(model)
+            timings.append(self._inference_functions[i].warmup(batch_size=batch_size))
+            self.logger.info("Warm-up model %s: " % i + ", ".join(
+                ["%s %.4f s" % (key, value) for key, value in timings[i].items()]))
+
+        signatures = [get_input_signature(model) for model in self._models]
+        if all([sig is not None and len(sig) == 1 and not hasattr(model, "predict_to_tensor_input")
+                for sig, model in zip(signatures, self._models)]):
+            shape = [batch_size] + signatures[0][0].shape.as_list()[1:]
+            start = time.perf_counter()
+            self.call_fused(np.zeros(shape))
+            self.logger.info("Warm-up fused call: %.4f s" % (time.perf_counter() - start))
+        return timings
 
     def data(self, atoms: list = None, geometries: list = None, forces: list = None, energies: list = None,
-             couplings: list = None):
+             couplings: list = None, append: bool = False):
+        """Save data to the binary dataset of the ensemble directory, see :obj:`pyNNsMD.datasets.store`.
+
+        Args:
+            atoms (list): Atomic symbols of each geometry. Default is None.
+            geometries (list): Coordinates of shape `(N, atoms, 3)`. Default is None.
+            forces (list): Gradients of shape `(N, states, atoms, 3)`. Default is None.
+            energies (list): Energies of shape `(N, states)`. Default is None.
+            couplings (list): Couplings of shape `(N, couplings, atoms, 3)`. Default is None.
+            append (bool): Whether to append the samples to the existing dataset, which requires all of its arrays.
+                Default is False, which replaces the given arrays.
+
+        Returns:
+            dict: Manifest of the dataset.
+        """
         kwargs = dict(locals())
         kwargs.pop("self")
+        kwargs.pop("append")
         dir_path = self._directory
         data_length = [len(values) for key, values in kwargs.items() if values is not None]
         if len(data_length) == 0:
@@ -312,14 +388,9 @@ class NeuralNetEnsemble:
         if len(set(data_length)) > 1:
             raise ValueError("Received different data length for %s" % data_length)
 
-        if atoms is not None and geometries is not None:
-            write_list_to_xyz_file(os.path.join(dir_path, "geometries.xyz"), [x for x in zip(atoms, geometries)])
-        if energies is not None:
-            save_json_file(self._make_nested_list(energies), os.path.join(dir_path, "energies.json"))
-        if forces is not None:
-            save_json_file(self._make_nested_list(forces), os.path.join(dir_path, "forces.json"))
-        if couplings is not None:
-            save_json_file(self._make_nested_list(couplings), os.path.join(dir_path, "couplings.json"))
+        if append:
+            return append_dataset(dir_path, **kwargs)
+        return save_dataset(dir_path, **kwargs)
 
     def train_test_split(self, dataset_size, n_splits: int = 5, shuffle: bool = True, random_state: int = None):
         """Generate split and save indices to model instances.
@@ -353,6 +424,39 @@ class NeuralNetEnsemble:
             np.save(os.path.join(self._get_model_path(i), "train_index.npy"), train_index)
             np.save(os.path.join(self._get_model_path(i), "test_index.npy"), test_index)
 
+    def get_train_test_indices(self):
+        """Load train and test indices of each model.
+
+        Returns:
+            tuple: List of train indices and list of test indices.
+        """
+        train = [np.load(os.path.join(self._get_model_path(i), "train_index.npy")) for i in range(self._number_models)]
+        test = [np.load(os.path.join(self._get_model_path(i), "test_index.npy")) for i in range(self._number_models)]
+        return train, test
+
+    def add_train_test_indices(self, indices, test_size: float = 0.2, random_state: int = None):
+        """Add new samples to the train and test indices of each model, e.g. after appending data.
+
+        Each model draws a different random subset of the new samples for its test split.
+
+        Args:
+            indices (np.ndarray): Indices of new samples in the dataset.
+            test_size (float): Fraction of new samples for the test split. Default is 0.2.
+            random_state (int): Seed for the random split. Default is None.
+
+        Returns:
+            tuple: List of train indices and list of test indices.
+        """
+        indices = np.asarray(indices, dtype="int64")
+        rng = np.random.default_rng(random_state)
+        train, test = self.get_train_test_indices()
+        for i in range(self._number_models):
+            is_test = rng.random(len(indices)) < test_size
+            train[i] = np.concatenate([train[i], indices[~is_test]], axis=0)
+            test[i] = np.concatenate([test[i], indices[is_test]], axis=0)
+        self.train_test_indices(train, test)
+        return train, test
+
     def training(self, training_hyper: list, fit_mode: str = "training"):
         if len(training_hyper) != self._number_models:
             raise ValueError("Training configs must match number of models but got %s" % len(training_hyper))
@@ -361,15 +465,37 @@ class NeuralNetEnsemble:
         for i, x in enumerate(training_hyper):
             save_json_file(x, os.path.join(self._get_model_path(i), fit_mode + "_config.json"))
 
-    def _fit_single_model(self, i, training_script, gpu, proc_async, fit_mode):
+    def _fit_single_model(self, i, training_script, gpu, proc_async, fit_mode, cpus=None):
 
         proc = fit_model_by_script(i, training_script, gpu,
                                    os.path.join(self._directory, "model_v%s" % i),
-                                   fit_mode, proc_async)
+                                   fit_mode, proc_async, cpus=cpus)
         self.logger.info(f"Submitted training for models {training_script}")
         return proc
 
-    def fit(self, training_scripts: list, gpu_dist: list = None, proc_async=True, fit_mode="training"):
+    def _fit_queued(self, training_scripts, gpu_dist, fit_mode, cpu_dist, poll_interval=0.5):
+        # Run at most one training process per core set and start queued models when a core set is free.
+        free_slots = list(range(len(cpu_dist)))
+        running = {}
+        queued = list(range(len(training_scripts)))
+        while len(queued) > 0 or len(running) > 0:
+            while len(free_slots) > 0 and len(queued) > 0:
+                slot, i = free_slots.pop(0), queued.pop(0)
+                self.logger.info("Fit model %s on cpus %s" % (i, cpu_dist[slot]))
+                proc = self._fit_single_model(i, training_scripts[i], gpu_dist[i], True, fit_mode,
+                                              cpus=cpu_dist[slot])
+                if proc is None:
+                    free_slots.append(slot)
+                else:
+                    running[slot] = proc
+            for slot, proc in list(running.items()):
+                if proc.poll() is not None:
+                    running.pop(slot)
+                    free_slots.append(slot)
+            time.sleep(poll_interval)
+
+    def fit(self, training_scripts: list, gpu_dist: list = None, proc_async=True, fit_mode="training", pool=None,
+            progress_callback=None, cpu_dist=None):
         """Fit NN to data. Model weights and hyperparameter must always be saved to file before fit.
 
         The fit routine calls training scripts on the data_folder in parallel.
@@ -382,6 +508,14 @@ class NeuralNetEnsemble:
             fit_mode (str, optional):  Whether to do 'training' or 'retraining' the existing model in
                 hyperparameter category. Default is 'training'.
                 In principle every reasonable category can be created in hyperparameters.
+            pool (TrainingWorkerPool, optional): Persistent worker pool from :obj:`pyNNsMD.src.pool` to run the
+                training scripts instead of starting a new process for each model. Default is None.
+            progress_callback (callable, optional): Function that receives the progress dictionary of each epoch,
+                if a pool is used. Default is None, which logs the progress.
+            cpu_dist (list, str, optional): List of disjoint core sets, e.g. `[[0, 1], [2, 3]]`, or "auto" to split
+                the available cpus with :obj:`pyNNsMD.src.device.get_cpu_partition`. Each training process is pinned
+                to a core set with matching thread counts. If there are more models than core sets, the remaining
+                models are queued. Only used without pool. Default is None.
 
         Returns:
             list: Fitting Error.
@@ -394,23 +528,36 @@ class NeuralNetEnsemble:
             raise ValueError("Training scripts must be the same number of models.")
 
         # Fitting
-        proc_list = []
-        for i, fit_script in enumerate(training_scripts):
-            proc_list.append(self._fit_single_model(i, fit_script, gpu_dist[i], proc_async, fit_mode))
-
-        # Wait for fits
-        if proc_async:
-            self.logger.info("Fits submitted, waiting...")
-            # Wait for models to finish
-            for proc in proc_list:
-                if proc is None:
-                    self.logger.warning("No valid process to wait for.")
-                else:
-                    proc.wait()
+        if pool is not None:
+            task_ids = [pool.submit(fit_script, i, self._get_model_path(i), gpu_dist[i], fit_mode)
+                        for i, fit_script in enumerate(training_scripts)]
+            self.logger.info("Fits submitted to pool, waiting...")
+            pool.wait(task_ids, progress_callback=progress_callback)
+        elif cpu_dist is not None:
+            if isinstance(cpu_dist, str) and cpu_dist == "auto":
+                cpu_dist = get_cpu_partition(self._number_models if proc_async else 1)
+            if not proc_async:
+                cpu_dist = cpu_dist[:1]
+            self._fit_queued(training_scripts, gpu_dist, fit_mode, cpu_dist)
+        else:
+            proc_list = []
+            for i, fit_script in enumerate(training_scripts):
+                proc_list.append(self._fit_single_model(i, fit_script, gpu_dist[i], proc_async, fit_mode))
+
+            # Wait for fits
+            if proc_async:
+                self.logger.info("Fits submitted, waiting...")
+                # Wait for models to finish
+                for proc in proc_list:
+                    if proc is None:
+                        self.logger.warning("No valid process to wait for.")
+                    else:
+                        proc.wait()
 
         # Look for fit-error in folder
         self.logger.info("Searching Folder for fit results...")
-        self.load()
+        # Inference graphs are traced on demand, not after every fit, e.g. in active learning.
+        self.load(warmup=False)
 
         # We must check if fit was successful
         fit_error = []
@@ -424,9 +571,31 @@ class NeuralNetEnsemble:
 
         return fit_error
 
-    def predict(self, x, **kwargs):
+    def _get_call_scalers(self):
+        # Scaled models loaded from `model_tf` already include the transformation of their scaler.
+        scaled_models = self._scaled_models if len(self._scaled_models) == len(self._scalers) else [False]*len(
+            self._scalers)
+        return [None if scaled else scaler for scaler, scaled in zip(self._scalers, scaled_models)]
+
+    def predict(self, x, return_uncertainty: bool = False, reduction: str = None, **kwargs):
+        """Predict the output of each model of the ensemble.
+
+        Args:
+            x (np.ndarray): Input of the models.
+            return_uncertainty (bool): Whether to return mean and standard deviation instead of the output of each
+                model. The output of the models is accumulated one at a time with
+                :obj:`pyNNsMD.src.selection.UncertaintyAccumulator`, so that the output of all models is never held
+                at once. Default is False.
+            reduction (str): Reduction of the standard deviation of vector outputs, "atom_norm" or "max_norm",
+                if `return_uncertainty` is set. Default is None.
+            kwargs: Further arguments for `predict()` of the models.
+
+        Returns:
+            list: Output of each model or tuple of mean and standard deviation for `return_uncertainty`.
+        """
         y_list = []
-        for i, (model, scaler) in enumerate(zip(self._models, self._scalers)):
+        accumulator = UncertaintyAccumulator() if return_uncertainty else None
+        for i, (model, scaler) in enumerate(zip(self._models, self._get_call_scalers())):
             x_i = x
             if scaler is not None:
                 x_i, _ = scaler.inverse_transform(x=x, y=None)
@@ -437,18 +606,28 @@ class NeuralNetEnsemble:
                 y = model.predict_to_numpy_output(y)
             if scaler is not None:
                 _, y = scaler.inverse_transform(x=x, y=y)
+            if accumulator is not None:
+                accumulator.add(y)
+                continue
             y_list.append(y)
+        if accumulator is not None:
+            return accumulator.mean(), accumulator.std(reduction=reduction)
         return y_list
 
     def call(self, x, **kwargs):
         y_list = []
-        for i, (model, scaler) in enumerate(zip(self._models, self._scalers)):
+        for i, (model, scaler) in enumerate(zip(self._models, self._get_call_scalers())):
             x_i = x
             if scaler is not None:
                 x_i, _ = scaler.inverse_transform(x=x, y=None)
             if hasattr(model, "call_to_tensor_input"):
                 x_i = model.call_to_tensor_input(x_i)
-            y = model(x_i, **kwargs)
+            # Traced graph of warm-up, which only applies for inference.
+            inference = self._inference_functions[i] if i < len(self._inference_functions) else None
+            if inference is not None and not kwargs.get("training", False):
+                y = inference(x_i)
+            else:
+                y = model(x_i, **kwargs)
             if hasattr(model, "call_to_numpy_output"):
                 y = model.call_to_numpy_output(y)
             if scaler is not None:
@@ -456,6 +635,70 @@ class NeuralNetEnsemble:
             y_list.append(y)
         return y_list
 
+    def _get_fused_dtype(self):
+        # Input and output of the fused call in the widest compute dtype of the models, e.g. float64 for precision
+        # "float64". Models with mixed precision compute input and output in float32.
+        dtypes = [tf.as_dtype(getattr(model, "compute_dtype", None) or tf.float32) for model in self._models]
+        dtypes = [dtype for dtype in dtypes if dtype.is_floating]
+        return max(dtypes, key=lambda dtype: dtype.size) if len(dtypes) > 0 else tf.float32
+
+    def _make_fused_call(self, input_shape):
+        for i, model in enumerate(self._models):
+            if hasattr(model, "predict_to_tensor_input"):
+                raise NotImplementedError(
+                    "Fused call requires models with plain coordinate input, which is not the case for model %s" % i)
+
+        models = list(self._models)
+        scalers = self._get_call_scalers()
+        number_models = len(models)
+        dtype = self._get_fused_dtype()
+
+        def fused_call(x):
+            # All members are traced into the same graph. Scaler parameters are numpy arrays and therefore
+            # captured as constants on tracing.
+            y_list = []
+            for model, scaler in zip(models, scalers):
+                x_i = x
+                if scaler is not None:
+                    x_i, _ = scaler.inverse_transform(x=x, y=None)
+                y = model(x_i, training=False)
+                if scaler is not None:
+                    _, y = scaler.inverse_transform(x=x, y=y)
+                y_list.append(tf.nest.map_structure(lambda y_i: tf.cast(y_i, dtype), y))
+            y_stack = tf.nest.map_structure(lambda *args: tf.stack(args, axis=0), *y_list)
+            y_mean = tf.nest.map_structure(lambda y_i: tf.reduce_mean(y_i, axis=0), y_stack)
+            if number_models > 1:
+                y_std = tf.nest.map_structure(
+                    lambda y_i, m_i: tf.sqrt(tf.reduce_sum(tf.square(y_i - m_i), axis=0) / (number_models - 1)),
+                    y_stack, y_mean)
+            else:
+                y_std = tf.nest.map_structure(tf.zeros_like, y_mean)
+            return y_mean, y_std, y_list
+
+        signature = [tf.TensorSpec(shape=[None] + list(input_shape[1:]), dtype=dtype)]
+        self.logger.info("Tracing fused call for %s models with input %s" % (number_models, signature))
+        return tf.function(fused_call, input_signature=signature)
+
+    def call_fused(self, x):
+        """Call all models of the ensemble within a single graph execution.
+
+        The members are stacked into one `tf.function` in which the scaler is applied as constant transformation.
+        This avoids a separate dispatch and numpy conversion per model, as is the case for :obj:`call()`.
+        Only models that take coordinates as direct tensor input are supported.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(batch, atoms, 3)`.
+
+        Returns:
+            tuple: Mean, standard deviation and list of the output of each model as numpy arrays.
+        """
+        tf_x = tf.convert_to_tensor(x, dtype=self._get_fused_dtype())
+        if self._fused_call is None:
+            self._fused_call = self._make_fused_call(tf_x.shape)
+        y_mean, y_std, y_list = self._fused_call(tf_x)
+        to_numpy = lambda y: tf.nest.map_structure(lambda y_i: y_i.numpy(), y)
+        return to_numpy(y_mean), to_numpy(y_std), [to_numpy(y) for y in y_list]
+
     def __getitem__(self, item):
         return self._models[item]
 
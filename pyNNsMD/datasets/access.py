@@ -0,0 +1,194 @@
+"""
+Index-based access to the memory-mapped dataset of an ensemble.
+
+An :obj:`IndexedDataset` holds the (memory-mapped) arrays of :obj:`pyNNsMD.datasets.store` and a list of sample
+indices. Subsets like train and validation split only store indices. Data is read from disk when a batch or a full
+array of the subset is requested, so that the memory of batch-wise processing scales with the batch size.
+
+.. code-block:: python
+
+    dataset = IndexedDataset.from_directory("TestEnergyGradient/", ["geometries", "energies"])
+    data_train = dataset.subset(np.load("TestEnergyGradient/model_v0/train_index.npy"))
+    for batch in data_train.iter_batches(batch_size=32):
+        print(batch["geometries"].shape, batch["energies"].shape)
+
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from pyNNsMD.datasets.store import load_dataset, RaggedArray
+
+
+class IndexedDataset:
+    """View of selected samples of a dictionary of arrays with the same length."""
+
+    def __init__(self, arrays: dict, indices: np.ndarray = None):
+        """Initialize view.
+
+        Args:
+            arrays (dict): Arrays or :obj:`RaggedArray`, e.g. from :obj:`pyNNsMD.datasets.store.load_dataset`.
+            indices (np.ndarray): Indices of samples of this view. Default is None, which selects all samples.
+        """
+        self.arrays = arrays
+        lengths = set([len(x) for x in arrays.values()])
+        if len(lengths) > 1:
+            raise ValueError("Arrays of dataset have different length %s" % lengths)
+        self.total_length = lengths.pop() if len(lengths) > 0 else 0
+        if indices is None:
+            indices = np.arange(self.total_length)
+        self.indices = np.asarray(indices, dtype="int64")
+
+    @classmethod
+    def from_directory(cls, directory: str, keys: list = None, mmap_mode: str = "r"):
+        """Open the dataset of an ensemble directory with memory mapping.
+
+        Args:
+            directory (str): Ensemble directory.
+            keys (list): Names of arrays to open. Default is None.
+            mmap_mode (str): Memory map mode. Default is "r".
+
+        Returns:
+            IndexedDataset: View of all samples.
+        """
+        return cls(load_dataset(directory, keys=keys, mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def keys(self):
+        return list(self.arrays.keys())
+
+    def shape(self, key: str):
+        """Shape of an array for the samples of this view. Not defined for ragged arrays."""
+        array = self.arrays[key]
+        if isinstance(array, RaggedArray):
+            raise ValueError("Array %s is ragged and has no shape." % key)
+        return tuple([len(self)] + list(array.shape[1:]))
+
+    def subset(self, positions):
+        """Select samples by position within this view.
+
+        Args:
+            positions (np.ndarray): Positions in this view, e.g. train indices.
+
+        Returns:
+            IndexedDataset: New view that shares the arrays.
+        """
+        return IndexedDataset(self.arrays, self.indices[np.asarray(positions, dtype="int64")])
+
+    def take(self, key: str, positions=None):
+        """Read samples of an array into memory.
+
+        The indices are read in sorted order to access the memory map sequentially and returned in requested order.
+
+        Args:
+            key (str): Name of array.
+            positions (np.ndarray): Positions in this view. Default is None, which reads all samples of the view.
+
+        Returns:
+            np.ndarray: Samples or list of arrays for ragged arrays.
+        """
+        index = self.indices if positions is None else self.indices[np.asarray(positions, dtype="int64")]
+        array = self.arrays[key]
+        if isinstance(array, RaggedArray):
+            return [np.array(array[int(i)]) for i in index]
+        if len(index) > 1 and np.all(np.diff(index) == 1):
+            return np.array(array[index[0]:index[-1] + 1])
+        order = np.argsort(index, kind="stable")
+        values = np.empty((len(index),) + tuple(array.shape[1:]), dtype=array.dtype)
+        values[order] = array[index[order]]
+        return values
+
+    def __getitem__(self, key: str):
+        return self.take(key)
+
+    def batch(self, positions, keys: list = None):
+        """Read a batch of samples for multiple arrays.
+
+        Args:
+            positions (np.ndarray): Positions in this view.
+            keys (list): Names of arrays. Default is None, which reads all arrays.
+
+        Returns:
+            dict: Batch of samples for each array.
+        """
+        keys = self.keys() if keys is None else keys
+        return {key: self.take(key, positions) for key in keys}
+
+    def iter_batches(self, batch_size: int, keys: list = None, shuffle: bool = False, seed: int = None):
+        """Iterate over the view in batches.
+
+        Args:
+            batch_size (int): Number of samples per batch.
+            keys (list): Names of arrays. Default is None, which reads all arrays.
+            shuffle (bool): Whether to shuffle the samples. Default is False.
+            seed (int): Seed for shuffle. Default is None.
+
+        Yields:
+            dict: Batch of samples for each array.
+        """
+        positions = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(positions)
+        for start in range(0, len(self), batch_size):
+            yield self.batch(positions[start:start + batch_size], keys=keys)
+
+    def map_batches(self, function, batch_size: int, keys: list = None):
+        """Apply a function to each batch and concatenate the output.
+
+        Args:
+            function (callable): Function that takes a batch dictionary and returns an array or list of arrays.
+            batch_size (int): Number of samples per batch.
+            keys (list): Names of arrays. Default is None, which reads all arrays.
+
+        Returns:
+            Concatenated output with the same structure as the output of `function`.
+        """
+        outputs = [function(batch) for batch in self.iter_batches(batch_size, keys=keys)]
+        if len(outputs) == 0:
+            return []
+        if isinstance(outputs[0], (list, tuple)):
+            return [np.concatenate([np.asarray(y[i]) for y in outputs], axis=0) for i in range(len(outputs[0]))]
+        return np.concatenate([np.asarray(y) for y in outputs], axis=0)
+
+
+class BatchSequence(tf.keras.utils.Sequence):
+    """Keras sequence that reads batches of an :obj:`IndexedDataset` and converts them to model input and target.
+
+    Can be passed to `fit()` and `predict()` of a keras model instead of numpy arrays.
+    """
+
+    def __init__(self, dataset: IndexedDataset, batch_size: int, transform, keys: list = None,
+                 shuffle: bool = False, seed: int = None, **kwargs):
+        """Initialize sequence.
+
+        Args:
+            dataset (IndexedDataset): View of the samples.
+            batch_size (int): Number of samples per batch.
+            transform (callable): Function that takes a batch dictionary and returns a tuple of `(x, y)`.
+            keys (list): Names of arrays to read. Default is None, which reads all arrays.
+            shuffle (bool): Whether to shuffle samples after each epoch. Default is False.
+            seed (int): Seed for shuffle. Default is None.
+        """
+        super(BatchSequence, self).__init__(**kwargs)
+        self.dataset = dataset
+        self.batch_size = int(batch_size)
+        self.transform = transform
+        self.keys = keys
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        self._positions = np.arange(len(dataset))
+        if self.shuffle:
+            self._rng.shuffle(self._positions)
+
+    def __len__(self):
+        return int(np.ceil(len(self.dataset) / self.batch_size))
+
+    def __getitem__(self, item):
+        positions = self._positions[item * self.batch_size:(item + 1) * self.batch_size]
+        return self.transform(self.dataset.batch(positions, keys=self.keys))
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._positions)
@@ -0,0 +1,146 @@
+"""
+Batch-wise evaluation of a fitted model on the train and validation split.
+
+The model is predicted once per split in batches of the model input of :obj:`pyNNsMD.datasets.pipeline`. The error
+statistics for the fit error and the plots of the training scripts are accumulated per batch with
+:obj:`ErrorStatistics`, so that no full split of targets or predictions is held in memory.
+
+.. code-block:: python
+
+    stats_val, _ = evaluate_split(out_model, xval, data_val, ["energies"], inverse_transform, batch_size=32)
+    print(stats_val[0].mae())
+
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from pyNNsMD.datasets.access import IndexedDataset
+
+
+class ErrorStatistics:
+    """Streaming absolute error of predictions of a split.
+
+    Keeps the mean and maximum absolute error for each flattened component of the output and a random subset of
+    samples for scatter plots.
+    """
+
+    def __init__(self, num_samples: int, max_scatter: int = 10000, seed: int = 0):
+        """Initialize statistics.
+
+        Args:
+            num_samples (int): Number of samples of the split.
+            max_scatter (int): Maximum number of samples kept for scatter plots. Default is 10000.
+            seed (int): Seed for the selection of scatter samples. Default is 0.
+        """
+        self.num_samples = int(num_samples)
+        self.count = 0
+        self._sum_error = None
+        self._max_error = None
+        self._true_at_max = None
+        scatter = np.random.default_rng(seed).permutation(self.num_samples)[:max_scatter]
+        self._is_scatter = np.zeros(self.num_samples, dtype="bool")
+        self._is_scatter[scatter] = True
+        self._scatter_pred = []
+        self._scatter_true = []
+
+    def update(self, y_pred, y_true):
+        """Add a batch of predictions.
+
+        Args:
+            y_pred (np.ndarray): Predictions of the batch.
+            y_true (np.ndarray): Targets of the batch.
+
+        Returns:
+            self
+        """
+        y_pred = np.reshape(np.asarray(y_pred, dtype="float64"), (len(y_pred), -1))
+        y_true = np.reshape(np.asarray(y_true, dtype="float64"), (len(y_true), -1))
+        error = np.abs(y_pred - y_true)
+        if self._sum_error is None:
+            self._sum_error = np.zeros(error.shape[1])
+            self._max_error = np.full(error.shape[1], -np.inf)
+            self._true_at_max = np.zeros(error.shape[1])
+        self._sum_error += np.sum(error, axis=0)
+        index_max = np.argmax(error, axis=0)
+        batch_max = np.take_along_axis(error, index_max[None], axis=0)[0]
+        is_larger = batch_max > self._max_error
+        self._max_error[is_larger] = batch_max[is_larger]
+        self._true_at_max[is_larger] = np.take_along_axis(y_true, index_max[None], axis=0)[0][is_larger]
+        is_scatter = self._is_scatter[self.count:self.count + len(error)]
+        self._scatter_pred.append(y_pred[is_scatter])
+        self._scatter_true.append(y_true[is_scatter])
+        self.count += len(error)
+        return self
+
+    def mae(self):
+        """Mean absolute error over all samples and components."""
+        return np.mean(self.mean_error())
+
+    def mean_error(self):
+        """Mean absolute error of each flattened component."""
+        if self._sum_error is None:
+            return np.full(1, np.nan)
+        return self._sum_error / self.count
+
+    def max_error(self):
+        """Maximum absolute error of each flattened component and the error relative to the target."""
+        if self._max_error is None:
+            return np.full(1, np.nan), np.full(1, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._max_error, self._max_error / np.abs(self._true_at_max)
+
+    def scatter(self):
+        """Flattened predictions and targets of the scatter samples."""
+        if len(self._scatter_pred) == 0:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self._scatter_pred, axis=0), np.concatenate(self._scatter_true, axis=0)
+
+
+def iter_model_input(x, batch_size: int):
+    """Iterate over the model input of a split in batches in the order of the samples.
+
+    Args:
+        x: Input of `predict()` from :obj:`pyNNsMD.datasets.pipeline.make_feature_input`, either (a list of) arrays or
+            a `tf.data.Dataset` of `(x, y)` batches.
+        batch_size (int): Batch size. Must match the batch size of a `tf.data.Dataset`.
+
+    Yields:
+        Batch of model input.
+    """
+    if isinstance(x, tf.data.Dataset):
+        for x_batch, _ in x:
+            yield x_batch
+        return
+    num_samples = len(tf.nest.flatten(x)[0])
+    for start in range(0, num_samples, batch_size):
+        yield tf.nest.map_structure(lambda x_i: x_i[start:start + batch_size], x)
+
+
+def evaluate_split(model, x, data: IndexedDataset, keys: list, inverse_transform, batch_size: int,
+                   max_scatter: int = 10000):
+    """Predict a split once in batches and accumulate the error of each output.
+
+    Args:
+        model (tf.keras.Model): Fitted model.
+        x: Model input of the split in the order of `data`, see :obj:`iter_model_input`.
+        data (IndexedDataset): View of the split with the targets.
+        keys (list): Names of the target arrays in the order of the outputs of `inverse_transform`.
+        inverse_transform (callable): Function that takes the output of `model.predict_on_batch()` and returns a list of
+            unscaled predictions for `keys`.
+        batch_size (int): Batch size of `x`.
+        max_scatter (int): Maximum number of samples kept for scatter plots. Default is 10000.
+
+    Returns:
+        tuple: List of :obj:`ErrorStatistics` for each key and the unscaled predictions of the first batch.
+    """
+    stats = [ErrorStatistics(len(data), max_scatter=max_scatter) for _ in keys]
+    first_batch = None
+    batches = data.iter_batches(batch_size, keys=keys)
+    for x_batch, y_batch in zip(iter_model_input(x, batch_size), batches):
+        y_pred = inverse_transform(model.predict_on_batch(x_batch))
+        for key, y_i, stats_i in zip(keys, y_pred, stats):
+            stats_i.update(y_i, y_batch[key])
+        if first_batch is None:
+            first_batch = y_pred
+    return stats, first_batch
@@ -0,0 +1,335 @@
+"""
+Content-addressed disk cache of precomputed features that is shared by the models of an ensemble.
+
+Models with precomputed features train on geometric features and their derivative with respect to coordinates. The
+members of an ensemble usually compute identical features for the same geometries, since they share the feature index
+and the scaling of coordinates. The cache stores the features of all samples of the dataset as `.npy` files in the
+folder `feature_cache` of the ensemble directory. An entry is addressed by a hash of the geometries, the feature
+definition of the model and the `x` transformation of the scaler. The first model computes and saves an entry, while
+other training processes wait for it and open it with memory mapping.
+
+.. code-block:: python
+
+    cache = FeatureCache(os.path.join("TestEnergyGradient", FEATURE_CACHE_FOLDER))
+    feat, feat_grad = cache.get_or_compute(dataset, model, scaler, batch_size=32)
+    feat_train, feat_grad_train = feat[i_train], feat_grad[i_train]
+
+"""
+
+import os
+import json
+import time
+import shutil
+import socket
+import hashlib
+import logging
+
+import numpy as np
+
+from pyNNsMD.datasets.access import IndexedDataset
+from pyNNsMD.datasets.store import RaggedArray
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+FEATURE_CACHE_FOLDER = "feature_cache"
+FEATURE_CACHE_VERSION = 1
+FEATURE_FILES = ["features.npy", "feature_derivatives.npy"]
+INFO_FILE = "info.json"
+DIGEST_FILE = "digests.json"
+
+
+def _update_hash(sha, array: np.ndarray, chunk_size: int = 65536):
+    sha.update(str(array.dtype.str).encode())
+    sha.update(str(tuple(array.shape)).encode())
+    for start in range(0, len(array), chunk_size):
+        sha.update(np.ascontiguousarray(array[start:start + chunk_size]).tobytes())
+
+
+def array_digest(array):
+    """Hash of the content of an array or :obj:`RaggedArray`.
+
+    Args:
+        array (np.ndarray, RaggedArray): Array, which is read in chunks if memory-mapped.
+
+    Returns:
+        str: Hex digest.
+    """
+    sha = hashlib.sha1()
+    if isinstance(array, RaggedArray):
+        _update_hash(sha, np.asarray(array.values))
+        _update_hash(sha, array.shapes)
+    else:
+        _update_hash(sha, np.asarray(array) if not isinstance(array, np.ndarray) else array)
+    return sha.hexdigest()
+
+
+def _get_filename(array):
+    values = array.values if isinstance(array, RaggedArray) else array
+    file_name = getattr(values, "filename", None)
+    return os.path.abspath(file_name) if file_name is not None else None
+
+
+def get_feature_definition(model):
+    """Definition of the precomputed features of a model.
+
+    Args:
+        model (ks.Model): Model with a :obj:`pyNNsMD.layers.features.FeatureGeometric` layer `feat_layer`.
+
+    Returns:
+        dict: Feature layer, atom index of each feature type, dtype and whether the feature derivative is sparse.
+    """
+    feat_layer = model.feat_layer
+    return {"layer": type(feat_layer).__name__,
+            "index": [np.asarray(x).tolist() if x is not None else None for x in feat_layer.get_mol_index()],
+            "dtype": str(model.compute_dtype),
+            "sparse": bool(getattr(model, "sparse_feature_derivative", False))}
+
+
+def get_scaler_definition(scaler):
+    """Transformation of coordinates of a scaler.
+
+    Args:
+        scaler (ScalerBase): Scaler that implements `get_affine_transform()` or None for no scaling.
+
+    Returns:
+        list: Scale and offset of `x` or None.
+    """
+    if scaler is None:
+        return None
+    return [np.asarray(x, dtype="float64").tolist() for x in scaler.get_affine_transform()["x"]]
+
+
+class FeatureCache:
+    """Disk cache of features and feature derivatives of all samples of a dataset.
+
+    Entries are folders named by their key with `.npy` files of the features and a json info file, which is written
+    last and marks the entry complete. A lock file next to the entry makes sure that only one process computes it.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 4, wait_timeout: float = None, poll_interval: float = 0.5,
+                 logger=None):
+        """Initialize cache.
+
+        Args:
+            directory (str): Folder of the cache, e.g. `feature_cache` in the ensemble directory.
+            max_entries (int): Number of entries to keep. The least recently used entries are removed, when a new
+                entry is saved. Default is 4.
+            wait_timeout (float): Time in seconds to wait for another process to compute an entry, after which the
+                features are computed without cache. Default is None, which waits as long as the process is alive.
+            poll_interval (float): Time in seconds between checks for an entry of another process. Default is 0.5.
+            logger: Logger for this class.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.logger = module_logger if logger is None else logger
+
+    def _entry_path(self, key: str):
+        return os.path.join(self.directory, key)
+
+    def _lock_path(self, key: str):
+        return os.path.join(self.directory, key + ".lock")
+
+    def geometry_digest(self, data: IndexedDataset, key: str = "geometries"):
+        """Hash of the geometries of all samples of a dataset.
+
+        The hash of a memory-mapped file is stored in the cache folder together with size and modification time of
+        the file, so that an unchanged dataset is not read again.
+
+        Args:
+            data (IndexedDataset): Dataset or view of the dataset.
+            key (str): Name of the coordinate array. Default is "geometries".
+
+        Returns:
+            str: Hex digest.
+        """
+        array = data.arrays[key]
+        file_name = _get_filename(array)
+        if file_name is None:
+            return array_digest(array)
+        stat = os.stat(file_name)
+        file_info = [stat.st_size, stat.st_mtime_ns]
+        digest_path = os.path.join(self.directory, DIGEST_FILE)
+        digests = {}
+        if os.path.exists(digest_path):
+            try:
+                with open(digest_path, "r") as f:
+                    digests = json.load(f)
+            except ValueError:
+                digests = {}
+        if file_name in digests and digests[file_name]["file"] == file_info:
+            return digests[file_name]["digest"]
+        digest = array_digest(array)
+        digests[file_name] = {"file": file_info, "digest": digest}
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = "%s.%s.tmp" % (digest_path, os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump(digests, f)
+        os.replace(temp_path, digest_path)
+        return digest
+
+    def get_key(self, data: IndexedDataset, model, scaler=None):
+        """Key of the features of a dataset for a model and scaler.
+
+        Args:
+            data (IndexedDataset): Dataset or view of the dataset. All samples of the dataset are used.
+            model (ks.Model): Model with precomputed features.
+            scaler (ScalerBase): Scaler that transforms the coordinates for the model. Default is None.
+
+        Returns:
+            str: Hex digest of geometries, feature definition and scaling.
+        """
+        definition = {"version": FEATURE_CACHE_VERSION, "geometries": self.geometry_digest(data),
+                      "features": get_feature_definition(model), "scaler": get_scaler_definition(scaler)}
+        return hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+    def load(self, key: str, mmap_mode: str = "r"):
+        """Open a complete entry of the cache.
+
+        Args:
+            key (str): Key of the entry.
+            mmap_mode (str): Memory map mode for :obj:`np.load`. Default is "r".
+
+        Returns:
+            list: Features and feature derivatives or None if there is no complete entry.
+        """
+        entry_path = self._entry_path(key)
+        info_path = os.path.join(entry_path, INFO_FILE)
+        if not os.path.exists(info_path):
+            return None
+        # Modification time of the info file is used to remove least recently used entries.
+        os.utime(info_path)
+        return [np.load(os.path.join(entry_path, x), mmap_mode=mmap_mode) for x in FEATURE_FILES]
+
+    def _acquire(self, key: str):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            fd = os.open(self._lock_path(key), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write("%s %s" % (socket.gethostname(), os.getpid()))
+        return True
+
+    def _release(self, key: str):
+        if os.path.exists(self._lock_path(key)):
+            os.remove(self._lock_path(key))
+
+    def _read_lock(self, key: str):
+        try:
+            with open(self._lock_path(key), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _is_stale(lock: str):
+        # Only processes on the same host can be checked. On windows os.kill() would terminate the process.
+        if os.name != "posix" or lock is None:
+            return False
+        try:
+            host, pid = lock.split()
+            if host != socket.gethostname():
+                return False
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            return False
+        return False
+
+    def _compute(self, key: str, data: IndexedDataset, model, scaler, batch_size: int, coordinates: str):
+        entry_path = self._entry_path(key)
+        if os.path.exists(entry_path):
+            shutil.rmtree(entry_path)
+        os.makedirs(entry_path)
+        dataset = IndexedDataset(data.arrays)
+        temp_paths = [os.path.join(entry_path, x + ".tmp.npy") for x in FEATURE_FILES]
+        out, start_time = None, time.time()
+        for start, batch in zip(range(0, len(dataset), batch_size),
+                                dataset.iter_batches(batch_size, keys=[coordinates])):
+            x = batch[coordinates]
+            if scaler is not None:
+                x, _ = scaler.transform(x=x)
+            values = model.precompute_feature_in_chunks(x, batch_size=batch_size)
+            if out is None:
+                out = [np.lib.format.open_memmap(path, mode="w+", dtype=y.dtype, shape=(len(dataset),) + y.shape[1:])
+                       for path, y in zip(temp_paths, values)]
+            for array, y in zip(out, values):
+                array[start:start + len(y)] = y
+        for array in out:
+            array.flush()
+        del out
+        for temp_path, name in zip(temp_paths, FEATURE_FILES):
+            os.replace(temp_path, os.path.join(entry_path, name))
+        with open(os.path.join(entry_path, INFO_FILE), "w") as f:
+            json.dump({"version": FEATURE_CACHE_VERSION, "length": len(dataset), "model": type(model).__name__,
+                       "time": time.time() - start_time}, f)
+        self.logger.info("Saved features of %s samples to cache %s" % (len(dataset), key))
+
+    def _prune(self, keep: str):
+        if self.max_entries is None or not os.path.exists(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            info_path = os.path.join(self.directory, name, INFO_FILE)
+            if name != keep and os.path.exists(info_path) and not os.path.exists(self._lock_path(name)):
+                entries.append((os.path.getmtime(info_path), name))
+        for _, name in sorted(entries, reverse=True)[max(self.max_entries - 1, 0):]:
+            shutil.rmtree(self._entry_path(name), ignore_errors=True)
+            self.logger.info("Removed feature cache %s" % name)
+
+    def get_or_compute(self, data: IndexedDataset, model, scaler=None, batch_size: int = 32,
+                       coordinates: str = "geometries", mmap_mode: str = "r"):
+        """Features and feature derivatives of all samples of a dataset from cache or computed and saved.
+
+        Args:
+            data (IndexedDataset): Dataset or view of the dataset. Features are returned for all samples of the
+                dataset and must be indexed with `data.indices` for a view.
+            model (ks.Model): Model that implements `precompute_feature_in_chunks`.
+            scaler (ScalerBase): Scaler to transform coordinates before features are computed. Default is None.
+            batch_size (int): Number of samples to compute features for at once. Default is 32.
+            coordinates (str): Name of the coordinate array in `data`. Default is "geometries".
+            mmap_mode (str): Memory map mode for :obj:`np.load`. Default is "r".
+
+        Returns:
+            list: Features and feature derivatives, which are memory-mapped from the cache.
+        """
+        key = self.get_key(data, model, scaler)
+        start_time = time.time()
+        while True:
+            values = self.load(key, mmap_mode=mmap_mode)
+            if values is not None:
+                self.logger.info("Using features from cache %s" % key)
+                return values
+            if self._acquire(key):
+                try:
+                    # Another process could have finished the entry after the check above.
+                    if not os.path.exists(os.path.join(self._entry_path(key), INFO_FILE)):
+                        self._compute(key, data, model, scaler, batch_size, coordinates)
+                        self._prune(keep=key)
+                finally:
+                    self._release(key)
+                continue
+            lock = self._read_lock(key)
+            if self._is_stale(lock):
+                # Check that the lock was not taken by another process in the meantime.
+                if self._read_lock(key) == lock:
+                    self.logger.warning("Removing lock of feature cache %s of a process that is not running." % key)
+                    self._release(key)
+                continue
+            if self.wait_timeout is not None and time.time() - start_time > self.wait_timeout:
+                self.logger.warning("Timeout for feature cache %s, computing features without cache." % key)
+                x = IndexedDataset(data.arrays)[coordinates]
+                if scaler is not None:
+                    x, _ = scaler.transform(x=x)
+                return list(model.precompute_feature_in_chunks(x, batch_size=batch_size))
+            time.sleep(self.poll_interval)
+
+    def clear(self):
+        """Remove all entries of the cache."""
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
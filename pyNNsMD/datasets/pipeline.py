@@ -0,0 +1,195 @@
+"""
+Input pipelines for training with precomputed features.
+
+Models with precomputed features take the features and their derivative with respect to coordinates as input. The
+pipeline is selected with the training config key `feature_pipeline`:
+
+    - "precompute": Compute features for the full split in memory before training (default).
+    - "stream": Compute features on the fly for each batch with a `tf.data` pipeline with parallel map and prefetch.
+    - "cache": Compute features once during the first epoch and cache them to disk shards in the model directory.
+
+The memory of "stream" and "cache" only scales with the batch size, since the feature derivatives of shape
+`(batch, features, atoms, 3)` are not held for the full dataset.
+
+Features of all samples can be passed from the shared disk cache of :obj:`pyNNsMD.datasets.features.FeatureCache`
+for "precompute" and "cache", in which case the pipelines read them from the memory-mapped cache instead of
+computing them.
+"""
+
+import os
+import shutil
+import logging
+
+import numpy as np
+import tensorflow as tf
+
+from pyNNsMD.datasets.access import IndexedDataset
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+FEATURE_PIPELINES = ["precompute", "stream", "cache"]
+
+
+def _as_target(y, target_names: list = None):
+    if not isinstance(y, (list, tuple)):
+        return y
+    if target_names is not None:
+        return {key: value for key, value in zip(target_names, y)}
+    return tuple(y)
+
+
+def make_feature_dataset(data: IndexedDataset, model, transform, batch_size: int, pipeline: str = "stream",
+                         cache_path: str = None, shuffle: bool = False, seed: int = None, target_names: list = None,
+                         shuffle_buffer: int = None, num_parallel_calls: int = tf.data.AUTOTUNE,
+                         features: list = None):
+    """Make a `tf.data.Dataset` of feature input and scaled targets of a model with precomputed features.
+
+    Samples are read from the memory-mapped dataset and scaled with `transform` in a `tf.numpy_function`. Features
+    and their derivatives are computed by `model.predict_chunk_feature` for each batch.
+
+    Args:
+        data (IndexedDataset): View of the samples, e.g. the train split.
+        model (tf.keras.Model): Model that implements `predict_chunk_feature`.
+        transform (callable): Function that takes a batch dictionary and returns scaled `(x, y)` as numpy arrays,
+            where `y` is an array or a list of arrays.
+        batch_size (int): Batch size.
+        pipeline (str): Either "stream" or "cache". Default is "stream".
+        cache_path (str): File prefix of the disk cache for "cache". Default is None, which caches in memory.
+        shuffle (bool): Whether to shuffle samples in each epoch. Default is False.
+        seed (int): Seed for shuffle. Default is None.
+        target_names (list): Names to return a list of targets as dictionary. Default is None.
+        shuffle_buffer (int): Number of samples to shuffle from cache. Default is None, which uses 16 batches.
+        num_parallel_calls (int): Parallel calls of map. Default is `tf.data.AUTOTUNE`.
+        features (list): Features and feature derivatives of all samples of the dataset, e.g. from
+            :obj:`pyNNsMD.datasets.features.FeatureCache`, which are read instead of computed. Only for "cache", for
+            which they replace the `tf.data` cache. Default is None.
+
+    Returns:
+        tf.data.Dataset: Dataset of `((features, feature_derivatives), targets)` batches.
+    """
+    if pipeline not in ["stream", "cache"]:
+        raise ValueError("Unknown feature pipeline %s for tf.data, use 'stream' or 'cache'." % pipeline)
+    if pipeline == "stream" and features is not None:
+        raise ValueError("Features can not be passed for 'stream' pipeline, which computes features per batch.")
+
+    # Infer output structure and shapes from a single sample.
+    x_0, y_0 = transform(data.batch(np.arange(min(1, len(data)))))
+    multiple_targets = isinstance(y_0, (list, tuple))
+    y_0 = list(y_0) if multiple_targets else [y_0]
+    output_shapes = [(None,) + np.shape(x_0)[1:]] + [(None,) + np.shape(y)[1:] for y in y_0]
+    feature_view = None
+    if features is not None:
+        feature_view = IndexedDataset({"features": features[0], "feature_derivatives": features[1]}, data.indices)
+        output_shapes = [(None,) + tuple(x.shape[1:]) for x in features] + output_shapes[1:]
+
+    # Coordinates and targets in the dtype of features and output of the model, e.g. float64 for "float64".
+    dtype = tf.as_dtype(model.compute_dtype)
+
+    def read_batch(positions):
+        x, y = transform(data.batch(positions))
+        y = y if multiple_targets else [y]
+        x = [x] if feature_view is None else [feature_view.take(key, positions) for key in feature_view.keys()]
+        return tuple([np.asarray(value, dtype=dtype.as_numpy_dtype) for value in x + y])
+
+    def tf_read_batch(positions):
+        out = tf.numpy_function(read_batch, [positions], [dtype] * len(output_shapes))
+        return tuple([tf.ensure_shape(value, shape) for value, shape in zip(out, output_shapes)])
+
+    def tf_compute_features(x, *y):
+        feat, feat_grad = model.predict_chunk_feature(x)
+        return (feat, feat_grad) + tuple(y)
+
+    def tf_to_structure(feat, feat_grad, *y):
+        return (feat, feat_grad), _as_target(list(y) if multiple_targets else y[0], target_names)
+
+    ds = tf.data.Dataset.from_tensor_slices(np.arange(len(data), dtype="int64"))
+    if pipeline == "stream" or features is not None:
+        if shuffle:
+            ds = ds.shuffle(len(data), seed=seed, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size)
+        ds = ds.map(tf_read_batch, num_parallel_calls=num_parallel_calls)
+        if features is None:
+            ds = ds.map(tf_compute_features, num_parallel_calls=num_parallel_calls)
+    else:
+        # Cache batches in sample order, so that datasets with and without shuffle share the cache.
+        ds = ds.batch(batch_size)
+        ds = ds.map(tf_read_batch, num_parallel_calls=num_parallel_calls)
+        ds = ds.map(tf_compute_features, num_parallel_calls=num_parallel_calls)
+        ds = ds.cache(cache_path if cache_path is not None else "")
+        if shuffle:
+            ds = ds.unbatch()
+            ds = ds.shuffle(shuffle_buffer if shuffle_buffer is not None else 16 * batch_size, seed=seed,
+                            reshuffle_each_iteration=True)
+            ds = ds.batch(batch_size)
+    ds = ds.map(tf_to_structure)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def make_feature_input(data_train: IndexedDataset, data_val: IndexedDataset, model, transform, batch_size: int,
+                       pipeline: str = "precompute", cache_dir: str = None, target_names: list = None,
+                       seed: int = None, features: list = None):
+    """Make training and validation input of a model with precomputed features for the selected pipeline.
+
+    Args:
+        data_train (IndexedDataset): View of the training samples.
+        data_val (IndexedDataset): View of the validation samples.
+        model (tf.keras.Model): Model that implements `predict_chunk_feature` and `precompute_feature_in_chunks`.
+        transform (callable): Function that takes a batch dictionary and returns scaled `(x, y)`.
+        batch_size (int): Batch size.
+        pipeline (str): Feature pipeline "precompute", "stream" or "cache". Default is "precompute".
+        cache_dir (str): Directory for disk cache of "cache". Previous cache files are removed. Default is None.
+        target_names (list): Names to return a list of targets as dictionary. Default is None.
+        seed (int): Seed for shuffle of "stream" and "cache". Default is None.
+        features (list): Features and feature derivatives of all samples of the dataset, e.g. from
+            :obj:`pyNNsMD.datasets.features.FeatureCache`. If given, no features are computed. Not supported for
+            "stream". Default is None.
+
+    Returns:
+        tuple: `(fit_kwargs, x_train, x_val)` with keyword arguments for `fit()` of data and validation data,
+            and input for `predict()` of the training and validation samples in the order of the views.
+    """
+    if pipeline not in FEATURE_PIPELINES:
+        raise ValueError("Unknown feature pipeline %s, must be in %s." % (pipeline, FEATURE_PIPELINES))
+    if pipeline == "stream" and features is not None:
+        raise ValueError("Features can not be passed for 'stream' pipeline, which computes features per batch.")
+
+    if pipeline == "precompute":
+        def scale_and_precompute(batch):
+            x, y = transform(batch)
+            y = list(y) if isinstance(y, (list, tuple)) else [y]
+            if features is not None:
+                return y
+            return list(model.precompute_feature_in_chunks(x, batch_size=batch_size)) + y
+
+        out = []
+        for data in [data_train, data_val]:
+            if features is not None:
+                y = data.map_batches(scale_and_precompute, batch_size=batch_size)
+                feature_view = IndexedDataset({"features": features[0], "feature_derivatives": features[1]},
+                                              data.indices)
+                feat, feat_grad = feature_view["features"], feature_view["feature_derivatives"]
+            else:
+                feat, feat_grad, *y = data.map_batches(scale_and_precompute, batch_size=batch_size)
+            out.append(([feat, feat_grad], _as_target(y if len(y) > 1 else y[0], target_names)))
+        (x_train, y_train), (x_val, y_val) = out
+        fit_kwargs = {"x": x_train, "y": y_train, "batch_size": batch_size, "validation_data": (x_val, y_val)}
+        return fit_kwargs, x_train, x_val
+
+    cache_train, cache_val = None, None
+    if pipeline == "cache" and cache_dir is not None and features is None:
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.makedirs(cache_dir)
+        cache_train, cache_val = os.path.join(cache_dir, "train"), os.path.join(cache_dir, "valid")
+    module_logger.info("Using '%s' feature pipeline." % pipeline)
+
+    kwargs = {"model": model, "transform": transform, "batch_size": batch_size, "pipeline": pipeline,
+              "target_names": target_names, "features": features}
+    ds_train = make_feature_dataset(data_train, cache_path=cache_train, shuffle=True, seed=seed, **kwargs)
+    ds_val = make_feature_dataset(data_val, cache_path=cache_val, **kwargs)
+    # With disk cache the ordered training dataset reads the cache of the shuffled dataset after fit.
+    ds_train_ordered = make_feature_dataset(data_train, cache_path=cache_train, **kwargs)
+    fit_kwargs = {"x": ds_train, "validation_data": ds_val}
+    return fit_kwargs, ds_train_ordered, ds_val
@@ -0,0 +1,368 @@
+"""
+Binary dataset store for the data of a :obj:`NeuralNetEnsemble`.
+
+Each array is saved as a `.npy` file in the folder `dataset` of the ensemble directory together with a small json
+manifest. Arrays of molecules with different size are stored as flat values plus the shape of each sample. Arrays
+are opened with memory mapping, so that only the accessed samples are read from disk.
+
+New samples are added with :obj:`append_dataset`, which copies the existing arrays chunk-wise.
+
+Directories with `geometries.xyz` and `energies.json`, `forces.json` or `couplings.json` can be converted with
+:obj:`convert_dataset` or from the command line:
+
+.. code-block:: bash
+
+    python -m pyNNsMD.datasets.store TestEnergyGradient/
+
+"""
+
+import os
+import json
+import argparse
+import logging
+
+import numpy as np
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+DATASET_FOLDER = "dataset"
+MANIFEST_FILE = "manifest.json"
+DATASET_VERSION = 1
+LEGACY_FILES = {"geometries": "geometries.xyz", "atoms": "geometries.xyz", "energies": "energies.json",
+                "forces": "forces.json", "couplings": "couplings.json"}
+
+
+class RaggedArray:
+    """Read-only list of arrays with different shape that are stored in one flat array.
+
+    Indexing with an integer returns a view of a single sample. Indexing with a slice or index array returns a list
+    of arrays.
+    """
+
+    def __init__(self, values: np.ndarray, shapes: np.ndarray):
+        """Initialize from flat values and per-sample shapes.
+
+        Args:
+            values (np.ndarray): Flattened and concatenated samples.
+            shapes (np.ndarray): Shape of each sample of shape `(N, ndim)`.
+        """
+        self.values = values
+        self.shapes = np.asarray(shapes, dtype="int64")
+        sizes = np.prod(self.shapes, axis=-1) if self.shapes.shape[-1] > 0 else np.ones(len(self.shapes), "int64")
+        self.offsets = np.concatenate([np.zeros(1, dtype="int64"), np.cumsum(sizes)])
+        self.dtype = values.dtype
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def _get_item(self, i):
+        return self.values[self.offsets[i]:self.offsets[i + 1]].reshape(self.shapes[i])
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self._get_item(int(item) % len(self))
+        if isinstance(item, slice):
+            return [self._get_item(i) for i in range(*item.indices(len(self)))]
+        return [self._get_item(int(i)) for i in np.arange(len(self))[item]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get_item(i)
+
+    def tolist(self):
+        return [x.tolist() for x in self]
+
+
+def _as_array(values):
+    """Convert values to a regular numpy array or a :obj:`RaggedArray` for samples of different shape."""
+    if isinstance(values, (np.ndarray, RaggedArray)):
+        return values
+    samples = [np.asarray(x) for x in values]
+    if len(samples) > 0 and all(x.shape == samples[0].shape for x in samples):
+        return np.stack(samples, axis=0)
+    values = np.concatenate([x.reshape(-1) for x in samples], axis=0) if len(samples) > 0 else np.zeros(0)
+    shapes = np.array([x.shape for x in samples], dtype="int64")
+    return RaggedArray(values, shapes)
+
+
+def _save_npy(file_path: str, array: np.ndarray):
+    # Write to temporary file first, so that memory-mapped readers do not see a partially written file.
+    temp_path = file_path + ".tmp.npy"
+    np.save(temp_path, np.ascontiguousarray(array))
+    os.replace(temp_path, file_path)
+
+
+def get_dataset_path(directory: str):
+    """Return folder of the binary dataset in an ensemble directory."""
+    return os.path.join(directory, DATASET_FOLDER)
+
+
+def has_dataset(directory: str):
+    """Whether the directory contains a binary dataset."""
+    return os.path.exists(os.path.join(get_dataset_path(directory), MANIFEST_FILE))
+
+
+def load_manifest(directory: str):
+    """Load the manifest of the binary dataset or return an empty manifest."""
+    manifest_path = os.path.join(get_dataset_path(directory), MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"version": DATASET_VERSION, "length": None, "arrays": {}}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_dataset(directory: str, **arrays):
+    """Save arrays to the binary dataset of a directory. Existing arrays with the same name are replaced.
+
+    Args:
+        directory (str): Ensemble directory.
+        arrays: Arrays with the same length, e.g. `geometries=..., energies=...`. Lists of samples with different
+            shape are stored ragged. None values are ignored.
+
+    Returns:
+        dict: Manifest of the dataset.
+    """
+    arrays = {key: _as_array(value) for key, value in arrays.items() if value is not None}
+    data_length = set([len(x) for x in arrays.values()])
+    if len(data_length) > 1:
+        raise ValueError("Received different data length for %s" % data_length)
+
+    dataset_path = get_dataset_path(directory)
+    os.makedirs(dataset_path, exist_ok=True)
+    manifest = load_manifest(directory)
+    for key, value in arrays.items():
+        if value.dtype.kind == "O":
+            value = value.astype("str")
+        if isinstance(value, RaggedArray):
+            values = value.values.astype("str") if value.values.dtype.kind == "O" else value.values
+            _save_npy(os.path.join(dataset_path, key + ".npy"), values)
+            _save_npy(os.path.join(dataset_path, key + "_shapes.npy"), value.shapes)
+            manifest["arrays"][key] = {"file": key + ".npy", "shapes": key + "_shapes.npy", "ragged": True,
+                                       "dtype": values.dtype.str, "length": len(value)}
+        else:
+            _save_npy(os.path.join(dataset_path, key + ".npy"), value)
+            manifest["arrays"][key] = {"file": key + ".npy", "ragged": False, "dtype": value.dtype.str,
+                                       "shape": list(value.shape), "length": len(value)}
+    return _save_manifest(directory, manifest)
+
+
+def _append_npy(file_path: str, values: np.ndarray, chunk_size: int = 65536):
+    # Existing samples are copied chunk-wise into a memory-mapped file, so that the array is never fully in memory.
+    old = np.load(file_path, mmap_mode="r")
+    if tuple(old.shape[1:]) != tuple(values.shape[1:]):
+        raise ValueError("Can not append samples of shape %s to %s." % (values.shape[1:], old.shape[1:]))
+    temp_path = file_path + ".tmp.npy"
+    out = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.result_type(old.dtype, values.dtype),
+                                    shape=(len(old) + len(values),) + tuple(old.shape[1:]))
+    for start in range(0, len(old), chunk_size):
+        stop = min(start + chunk_size, len(old))
+        out[start:stop] = old[start:stop]
+    out[len(old):] = values
+    out.flush()
+    dtype = out.dtype
+    del out, old
+    os.replace(temp_path, file_path)
+    return dtype
+
+
+def append_dataset(directory: str, **arrays):
+    """Append samples to the binary dataset of a directory.
+
+    All arrays of the dataset must be given with the same number of new samples. Existing samples are not read into
+    memory. If there is no dataset yet, the arrays are saved with :obj:`save_dataset`.
+
+    Args:
+        directory (str): Ensemble directory.
+        arrays: Arrays with the same length, e.g. `geometries=..., energies=...`. None values are ignored.
+
+    Returns:
+        dict: Manifest of the dataset.
+    """
+    arrays = {key: _as_array(value) for key, value in arrays.items() if value is not None}
+    manifest = load_manifest(directory)
+    if not has_dataset(directory) or len(manifest["arrays"]) == 0:
+        return save_dataset(directory, **arrays)
+    if set(arrays.keys()) != set(manifest["arrays"].keys()):
+        raise ValueError("Appending requires all arrays of the dataset %s but got %s." % (
+            sorted(manifest["arrays"].keys()), sorted(arrays.keys())))
+    data_length = set([len(x) for x in arrays.values()])
+    if len(data_length) > 1:
+        raise ValueError("Received different data length for %s" % data_length)
+
+    dataset_path = get_dataset_path(directory)
+    for key, value in arrays.items():
+        info = manifest["arrays"][key]
+        if info["ragged"]:
+            if not isinstance(value, RaggedArray):
+                value = RaggedArray(value.reshape(-1), np.tile(np.array(value.shape[1:], dtype="int64"),
+                                                               (len(value), 1)))
+            values = value.values.astype("str") if value.values.dtype.kind == "O" else value.values
+            info["dtype"] = _append_npy(os.path.join(dataset_path, info["file"]), values).str
+            _append_npy(os.path.join(dataset_path, info["shapes"]), value.shapes)
+        else:
+            if isinstance(value, RaggedArray):
+                raise ValueError("Can not append samples of different shape to array %s, which is not ragged." % key)
+            value = value.astype("str") if value.dtype.kind == "O" else value
+            info["dtype"] = _append_npy(os.path.join(dataset_path, info["file"]), value).str
+            info["shape"] = [info["length"] + len(value)] + list(value.shape[1:])
+        info["length"] = info["length"] + len(value)
+    return _save_manifest(directory, manifest)
+
+
+def _save_manifest(directory: str, manifest: dict):
+    lengths = set([x["length"] for x in manifest["arrays"].values()])
+    if len(lengths) > 1:
+        module_logger.warning("Arrays in dataset have different length %s." % lengths)
+    manifest["length"] = max(lengths) if len(lengths) > 0 else None
+    manifest["version"] = DATASET_VERSION
+    with open(os.path.join(get_dataset_path(directory), MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _read_legacy_xyz(xyz_path: str):
+    from pyNNsMD.utils.xyz import read_xyz_arrays, iter_xyz_chunks
+    try:
+        atoms, geometries, _ = read_xyz_arrays(xyz_path)
+        return atoms, geometries
+    except ValueError:
+        # Molecules of different size.
+        atoms, geometries = [], []
+        for elements_chunk, coordinates_chunk, _ in iter_xyz_chunks(xyz_path):
+            atoms.extend(elements_chunk)
+            geometries.extend(coordinates_chunk)
+        return _as_array(atoms), _as_array(geometries)
+
+
+def _read_legacy_json(json_path: str):
+    from pyNNsMD.utils.data import load_json_file
+    return _as_array(load_json_file(json_path))
+
+
+def _load_legacy(directory: str, keys: list):
+    # Parsed files are shared read-only from the file cache of e.g. training workers, if it is enabled.
+    from pyNNsMD.utils.data import cached_read
+    data = {}
+    if "geometries" in keys or "atoms" in keys:
+        xyz_path = os.path.join(directory, LEGACY_FILES["geometries"])
+        if os.path.exists(xyz_path):
+            atoms, geometries = cached_read(_read_legacy_xyz, xyz_path)
+            if "geometries" in keys:
+                data["geometries"] = geometries
+            if "atoms" in keys:
+                data["atoms"] = atoms
+    for key in keys:
+        if key in ["geometries", "atoms"] or key not in LEGACY_FILES:
+            continue
+        json_path = os.path.join(directory, LEGACY_FILES[key])
+        if os.path.exists(json_path):
+            data[key] = cached_read(_read_legacy_json, json_path)
+    return data
+
+
+def load_dataset(directory: str, keys: list = None, mmap_mode: str = "r"):
+    """Load arrays of the dataset of a directory.
+
+    If the directory has no binary dataset, the xyz and json files are read instead.
+
+    Args:
+        directory (str): Ensemble directory.
+        keys (list): Names of arrays to load. Default is None, which loads all arrays.
+        mmap_mode (str): Memory map mode for :obj:`np.load`. Default is "r". None reads arrays into memory.
+
+    Returns:
+        dict: Numpy arrays or :obj:`RaggedArray` for each key.
+    """
+    if not has_dataset(directory):
+        keys = list(LEGACY_FILES.keys()) if keys is None else keys
+        data = _load_legacy(directory, keys)
+        if len(data) > 0:
+            module_logger.warning("Reading xyz and json data from %s, use `convert_dataset()` for faster loading."
+                                  % directory)
+    else:
+        dataset_path = get_dataset_path(directory)
+        manifest = load_manifest(directory)
+        keys = list(manifest["arrays"].keys()) if keys is None else keys
+        data = {}
+        for key in keys:
+            if key not in manifest["arrays"]:
+                continue
+            info = manifest["arrays"][key]
+            # String arrays can not be memory mapped as view, they are small anyway.
+            mode = mmap_mode if np.dtype(info["dtype"]).kind not in ["U", "S"] else None
+            values = np.load(os.path.join(dataset_path, info["file"]), mmap_mode=mode)
+            if info["ragged"]:
+                values = RaggedArray(values, np.load(os.path.join(dataset_path, info["shapes"])))
+            data[key] = values
+    missing = [key for key in keys if key not in data]
+    if len(missing) > 0:
+        raise FileNotFoundError("Can not find data %s in %s." % (missing, directory))
+    return data
+
+
+def _convert_legacy_xyz(directory: str):
+    """Write geometries and atoms of a xyz-file with fixed number of atoms directly into memory-mapped `.npy` files.
+
+    Returns:
+        bool: Whether the file could be converted. Molecules of different size must be read into memory instead.
+    """
+    from pyNNsMD.utils.xyz import convert_xyz_to_npy
+    dataset_path = get_dataset_path(directory)
+    os.makedirs(dataset_path, exist_ok=True)
+    paths = {key: os.path.join(dataset_path, key + ".npy") for key in ["geometries", "atoms"]}
+    temp_paths = {key: value + ".tmp.npy" for key, value in paths.items()}
+    try:
+        atoms, geometries = convert_xyz_to_npy(os.path.join(directory, LEGACY_FILES["geometries"]),
+                                               coordinates_path=temp_paths["geometries"],
+                                               elements_path=temp_paths["atoms"])
+    except ValueError:
+        for path in temp_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        return False
+    manifest = load_manifest(directory)
+    for key, value in [("geometries", geometries), ("atoms", atoms)]:
+        manifest["arrays"][key] = {"file": key + ".npy", "ragged": False, "dtype": value.dtype.str,
+                                   "shape": list(value.shape), "length": len(value)}
+    del atoms, geometries
+    for key in paths.keys():
+        os.replace(temp_paths[key], paths[key])
+    _save_manifest(directory, manifest)
+    return True
+
+
+def convert_dataset(directory: str, remove_legacy: bool = False):
+    """Convert xyz and json data files of a directory to the binary dataset.
+
+    Args:
+        directory (str): Ensemble directory.
+        remove_legacy (bool): Whether to remove the xyz and json files after conversion. Default is False.
+
+    Returns:
+        dict: Manifest of the dataset.
+    """
+    legacy_keys = [key for key, file in LEGACY_FILES.items() if os.path.exists(os.path.join(directory, file))]
+    if len(legacy_keys) == 0:
+        raise FileNotFoundError("No xyz or json data in %s to convert." % directory)
+    # Xyz-files of fixed number of atoms are converted in chunks without reading them into memory.
+    xyz_keys = [key for key in ["geometries", "atoms"] if key in legacy_keys]
+    read_keys = legacy_keys
+    if len(xyz_keys) > 0 and _convert_legacy_xyz(directory):
+        read_keys = [key for key in legacy_keys if key not in xyz_keys]
+    data = _load_legacy(directory, read_keys)
+    manifest = save_dataset(directory, **data) if len(data) > 0 else load_manifest(directory)
+    module_logger.info("Converted %s of length %s in %s." % (legacy_keys, manifest["length"], directory))
+    if remove_legacy:
+        for file in set([LEGACY_FILES[key] for key in legacy_keys]):
+            os.remove(os.path.join(directory, file))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert xyz and json data of an ensemble to binary dataset.')
+    parser.add_argument("directory", help="Directory of the ensemble")
+    parser.add_argument("--remove", action="store_true", help="Remove xyz and json files after conversion")
+    args = vars(parser.parse_args())
+    convert_dataset(args["directory"], remove_legacy=args["remove"])
@@ -19,6 +19,8 @@ DEFAULT_HYPER_PARAM_ENERGY = {
             'angle_index': [],  # list-only of shape (N,3) angle: 0-1-2  or alpha(1->0,1->2)
             'dihed_index': [],  # list of dihedral angles with index ijkl angle is between ijk and jkl
             'normalization_mode': 1,  # Normalization False/0 for no normalization/unity mulitplication
+            'gradient_mode': "batch_jacobian",  # "batch_jacobian", "vjp" or "forward" for gradients of all states
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "model_module": "mlp_e",
         }
     },
@@ -36,6 +38,8 @@ DEFAULT_HYPER_PARAM_ENERGY = {
         'loss_weights': [1, 10],  # weights between energy and gradients
         'learning_rate': 1e-3,  # learning rate, can be modified by callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         # {"class_name": 'StepWiseLearningScheduler', "config": {'epoch_step_reduction': [500, 1500, 500, 500], 'learning_rate_step': [1e-3, 1e-4, 1e-5, 1e-6]}}
         # {"class_name": 'LinearLearningRateScheduler', "config": {'learning_rate_start': 1e-3, 'learning_rate_stop': 1e-6, 'epo_min': 100, 'epo': 1000}}
         # {"class_name": 'EarlyStopping', "config": {'use': False, 'epomin': 5000, 'patience': 600, 'max_time': 600, 'min_delta': 1e-5, 'loss_monitor': 'val_loss', 'factor_lr': 0.1, 'learning_rate_start': 1e-3, 'learning_rate_stop': 1e-6, 'epostep': 1}}
@@ -51,6 +55,8 @@ DEFAULT_HYPER_PARAM_ENERGY = {
         'batch_size': 64,  # batch size
         'epostep': 10,  # steps of epochs for validation, also steps for changing callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_energy': "eV",  # Just for plottin
         'unit_gradient': "eV/A"  # Just for plottin
     }
@@ -19,6 +19,9 @@ DEFAULT_HYPER_PARAM_ENERGY_GRADS = {
             'angle_index': [],  # list-only of shape (N,3) angle: 0-1-2  or alpha(1->0,1->2)
             'dihed_index': [],  # list of dihedral angles with index ijkl angle is between ijk and jkl
             'normalization_mode': 1,  # Normalization False/0 for no normalization/unity mulitplication
+            'gradient_mode': "batch_jacobian",  # "batch_jacobian", "vjp" or "forward" for gradients of all states
+            "use_xla": False,  # Compile train and predict steps with XLA, batches are padded to bucket sizes
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "model_module": "mlp_eg"
         }
     },
@@ -37,6 +40,8 @@ DEFAULT_HYPER_PARAM_ENERGY_GRADS = {
         'batch_size': 64,  # batch size
         'epostep': 10,  # steps of epochs for validation, also steps for changing callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_energy': "eV",
         'unit_gradient': "eV/A"
     },
@@ -50,6 +55,8 @@ DEFAULT_HYPER_PARAM_ENERGY_GRADS = {
         'batch_size': 64,  # batch size
         'epostep': 10,  # steps of epochs for validation, also steps for changing callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_energy': "eV",
         'unit_gradient': "eV/A"
     }
@@ -19,6 +19,7 @@ DEFAULT_HYPER_PARAM_GRADS2 = {
             'angle_index': [],  # list-only of shape (N,3) angle: 0-1-2  or alpha(1->0,1->2)
             'dihed_index': [],  # list of dihedral angles with index ijkl angle is between ijk and jkl
             'normalization_mode': 1,  # Normalization False/0 for no normalization/unity mulitplication
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "model_module": "mlp_g2"
         }
     },
@@ -37,6 +38,8 @@ DEFAULT_HYPER_PARAM_GRADS2 = {
         'batch_size': 64,  # batch size
         'epostep': 10,  # steps of epochs for validation, also steps for changing callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_gradient': "ev/A"
         },
     'retraining': {
@@ -47,6 +50,8 @@ DEFAULT_HYPER_PARAM_GRADS2 = {
         'batch_size': 64,  # batch size
         'epostep': 10,  # steps of epochs for validation, also steps for changing callbacks
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_gradient': "ev/A"
     },
 }
@@ -19,6 +19,8 @@ DEFAULT_HYPER_PARAM_NAC = {
             'angle_index': [],  # list-only of shape (N,3) angle: 0-1-2  or alpha(1->0,1->2)
             'dihed_index': [],  # list of dihedral angles (N,4) with index ijkl angle is between ijk and jkl
             'normalization_mode': 1,  # Normalization False/0 for no normalization/unity mulitplication
+            "use_xla": False,  # Compile train and predict steps with XLA, batches are padded to bucket sizes
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "model_module": "mlp_nac2"
         }
     },
@@ -37,6 +39,8 @@ DEFAULT_HYPER_PARAM_NAC = {
         'epostep': 10,
         'batch_size': 64,
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_nac': "1/A"
     },
     'retraining': {
@@ -48,6 +52,8 @@ DEFAULT_HYPER_PARAM_NAC = {
         'epostep': 10,
         'batch_size': 64,
         "callbacks": [],
+        "feature_pipeline": "precompute",  # "precompute", "stream" or "cache" features to disk
+        "shared_feature_cache": False,  # Share features of all models in a disk cache, not for "stream"
         'unit_nac': "1/A"
     },
 }
@@ -22,6 +22,10 @@ DEFAULT_HYPER_PARAM_SCHNET_E = {
                          "activation": ['kgcnn>shifted_softplus', 'kgcnn>shifted_softplus']},
             'output_embedding': 'graph',
             "max_neighbours": 10,
+            "neighbor_args": {"skin": 0.0, "method": "auto"},  # Verlet skin to reuse neighbors, "brute" or "cell"
+            "disjoint": False,  # Compute flattened nodes and edges without padding for mixed molecule sizes
+            "use_xla": False,  # Compile train and predict steps with XLA, batches are padded to bucket sizes
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "use_output_mlp": True,
             'output_mlp': {"use_bias": [True, True], "units": [64, 2],
                            "activation": ['kgcnn>shifted_softplus', "linear"]}
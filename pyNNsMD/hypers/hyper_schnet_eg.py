@@ -5,6 +5,7 @@ DEFAULT_HYPER_PARAM_SCHNET_EG = {
             "model_module": "schnet_eg",
             "output_as_dict": True,
             "energy_only": False,
+            "gradient_mode": "batch_jacobian",  # "batch_jacobian", "vjp" or "forward" for gradients of all states
             'name': "Schnet",
             'inputs': [{'shape': (None, 3), 'name': "node_coordinates", 'dtype': 'float32'},
                        {'shape': (None,), 'name': "node_number", 'dtype': 'int64'},
@@ -22,6 +23,10 @@ DEFAULT_HYPER_PARAM_SCHNET_EG = {
                          "activation": ['kgcnn>shifted_softplus', 'kgcnn>shifted_softplus']},
             'output_embedding': 'graph',
             "max_neighbours": 10,
+            "neighbor_args": {"skin": 0.0, "method": "auto"},  # Verlet skin to reuse neighbors, "brute" or "cell"
+            "disjoint": False,  # Compute flattened nodes and edges without padding for mixed molecule sizes
+            "use_xla": False,  # Compile train and predict steps with XLA, batches are padded to bucket sizes
+            "precision": "float32",  # "float64", "mixed_bfloat16" or "mixed_float16" for hidden layers
             "use_output_mlp": True,
             'output_mlp': {"use_bias": [True, True], "units": [64, 2],
                            "activation": ['kgcnn>shifted_softplus', "linear"]}
@@ -5,6 +5,7 @@ DEFAULT_HYPER_PARAM_SCHNET_KGCNN_E_G = {
             "model_module": "schnet_kgcnn",
             "output_as_dict": True,
             "energy_only": True,
+            "gradient_mode": "batch_jacobian",  # "batch_jacobian" or "vjp" for one reverse pass per state
             "schnet_kwargs": {
                 'name': "Schnet",
                 'inputs': [{'shape': (None,), 'name': "node_attributes", 'dtype': 'float32', 'ragged': True},
@@ -53,6 +53,27 @@ class InverseDistanceIndexed(ks.layers.Layer):
         invd_out = tf.math.divide_no_nan(tf.ones_like(norm_vec), norm_vec)
         return invd_out
 
+    def call_derivative(self, inputs):
+        """Inverse distances and their derivative with respect to the coordinates of the two atoms of each pair.
+
+        Args:
+            inputs (tf.tensor): Coordinate input as (batch, N, 3).
+
+        Returns:
+            tuple: Inverse distances of shape (batch, M) and derivatives of shape (batch, M, 2, 3) for the atoms of
+                the index-list of shape (M, 2).
+        """
+        cordbatch = inputs
+        vcords1 = tf.gather(cordbatch, self.invd_list[:, 0], axis=1)
+        vcords2 = tf.gather(cordbatch, self.invd_list[:, 1], axis=1)
+        vec = vcords2 - vcords1
+        norm_vec = ks.backend.sqrt(ks.backend.sum(vec * vec, axis=-1))
+        invd_out = tf.math.divide_no_nan(tf.ones_like(norm_vec), norm_vec)
+        # d(1/r)/dx2 = -(x2-x1)/r^3
+        grad_vec = ks.backend.expand_dims(invd_out * invd_out * invd_out, axis=-1) * vec
+        invd_grad = tf.stack([grad_vec, -grad_vec], axis=2)
+        return invd_out, invd_grad
+
     def get_config(self):
         """Return config for layer.
 
@@ -120,6 +141,33 @@ class Angles(ks.layers.Layer):
         angs_rad = tf.math.acos(angle_cos)
         return angs_rad
 
+    def call_derivative(self, inputs):
+        """Angles and their derivative with respect to the coordinates of the three atoms of each angle.
+
+        Args:
+            inputs (tf.tensor): Coordinate input as (batch, N, 3).
+
+        Returns:
+            tuple: Angles of shape (batch, M) and derivatives of shape (batch, M, 3, 3) for the atoms of the
+                index-list of shape (M, 3).
+        """
+        cordbatch = inputs
+        vcords1 = tf.gather(cordbatch, self.angle_list[:, 1], axis=1)
+        vcords2a = tf.gather(cordbatch, self.angle_list[:, 0], axis=1)
+        vcords2b = tf.gather(cordbatch, self.angle_list[:, 2], axis=1)
+        vec1 = vcords2a - vcords1
+        vec2 = vcords2b - vcords1
+        norm_vec1 = ks.backend.sqrt(ks.backend.sum(vec1 * vec1, axis=-1, keepdims=True))
+        norm_vec2 = ks.backend.sqrt(ks.backend.sum(vec2 * vec2, axis=-1, keepdims=True))
+        angle_cos = ks.backend.sum(vec1 * vec2, axis=-1, keepdims=True) / norm_vec1 / norm_vec2
+        angs_rad = tf.math.acos(angle_cos[..., 0])
+        # d(acos(c))/dc = -1/sin
+        dangle_dcos = tf.math.divide_no_nan(-tf.ones_like(angle_cos), ks.backend.sqrt(1.0 - angle_cos * angle_cos))
+        grad1 = dangle_dcos * (vec2 / norm_vec1 / norm_vec2 - angle_cos * vec1 / norm_vec1 / norm_vec1)
+        grad2 = dangle_dcos * (vec1 / norm_vec1 / norm_vec2 - angle_cos * vec2 / norm_vec2 / norm_vec2)
+        angs_grad = tf.stack([grad1, -grad1 - grad2, grad2], axis=2)
+        return angs_rad, angs_grad
+
     def get_config(self):
         """
         Return config for layer.
@@ -192,6 +240,46 @@ class Dihedral(ks.layers.Layer):
         angs_rad = tf.math.atan2(arg1, arg2)
         return angs_rad
 
+    def call_derivative(self, inputs):
+        """Dihedral angles and their derivative with respect to the coordinates of the four atoms of each angle.
+
+        Args:
+            inputs (tf.tensor): Coordinates of shape (batch, N, 3).
+
+        Returns:
+            tuple: Dihedral angles of shape (batch, M) and derivatives of shape (batch, M, 4, 3) for the atoms of
+                the index-list of shape (M, 4).
+        """
+        # Derivative from Blondel and Karplus, J. Comput. Chem. 17, 1132 (1996).
+        cordbatch = inputs
+        p1 = tf.gather(cordbatch, self.dihed_list[:, 0], axis=1)
+        p2 = tf.gather(cordbatch, self.dihed_list[:, 1], axis=1)
+        p3 = tf.gather(cordbatch, self.dihed_list[:, 2], axis=1)
+        p4 = tf.gather(cordbatch, self.dihed_list[:, 3], axis=1)
+        b1 = p1 - p2
+        b2 = p2 - p3
+        b3 = p4 - p3
+        cross_a = tf.linalg.cross(b1, b2)
+        cross_b = tf.linalg.cross(b3, b2)
+        norm_b2 = ks.backend.sqrt(ks.backend.sum(b2 * b2, axis=-1, keepdims=True))
+        norm_a2 = ks.backend.sum(cross_a * cross_a, axis=-1, keepdims=True)
+        norm_b2_cross = ks.backend.sum(cross_b * cross_b, axis=-1, keepdims=True)
+        arg1 = ks.backend.sum(b2 * tf.linalg.cross(cross_b, cross_a), axis=-1)
+        arg2 = norm_b2[..., 0] * ks.backend.sum(cross_a * cross_b, axis=-1)
+        angs_rad = tf.math.atan2(arg1, arg2)
+        grad_a = tf.math.divide_no_nan(norm_b2, norm_a2) * cross_a
+        grad_b = tf.math.divide_no_nan(norm_b2, norm_b2_cross) * cross_b
+        proj_a = tf.math.divide_no_nan(ks.backend.sum(b1 * b2, axis=-1, keepdims=True),
+                                       norm_a2 * norm_b2) * cross_a
+        proj_b = tf.math.divide_no_nan(ks.backend.sum(b3 * b2, axis=-1, keepdims=True),
+                                       norm_b2_cross * norm_b2) * cross_b
+        grad1 = -grad_a
+        grad4 = grad_b
+        grad2 = grad_a + proj_a - proj_b
+        grad3 = -grad_b - proj_a + proj_b
+        angs_grad = tf.stack([grad1, grad2, grad3, grad4], axis=2)
+        return angs_rad, angs_grad
+
     def get_config(self):
         """Return config for layer.
 
@@ -290,6 +378,59 @@ class FeatureGeometric(ks.layers.Layer):
         out = feat_flat
         return out
 
+    def call_with_derivative(self, inputs, sparse=True, **kwargs):
+        """Forward pass of the layer that also returns the derivative of the features with respect to coordinates.
+
+        Args:
+            inputs (tf.tensor): Coordinates of shape (batch,N,3).
+            sparse (bool): Whether to return the closed-form derivative only for the atoms of each feature of shape
+                (batch,M,K,3) with atom index from :obj:`get_derivative_index`. Otherwise, the full jacobian of
+                shape (batch,M,N,3) is returned. Default is True.
+
+        Returns:
+            tuple: Features of shape (batch,M) and their derivative.
+        """
+        x = tf.cast(inputs, dtype=self.compute_dtype)
+        if not sparse:
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                feat = self.call(x)
+            return feat, tape.batch_jacobian(feat, x)
+
+        layers = self._get_feature_layers()
+        num_index = max([x.shape[-1] for _, x in layers])
+        feat, feat_grad = [], []
+        for layer, _ in layers:
+            values, grads = layer.call_derivative(x)
+            # Pad atoms per feature to the largest index, e.g. distance to dihedral, with zero derivative.
+            grads = tf.pad(grads, [[0, 0], [0, 0], [0, num_index - grads.shape[2]], [0, 0]])
+            feat.append(values)
+            feat_grad.append(grads)
+        feat = ks.backend.concatenate(feat, axis=1) if len(feat) > 1 else feat[0]
+        feat_grad = ks.backend.concatenate(feat_grad, axis=1) if len(feat_grad) > 1 else feat_grad[0]
+        return feat, feat_grad
+
+    def get_derivative_index(self):
+        """Atom index of the sparse feature derivative of :obj:`call_with_derivative`.
+
+        Returns:
+            tf.tensor: Atom index of shape (M,K). Padded entries have index zero with zero derivative.
+        """
+        layers = self._get_feature_layers()
+        num_index = max([x.shape[-1] for _, x in layers])
+        index = [tf.pad(x, [[0, 0], [0, num_index - x.shape[-1]]]) for _, x in layers]
+        return ks.backend.concatenate(index, axis=0) if len(index) > 1 else index[0]
+
+    def _get_feature_layers(self):
+        layers = []
+        if self.use_invdist:
+            layers.append((self.invd_layer, self.invd_layer.invd_list))
+        if self.use_bond_angles:
+            layers.append((self.ang_layer, self.ang_layer.angle_list))
+        if self.use_dihed_angles:
+            layers.append((self.dih_layer, self.dih_layer.dihed_list))
+        return layers
+
     def set_mol_index(self, invd_index, angle_index, dihed_index):
         """Set weights for atomic index for distance and angles.
 
@@ -306,6 +447,16 @@ class FeatureGeometric(ks.layers.Layer):
         if self.use_bond_angles:
             self.ang_layer.set_weights([angle_index])
 
+    def get_mol_index(self):
+        """Get atomic index for distance and angles as set by :obj:`set_mol_index`.
+
+        Returns:
+            list: Indices `[invd_index, angle_index, dihed_index]` as np.array or None if not used.
+        """
+        return [self.invd_layer.get_weights()[0] if self.use_invdist else None,
+                self.ang_layer.get_weights()[0] if self.use_bond_angles else None,
+                self.dih_layer.get_weights()[0] if self.use_dihed_angles else None]
+
     def get_config(self):
         """Return config for layer.
 
@@ -1,6 +1,88 @@
+import numpy as np
 import tensorflow as tf
 import tensorflow.keras as ks
 
+GRADIENT_MODES = ["batch_jacobian", "vjp", "forward"]
+
+
+def _tile_batch(x, multiples):
+    return tf.tile(x, tf.concat([[multiples], tf.ones(tf.rank(x) - 1, dtype="int32")], axis=0))
+
+
+def batch_output_gradient(output_fn, x, num_outputs: int, gradient_mode: str = "batch_jacobian", args: list = None,
+                          use_pfor: bool = True):
+    """Compute the output of a function and its gradient with respect to the input for each sample.
+
+    The output of each sample must only depend on the input of the same sample. Modes are:
+
+        - "batch_jacobian": Reverse pass per output with `GradientTape.batch_jacobian`.
+        - "vjp": Stacked vector-jacobian products for all outputs in one reverse pass. The batch is repeated for
+          each output and the reverse pass is seeded with the one-hot output vector of each copy.
+        - "forward": Forward-mode jacobian-vector products for all input dimensions in one forward pass. Cheaper
+          if the input has fewer dimensions than outputs.
+
+    Note that for "vjp" and "forward" the batch is repeated, which gives different dropout masks for each copy.
+
+    Args:
+        output_fn (callable): Function of `(x, *args)` that returns output of shape (batch, outputs).
+        x (tf.tensor): Input of shape (batch, ...).
+        num_outputs (int): Number of outputs, e.g. states.
+        gradient_mode (str): Either "batch_jacobian", "vjp" or "forward". Default is "batch_jacobian".
+        args (list): Additional batched inputs to `output_fn`, which are not differentiated. Default is None.
+        use_pfor (bool): Whether "batch_jacobian" vectorizes the reverse passes with pfor. Otherwise one reverse pass
+            per output is stacked, which gives the same gradient. Under XLA, the pfor graph makes the weights
+            compile-time constants and thus compiles again after each training step. Default is True.
+
+    Returns:
+        tuple: Output of shape (batch, outputs) and gradient of shape (batch, outputs, ...).
+    """
+    args = [] if args is None else args
+    if gradient_mode == "batch_jacobian" and use_pfor:
+        with tf.GradientTape() as tape:
+            tape.watch(x)
+            out = output_fn(x, *args)
+        grad = tape.batch_jacobian(out, x)
+    elif gradient_mode == "batch_jacobian":
+        with tf.GradientTape(persistent=True) as tape:
+            tape.watch(x)
+            out = output_fn(x, *args)
+            out_i = [out[:, i] for i in range(num_outputs)]
+        grad = tf.stack([tape.gradient(y_i, x) for y_i in out_i], axis=1)
+    elif gradient_mode == "vjp":
+        batch_size = tf.shape(x)[0]
+        x_tiled = _tile_batch(x, num_outputs)
+        args_tiled = [_tile_batch(a, num_outputs) for a in args]
+        with tf.GradientTape() as tape:
+            tape.watch(x_tiled)
+            out_tiled = output_fn(x_tiled, *args_tiled)
+            # Copy i of the batch is seeded with the i-th output.
+            seed = tf.repeat(tf.eye(num_outputs, dtype=out_tiled.dtype), batch_size, axis=0)
+            out_seeded = tf.reduce_sum(out_tiled * seed)
+        grad = tape.gradient(out_seeded, x_tiled)
+        grad = tf.reshape(grad, tf.concat([[num_outputs, batch_size], tf.shape(x)[1:]], axis=0))
+        grad = tf.transpose(grad, perm=[1, 0] + list(range(2, len(x.shape) + 1)))
+        out = out_tiled[:batch_size]
+    elif gradient_mode == "forward":
+        if not x.shape[1:].is_fully_defined():
+            raise ValueError("Gradient mode 'forward' requires a static input shape, got %s." % x.shape)
+        batch_size = tf.shape(x)[0]
+        num_inputs = int(np.prod(x.shape[1:]))
+        x_tiled = _tile_batch(x, num_inputs)
+        args_tiled = [_tile_batch(a, num_inputs) for a in args]
+        # Copy j of the batch is the tangent of the j-th input dimension.
+        tangents = tf.reshape(tf.eye(num_inputs, dtype=x.dtype), tf.concat([[num_inputs], tf.shape(x)[1:]], axis=0))
+        tangents = tf.repeat(tangents, batch_size, axis=0)
+        with tf.autodiff.ForwardAccumulator(x_tiled, tangents) as acc:
+            out_tiled = output_fn(x_tiled, *args_tiled)
+        grad = acc.jvp(out_tiled)
+        grad = tf.transpose(tf.reshape(grad, (num_inputs, batch_size, num_outputs)), perm=(1, 2, 0))
+        grad = tf.reshape(grad, tf.concat([[batch_size, num_outputs], tf.shape(x)[1:]], axis=0))
+        out = out_tiled[:batch_size]
+    else:
+        raise ValueError("Unknown gradient mode %s, must be in %s." % (gradient_mode, GRADIENT_MODES))
+    grad.set_shape(out.shape[:2].concatenate(x.shape[1:]))
+    return out, grad
+
 
 class EmptyGradient(ks.layers.Layer):
     """
@@ -128,9 +210,8 @@ class PropagateNACGradient(ks.layers.Layer):
             out (tf.tensor): Gradients with respect to coordinates.
         """
         grads, grads2 = inputs
-        out = ks.backend.batch_dot(grads, grads2, axes=(3, 1))
-        out = ks.backend.concatenate([ks.backend.expand_dims(out[:, :, i, i, :], axis=2) for i in range(self.atoms)],
-                                     axis=2)
+        # Only the diagonal (batch, states, atoms, 3) of the full batch-dot is computed.
+        out = tf.einsum("bsif,bfic->bsic", grads, grads2)
         return out
 
     def get_config(self):
@@ -183,6 +264,126 @@ class PropagateNACGradient2(ks.layers.Layer):
         config.update({"axis": self.axis})
         return config
 
+
+class PropagateSparseFeatureGradient(ks.layers.Layer):
+    """
+    Layer to propagate gradients with respect to features to coordinates with sparse feature derivatives.
+
+    The derivative of each feature is only given for the few atoms it depends on, e.g. 2 for distances. Contributions
+    are summed to the atoms with a segment sum instead of a batch-dot with the full feature jacobian.
+    """
+
+    def __init__(self, atoms=1, **kwargs):
+        """
+        Initialize layer.
+
+        Args:
+            atoms (int): Number of atoms.
+            **kwargs
+        """
+        super(PropagateSparseFeatureGradient, self).__init__(**kwargs)
+        self.atoms = atoms
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(PropagateSparseFeatureGradient, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        """
+        Propagate gradients.
+
+        Args:
+            inputs: [grads, grads2, index]
+            - grads (tf.tensor): Gradient for NN of shape (batch, ..., features)
+            - grads2 (tf.tensor): Sparse gradients of static features. (batch, features, K, 3)
+            - index (tf.tensor): Atom index of sparse gradients of static features. (features, K)
+            **kwargs:
+
+        Returns:
+            out (tf.tensor): Gradients with respect to coordinates of shape (batch, ..., atoms, 3).
+        """
+        grads, grads2, index = inputs
+        for _ in range(len(grads.shape) - 2):
+            grads2 = ks.backend.expand_dims(grads2, axis=1)
+        out = ks.backend.expand_dims(ks.backend.expand_dims(grads, axis=-1), axis=-1) * grads2
+        out_shape = tf.shape(out)
+        out = tf.reshape(out, (-1, out_shape[-3] * out_shape[-2], 3))
+        out = tf.transpose(out, perm=(1, 0, 2))
+        out = tf.math.unsorted_segment_sum(out, tf.reshape(index, (-1,)), num_segments=self.atoms)
+        out = tf.transpose(out, perm=(1, 0, 2))
+        out = tf.reshape(out, tf.concat([out_shape[:-3], tf.constant([self.atoms, 3], dtype=out_shape.dtype)], axis=0))
+        out.set_shape(grads.shape[:-1].concatenate([self.atoms, 3]))
+        return out
+
+    def get_config(self):
+        """Update config for layer."""
+        config = super(PropagateSparseFeatureGradient, self).get_config()
+        config.update({"atoms": self.atoms})
+        return config
+
+
+class PropagateSparseNACGradient(ks.layers.Layer):
+    """
+    Layer to propagate gradients of the last hidden layer to the diagonal NACs of a linear virtual potential.
+
+    The virtual potential of shape (batch, states, atoms) is the product of the last hidden layer and a kernel. Only
+    the derivative of the potential of each atom with respect to its own coordinates is required. With sparse feature
+    derivatives, the kernel is gathered for the atoms of each feature, so that neither the jacobian of the potential
+    nor the full (batch, states, atoms, atoms, 3) tensor is computed.
+    """
+
+    def __init__(self, states=1, atoms=1, **kwargs):
+        """
+        Initialize layer.
+
+        Args:
+            states (int): Number of states.
+            atoms (int): Number of atoms.
+            **kwargs
+        """
+        super(PropagateSparseNACGradient, self).__init__(**kwargs)
+        self.states = states
+        self.atoms = atoms
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(PropagateSparseNACGradient, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        """
+        Propagate gradients for diagonal NACs.
+
+        Args:
+            inputs: [grads, grads2, kernel, index]
+            - grads (tf.tensor): Gradient of last hidden layer of shape (batch, hidden, features)
+            - grads2 (tf.tensor): Sparse gradients of static features. (batch, features, K, 3)
+            - kernel (tf.tensor): Kernel of the virtual potential of shape (hidden, states * atoms)
+            - index (tf.tensor): Atom index of sparse gradients of static features. (features, K)
+            **kwargs:
+
+        Returns:
+            out (tf.tensor): NACs of shape (batch, states, atoms, 3).
+        """
+        grads, grads2, kernel, index = inputs
+        kernel = tf.reshape(tf.cast(kernel, grads.dtype), (-1, self.states, self.atoms))
+        # Kernel of the atoms of each feature of shape (hidden, states, features, K).
+        kernel = tf.gather(kernel, index, axis=2)
+        out = tf.einsum("bhf,hsfk->bsfk", grads, kernel)
+        out = ks.backend.expand_dims(out, axis=-1) * ks.backend.expand_dims(grads2, axis=1)
+        out_shape = tf.shape(out)
+        out = tf.reshape(out, (-1, out_shape[2] * out_shape[3], 3))
+        out = tf.transpose(out, perm=(1, 0, 2))
+        out = tf.math.unsorted_segment_sum(out, tf.reshape(index, (-1,)), num_segments=self.atoms)
+        out = tf.transpose(out, perm=(1, 0, 2))
+        out = tf.reshape(out, (out_shape[0], self.states, self.atoms, 3))
+        return out
+
+    def get_config(self):
+        """Update config for layer."""
+        config = super(PropagateSparseNACGradient, self).get_config()
+        config.update({"states": self.states, "atoms": self.atoms})
+        return config
+
 # class EnergyGradient(ks.layers.Layer):
 #     """
 #     Layer to calculate Gradient for NN energy output. Not used anymore.
@@ -114,3 +114,47 @@ class DummyLayer(ks.layers.Layer):
     def get_config(self):
         config = super(DummyLayer, self).get_config()
         return config
+
+
+class ConstAffineTransform(ks.layers.Layer):
+    """Constant affine transformation `inputs * scale + offset` with non-trainable weights, e.g. from a scaler."""
+
+    def __init__(self, scale_shape=(1,), offset_shape=(1,), **kwargs):
+        """Init the layer.
+
+        Args:
+            scale_shape (tuple): Shape of scale that is broadcasted to input. Default is (1, ).
+            offset_shape (tuple): Shape of offset that is broadcasted to input. Default is (1, ).
+            **kwargs
+        """
+        super(ConstAffineTransform, self).__init__(**kwargs)
+        self.scale_shape = tuple(scale_shape)
+        self.offset_shape = tuple(offset_shape)
+        self.scale = None
+        self.offset = None
+
+    def build(self, input_shape):
+        super(ConstAffineTransform, self).build(input_shape)
+        self.scale = self.add_weight('const_scale', shape=self.scale_shape, initializer=tf.keras.initializers.Ones(),
+                                     dtype=self.dtype, trainable=False)
+        self.offset = self.add_weight('const_offset', shape=self.offset_shape,
+                                      initializer=tf.keras.initializers.Zeros(), dtype=self.dtype, trainable=False)
+
+    def call(self, inputs, **kwargs):
+        return inputs * tf.cast(self.scale, inputs.dtype) + tf.cast(self.offset, inputs.dtype)
+
+    def set_affine(self, scale, offset):
+        """Set scale and offset.
+
+        Args:
+            scale (np.ndarray): Scale of shape `scale_shape`.
+            offset (np.ndarray): Offset of shape `offset_shape`.
+        """
+        if not self.built:
+            self.build(None)
+        self.set_weights([np.reshape(scale, self.scale_shape), np.reshape(offset, self.offset_shape)])
+
+    def get_config(self):
+        config = super(ConstAffineTransform, self).get_config()
+        config.update({"scale_shape": self.scale_shape, "offset_shape": self.offset_shape})
+        return config
@@ -171,6 +171,142 @@ class NodeDistance(ks.layers.Layer):
         return config
 
 
+@ks.utils.register_keras_serializable(package='pyNNsMD', name='DenseToDisjoint')
+class DenseToDisjoint(ks.layers.Layer):
+    """Convert padded batch input with masks to a disjoint graph of flattened nodes and edges.
+
+    The nodes of all molecules are listed in one tensor of shape (nodes, ...) with the index of their molecule. Edges
+    are given by pairs of the receiving and sending node in the flattened node list. Padded nodes and masked edges are
+    removed, so that following layers only compute real nodes and edges.
+    """
+
+    def __init__(self, **kwargs):
+        super(DenseToDisjoint, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(DenseToDisjoint, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        """Forward pass.
+
+        Args:
+            inputs (list): [coordinates, nodes, edge_indices, node_mask, edge_mask] of shape (batch, N, 3),
+                (batch, N, ...), (batch, N, K), (batch, N, 1) and (batch, N, K, 1).
+
+        Returns:
+            list: [coordinates, nodes, edge_indices, graph_id] of shape (nodes, 3), (nodes, ...), (edges, 2) and
+                (nodes, ).
+        """
+        x, n, edi, mask_n, mask_e = inputs
+        mask_n = tf.cast(tf.reshape(mask_n, tf.shape(mask_n)[:2]), dtype="bool")
+        mask_e = tf.cast(tf.reshape(mask_e, tf.shape(mask_e)[:3]), dtype="bool")
+        node_pos = tf.where(mask_n)
+        graph_id = node_pos[:, 0]
+        x_flat = tf.gather_nd(x, node_pos)
+        n_flat = tf.gather_nd(n, node_pos)
+        # Position of each node in the flattened node list.
+        node_id = tf.scatter_nd(node_pos, tf.range(tf.shape(node_pos, out_type="int64")[0]),
+                                tf.shape(mask_n, out_type="int64"))
+        edge_pos = tf.where(mask_e)
+        edge_j = tf.gather_nd(tf.cast(edi, "int64"), edge_pos)
+        receiver = tf.gather_nd(node_id, edge_pos[:, :2])
+        sender = tf.gather_nd(node_id, tf.stack([edge_pos[:, 0], edge_j], axis=-1))
+        edge_index = tf.stack([receiver, sender], axis=-1)
+        return [x_flat, n_flat, edge_index, graph_id]
+
+    def get_config(self):
+        """Update layer config."""
+        config = super(DenseToDisjoint, self).get_config()
+        return config
+
+
+@ks.utils.register_keras_serializable(package='pyNNsMD', name='DisjointNodeDistance')
+class DisjointNodeDistance(ks.layers.Layer):
+    """Distance of the node pairs of edges of a disjoint graph."""
+
+    def __init__(self, **kwargs):
+        super(DisjointNodeDistance, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(DisjointNodeDistance, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        x, edge_index = inputs
+        diff = tf.gather(x, edge_index[:, 0]) - tf.gather(x, edge_index[:, 1])
+        dist = tf.sqrt(tf.reduce_sum(tf.square(diff), axis=-1, keepdims=True))
+        return dist
+
+    def get_config(self):
+        """Update layer config."""
+        config = super(DisjointNodeDistance, self).get_config()
+        return config
+
+
+@ks.utils.register_keras_serializable(package='pyNNsMD', name='DisjointGatherEmbedding')
+class DisjointGatherEmbedding(ks.layers.Layer):
+    """Gather node embeddings of the sending node of each edge of a disjoint graph."""
+
+    def __init__(self, **kwargs):
+        super(DisjointGatherEmbedding, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(DisjointGatherEmbedding, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        n, edge_index = inputs
+        return tf.gather(n, edge_index[:, 1])
+
+    def get_config(self):
+        """Update layer config."""
+        config = super(DisjointGatherEmbedding, self).get_config()
+        return config
+
+
+@ks.utils.register_keras_serializable(package='pyNNsMD', name='DisjointPoolingLocalEdges')
+class DisjointPoolingLocalEdges(ks.layers.Layer):
+    """Sum edge embeddings to their receiving node of a disjoint graph."""
+
+    def __init__(self, pooling_method="sum", **kwargs):
+        super(DisjointPoolingLocalEdges, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(DisjointPoolingLocalEdges, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        n, ed, edge_index = inputs
+        return tf.math.unsorted_segment_sum(ed, edge_index[:, 0], num_segments=tf.shape(n)[0])
+
+    def get_config(self):
+        """Update layer config."""
+        config = super(DisjointPoolingLocalEdges, self).get_config()
+        return config
+
+
+@ks.utils.register_keras_serializable(package='pyNNsMD', name='DisjointPoolingNodes')
+class DisjointPoolingNodes(ks.layers.Layer):
+    """Sum node embeddings of each molecule of a disjoint graph."""
+
+    def __init__(self, pooling_method="sum", **kwargs):
+        super(DisjointPoolingNodes, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        """Build layer."""
+        super(DisjointPoolingNodes, self).build(input_shape)
+
+    def call(self, inputs, **kwargs):
+        n, graph_id, num_graphs = inputs
+        return tf.math.unsorted_segment_sum(n, graph_id, num_segments=num_graphs)
+
+    def get_config(self):
+        """Update layer config."""
+        config = super(DisjointPoolingNodes, self).get_config()
+        return config
+
+
 @tf.keras.utils.register_keras_serializable(package='pyNNsMD', name='SchNetCFconv')
 class SchNetCFconv(ks.layers.Layer):
     def __init__(self, units,
@@ -184,12 +320,14 @@ class SchNetCFconv(ks.layers.Layer):
                  bias_constraint=None,
                  kernel_initializer='glorot_uniform',
                  bias_initializer='zeros',
+                 disjoint: bool = False,
                  **kwargs):
         """Initialize Layer."""
         super(SchNetCFconv, self).__init__(**kwargs)
         self.cfconv_pool = cfconv_pool
         self.units = units
         self.use_bias = use_bias
+        self.disjoint = disjoint
         kernel_args = {"kernel_regularizer": kernel_regularizer, "activity_regularizer": activity_regularizer,
                        "bias_regularizer": bias_regularizer, "kernel_constraint": kernel_constraint,
                        "bias_constraint": bias_constraint, "kernel_initializer": kernel_initializer,
@@ -198,8 +336,12 @@ class SchNetCFconv(ks.layers.Layer):
         self.lay_dense1 = ks.layers.Dense(
             units=self.units, activation=activation, use_bias=self.use_bias, **kernel_args)
         self.lay_dense2 = ks.layers.Dense(units=self.units, activation='linear', use_bias=self.use_bias, **kernel_args)
-        self.lay_sum = PoolingLocalEdges(pooling_method=cfconv_pool)
-        self.gather_n = GatherEmbedding()
+        if self.disjoint:
+            self.lay_sum = DisjointPoolingLocalEdges(pooling_method=cfconv_pool)
+            self.gather_n = DisjointGatherEmbedding()
+        else:
+            self.lay_sum = PoolingLocalEdges(pooling_method=cfconv_pool)
+            self.gather_n = GatherEmbedding()
         self.lay_mult = ks.layers.Multiply()
 
     def build(self, input_shape):
@@ -208,9 +350,13 @@ class SchNetCFconv(ks.layers.Layer):
 
     def call(self, inputs, mask=None, **kwargs):
         node, edge, indexlist = inputs
-        mask_n, mask_e, mask_i = mask
         x = self.lay_dense1(edge, **kwargs)
         x = self.lay_dense2(x, **kwargs)
+        if self.disjoint:
+            node2exp = self.gather_n([node, indexlist], **kwargs)
+            x = self.lay_mult([node2exp, x], **kwargs)
+            return self.lay_sum([node, x, indexlist], **kwargs)
+        mask_n, mask_e, mask_i = mask
         node2exp = self.gather_n([node, indexlist], mask=[mask_n, mask_i], **kwargs)
         x = self.lay_mult([node2exp, x], **kwargs)
         x = self.lay_sum(x, mask=mask_e, **kwargs)
@@ -219,7 +365,7 @@ class SchNetCFconv(ks.layers.Layer):
     def get_config(self):
         """Update layer config."""
         config = super(SchNetCFconv, self).get_config()
-        config.update({"cfconv_pool": self.cfconv_pool, "units": self.units})
+        config.update({"cfconv_pool": self.cfconv_pool, "units": self.units, "disjoint": self.disjoint})
         config_dense = self.lay_dense1.get_config()
         for x in ["kernel_regularizer", "activity_regularizer", "bias_regularizer", "kernel_constraint",
                   "bias_constraint", "kernel_initializer", "bias_initializer", "activation", "use_bias"]:
@@ -241,17 +387,20 @@ class SchNetInteraction(ks.layers.Layer):
                  bias_constraint=None,
                  kernel_initializer='glorot_uniform',
                  bias_initializer='zeros',
+                 disjoint: bool = False,
                  **kwargs):
         """Initialize Layer."""
         super(SchNetInteraction, self).__init__(**kwargs)
         self.cfconv_pool = cfconv_pool
         self.use_bias = use_bias
         self.units = units
+        self.disjoint = disjoint
         kernel_args = {"kernel_regularizer": kernel_regularizer, "activity_regularizer": activity_regularizer,
                        "bias_regularizer": bias_regularizer, "kernel_constraint": kernel_constraint,
                        "bias_constraint": bias_constraint, "kernel_initializer": kernel_initializer,
                        "bias_initializer": bias_initializer}
-        conv_args = {"units": self.units, "use_bias": use_bias, "activation": activation, "cfconv_pool": cfconv_pool}
+        conv_args = {"units": self.units, "use_bias": use_bias, "activation": activation, "cfconv_pool": cfconv_pool,
+                     "disjoint": disjoint}
 
         # Layers
         self.lay_cfconv = SchNetCFconv(**conv_args, **kernel_args)
@@ -267,7 +416,8 @@ class SchNetInteraction(ks.layers.Layer):
 
     def call(self, inputs, mask=None, **kwargs):
         node, edge, indexlist = inputs
-        mask_n, mask_e, mask_i = mask
+        # Disjoint graphs have no padding and no masks.
+        mask_n = mask[0] if mask is not None else None
         x = self.lay_dense1(node, mask=mask_n, **kwargs)
         x = self.lay_cfconv([x, edge, indexlist], mask=mask, **kwargs)
         x = self.lay_dense2(x, **kwargs)
@@ -277,7 +427,8 @@ class SchNetInteraction(ks.layers.Layer):
 
     def get_config(self):
         config = super(SchNetInteraction, self).get_config()
-        config.update({"cfconv_pool": self.cfconv_pool, "units": self.units, "use_bias": self.use_bias})
+        config.update({"cfconv_pool": self.cfconv_pool, "units": self.units, "use_bias": self.use_bias,
+                       "disjoint": self.disjoint})
         conf_dense = self.lay_dense2.get_config()
         for x in ["activation", "kernel_regularizer", "bias_regularizer", "activity_regularizer",
                   "kernel_constraint", "bias_constraint", "kernel_initializer", "bias_initializer"]:
@@ -10,8 +10,11 @@ import tensorflow as tf
 import tensorflow.keras as ks
 
 from pyNNsMD.layers.features import FeatureGeometric
+from pyNNsMD.layers.gradients import batch_output_gradient
 from pyNNsMD.layers.mlp import MLP
 from pyNNsMD.layers.normalize import ConstLayerNormalization, DummyLayer
+from pyNNsMD.utils.buckets import call_in_bucket
+from pyNNsMD.utils.precision import get_precision_policy, precision_scope
 
 
 class EnergyModel(ks.Model):
@@ -37,9 +40,13 @@ class EnergyModel(ks.Model):
                  normalization_mode=1,
                  energy_only=True,
                  precomputed_features=False,
+                 gradient_mode="batch_jacobian",
+                 precision="float32",
                  model_module="mlp_e",
                  **kwargs):
-        super(EnergyModel, self).__init__(**kwargs)
+        hidden_policy, io_dtype = get_precision_policy(precision)
+        super(EnergyModel, self).__init__(dtype=io_dtype, **kwargs)
+        self.precision = precision
         self.invd_index = invd_index
         self.angle_index = angle_index
         self.dihed_index = dihed_index
@@ -55,6 +62,7 @@ class EnergyModel(ks.Model):
         self.out_dim = int(states)
         self.in_atoms = int(atoms)
         self.energy_only = energy_only
+        self.gradient_mode = gradient_mode
         self.model_module = model_module
 
         out_dim = int(states)
@@ -80,35 +88,40 @@ class EnergyModel(ks.Model):
         angle_shape = angle_index.shape if use_angle_index else None
         dihed_shape = dihed_index.shape if use_dihed_index else None
 
-        self.feat_layer = FeatureGeometric(
-            invd_shape=invd_shape,
-            angle_shape=angle_shape,
-            dihed_shape=dihed_shape,
-            name="feat_geo"
-        )
-        self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
-
-        if normalization_mode == 1:
-            self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
-        elif normalization_mode == 2:
-            self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
-        else:
-            self.std_layer = DummyLayer()
-
-        self.mlp_layer = MLP(nn_size,
-                             dense_depth=depth,
-                             dense_bias=True,
-                             dense_bias_last=True,
-                             dense_activ=activ,
-                             dense_activ_last=activ,
-                             dense_activity_regularizer=use_reg_activ,
-                             dense_kernel_regularizer=use_reg_weight,
-                             dense_bias_regularizer=use_reg_bias,
-                             dropout_use=use_dropout,
-                             dropout_dropout=dropout,
-                             name='mlp'
-                             )
-        self.energy_layer = ks.layers.Dense(out_dim, name='energy', use_bias=True, activation='linear')
+        with precision_scope(io_dtype):
+            self.feat_layer = FeatureGeometric(
+                invd_shape=invd_shape,
+                angle_shape=angle_shape,
+                dihed_shape=dihed_shape,
+                name="feat_geo"
+            )
+            self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
+
+            if normalization_mode == 1:
+                self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
+            elif normalization_mode == 2:
+                self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
+            else:
+                self.std_layer = DummyLayer()
+
+            with precision_scope(hidden_policy):
+                self.mlp_layer = MLP(nn_size,
+                                     dense_depth=depth,
+                                     dense_bias=True,
+                                     dense_bias_last=True,
+                                     dense_activ=activ,
+                                     dense_activ_last=activ,
+                                     dense_activity_regularizer=use_reg_activ,
+                                     dense_kernel_regularizer=use_reg_weight,
+                                     dense_bias_regularizer=use_reg_bias,
+                                     dropout_use=use_dropout,
+                                     dropout_dropout=dropout,
+                                     name='mlp'
+                                     )
+            self.energy_layer = ks.layers.Dense(out_dim, name='energy', use_bias=True, activation='linear')
+
+        # Feature derivative for precomputed features is sparse for the atoms of each feature
+        self.sparse_feature_derivative = True
 
         # Build all layers
         self.precomputed_features = False
@@ -137,13 +150,13 @@ class EnergyModel(ks.Model):
             temp_e = self.energy_layer(temp_hidden)
             y_pred = temp_e
         elif not self.energy_only and not self.precomputed_features:
-            with tf.GradientTape() as tape2:
-                tape2.watch(x)
-                feat_flat = self.feat_layer(x)
-                feat_flat_std = self.std_layer(feat_flat, training=training)
+            def energy_fn(x_in):
+                feat_flat_in = self.feat_layer(x_in)
+                feat_flat_std = self.std_layer(feat_flat_in, training=training)
                 temp_hidden = self.mlp_layer(feat_flat_std, training=training)
-                temp_e = self.energy_layer(temp_hidden)
-            temp_g = tape2.batch_jacobian(temp_e, x)
+                return self.energy_layer(temp_hidden)
+
+            temp_e, temp_g = batch_output_gradient(energy_fn, x, self.out_dim, gradient_mode=self.gradient_mode)
             y_pred = [temp_e, temp_g]
         elif self.precomputed_features:
             x1 = x[0]
@@ -154,13 +167,15 @@ class EnergyModel(ks.Model):
 
         return y_pred
 
-    @tf.function
     def predict_chunk_feature(self, tf_x, training=False):
-        with tf.GradientTape() as tape2:
-            tape2.watch(tf_x)
-            feat_pred = self.feat_layer(tf_x, training=training)  # Forward pass
-        grad = tape2.batch_jacobian(feat_pred, tf_x)
-        return feat_pred, grad
+        # Sparse feature derivative of shape (batch, features, K, 3) or full jacobian (batch, features, atoms, 3).
+        # The chunk is padded to a bucket size, so that a smaller last chunk is not traced again.
+        return call_in_bucket(
+            lambda x: self._predict_chunk_feature(x, training=training, sparse=self.sparse_feature_derivative), tf_x)
+
+    @tf.function
+    def _predict_chunk_feature(self, tf_x, training=False, sparse=True):
+        return self.feat_layer.call_with_derivative(tf_x, sparse=sparse, training=training)
 
     def precompute_feature_in_chunks(self, x, batch_size, training=False):
         np_x = []
@@ -168,7 +183,7 @@ class EnergyModel(ks.Model):
         for j in range(int(np.ceil(len(x) / batch_size))):
             a = int(batch_size * j)
             b = int(batch_size * j + batch_size)
-            tf_x = tf.convert_to_tensor(x[a:b], dtype=tf.float32)
+            tf_x = tf.convert_to_tensor(x[a:b], dtype=self.compute_dtype)
             feat_pred, grad = self.predict_chunk_feature(tf_x, training=training)
             np_x.append(np.array(feat_pred.numpy()))
             np_grad.append(np.array(grad.numpy()))
@@ -200,6 +215,8 @@ class EnergyModel(ks.Model):
             'normalization_mode': self.normalization_mode,
             "energy_only": self.energy_only,
             "precomputed_features": self.precomputed_features,
+            "gradient_mode": self.gradient_mode,
+            "precision": self.precision,
             "model_module": self.model_module
         })
         return conf
@@ -216,7 +233,11 @@ class EnergyModel(ks.Model):
 
     def call_to_tensor_input(self, x):
         # No precomputed features necessary
-        return tf.convert_to_tensor(x, dtype=tf.float32)
+        return tf.convert_to_tensor(x, dtype=self.compute_dtype)
+
+    def get_input_signature(self):
+        # Coordinates for inference, see pyNNsMD.utils.inference.
+        return [tf.TensorSpec(shape=(None, self.in_atoms, 3), dtype=self.compute_dtype)]
 
     def call_to_numpy_output(self, y):
         if not self.energy_only:
@@ -10,9 +10,11 @@ import tensorflow as tf
 import tensorflow.keras as ks
 
 from pyNNsMD.layers.features import FeatureGeometric
-from pyNNsMD.layers.gradients import EmptyGradient
+from pyNNsMD.layers.gradients import EmptyGradient, PropagateSparseFeatureGradient, batch_output_gradient
 from pyNNsMD.layers.mlp import MLP
 from pyNNsMD.layers.normalize import DummyLayer
+from pyNNsMD.utils.buckets import call_in_bucket, predict_in_buckets
+from pyNNsMD.utils.precision import get_precision_policy, precision_scope
 
 
 class EnergyGradientModel(ks.Model):
@@ -39,6 +41,9 @@ class EnergyGradientModel(ks.Model):
                  energy_only=False,
                  precomputed_features=False,
                  output_as_dict=False,
+                 gradient_mode="batch_jacobian",
+                 use_xla=False,
+                 precision="float32",
                  model_module="mlp_e",
                  **kwargs):
         """Initialize Layer.
@@ -57,10 +62,17 @@ class EnergyGradientModel(ks.Model):
             use_reg_bias:
             use_dropout:
             dropout:
+            gradient_mode: Computation of gradients "batch_jacobian", "vjp" or "forward". Default is "batch_jacobian".
+            use_xla: Whether to compile train and predict steps with XLA. Batches of predict are padded to full
+                batches to avoid compiling again. Default is False.
+            precision: Precision mode "float32", "float64", "mixed_bfloat16" or "mixed_float16". Hidden layers
+                compute in 16-bit for mixed modes. Default is "float32".
             **kwargs:
         """
 
-        super(EnergyGradientModel, self).__init__(**kwargs)
+        hidden_policy, io_dtype = get_precision_policy(precision)
+        super(EnergyGradientModel, self).__init__(dtype=io_dtype, **kwargs)
+        self.precision = precision
         self.in_invd_index = invd_index
         self.in_angle_index = angle_index
         self.in_dihed_index = dihed_index
@@ -74,6 +86,8 @@ class EnergyGradientModel(ks.Model):
         self.dropout = dropout
         self.energy_only = energy_only
         self.output_as_dict = output_as_dict
+        self.gradient_mode = gradient_mode
+        self.use_xla = use_xla
         self.eg_atoms = int(atoms)
         self.eg_states = int(states)
         self.normalization_mode = normalization_mode
@@ -102,36 +116,41 @@ class EnergyGradientModel(ks.Model):
         angle_shape = angle_index.shape if use_angle_index else None
         dihed_shape = dihed_index.shape if use_dihed_index else None
 
-        self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
-                                           angle_shape=angle_shape,
-                                           dihed_shape=dihed_shape,
-                                           name="feat_geo"
-                                           )
-        self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
-
-        if normalization_mode == 1:
-            self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
-        elif normalization_mode == 2:
-            self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
-        else:
-            self.std_layer = DummyLayer()
-
-        self.mlp_layer = MLP(nn_size,
-                             dense_depth=depth,
-                             dense_bias=True,
-                             dense_bias_last=True,
-                             dense_activ=activ,
-                             dense_activ_last=activ,
-                             dense_activity_regularizer=use_reg_activ,
-                             dense_kernel_regularizer=use_reg_weight,
-                             dense_bias_regularizer=use_reg_bias,
-                             dropout_use=use_dropout,
-                             dropout_dropout=dropout,
-                             name='mlp'
-                             )
-        self.energy_layer = ks.layers.Dense(out_dim, name='energy', use_bias=True, activation='linear')
-        self.force = EmptyGradient(mult_states=out_dim, atoms=indim,
-                                   name='force')  # Will be differentiated in fit/predict/evaluate
+        with precision_scope(io_dtype):
+            self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
+                                               angle_shape=angle_shape,
+                                               dihed_shape=dihed_shape,
+                                               name="feat_geo"
+                                               )
+            self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
+
+            if normalization_mode == 1:
+                self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
+            elif normalization_mode == 2:
+                self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
+            else:
+                self.std_layer = DummyLayer()
+
+            with precision_scope(hidden_policy):
+                self.mlp_layer = MLP(nn_size,
+                                     dense_depth=depth,
+                                     dense_bias=True,
+                                     dense_bias_last=True,
+                                     dense_activ=activ,
+                                     dense_activ_last=activ,
+                                     dense_activity_regularizer=use_reg_activ,
+                                     dense_kernel_regularizer=use_reg_weight,
+                                     dense_bias_regularizer=use_reg_bias,
+                                     dropout_use=use_dropout,
+                                     dropout_dropout=dropout,
+                                     name='mlp'
+                                     )
+            self.energy_layer = ks.layers.Dense(out_dim, name='energy', use_bias=True, activation='linear')
+            self.force = EmptyGradient(mult_states=out_dim, atoms=indim,
+                                       name='force')  # Will be differentiated in fit/predict/evaluate
+            self.sparse_grad_layer = PropagateSparseFeatureGradient(atoms=indim, name='sparse_grad')
+        # Feature derivative for precomputed features is sparse for the atoms of each feature
+        self.sparse_feature_derivative = True
 
         # Need to build model already to set std layer
         self.precomputed_features = False
@@ -161,25 +180,21 @@ class EnergyGradientModel(ks.Model):
             temp_g = self.force(x)
             y_pred = [temp_e, temp_g]
         elif not self.energy_only and not self.precomputed_features:
-            with tf.GradientTape() as tape2:
-                tape2.watch(x)
-                feat_flat = self.feat_layer(x)
-                feat_flat_std = self.std_layer(feat_flat, training=training)
-                temp_hidden = self.mlp_layer(feat_flat_std, training=training)
-                temp_e = self.energy_layer(temp_hidden)
-            temp_g = tape2.batch_jacobian(temp_e, x)
+            temp_e, temp_g = batch_output_gradient(
+                lambda x_in: self._call_energy_from_features(self.feat_layer(x_in), training=training),
+                x, self.eg_states, gradient_mode=self.gradient_mode, use_pfor=not self.use_xla)
             _ = self.force(x)
             y_pred = [temp_e, temp_g]
         elif self.precomputed_features and not self.energy_only:
             x1 = x[0]
             x2 = x[1]
-            with tf.GradientTape() as tape2:
-                tape2.watch(x1)
-                feat_flat_std = self.std_layer(x1, training=training)
-                temp_hidden = self.mlp_layer(feat_flat_std, training=training)
-                atpot = self.energy_layer(temp_hidden)
-            grad = tape2.batch_jacobian(atpot, x1)
-            grad = ks.backend.batch_dot(grad, x2, axes=(2, 1))
+            atpot, grad = batch_output_gradient(
+                lambda x_in: self._call_energy_from_features(x_in, training=training),
+                x1, self.eg_states, gradient_mode=self.gradient_mode, use_pfor=not self.use_xla)
+            if self.sparse_feature_derivative:
+                grad = self.sparse_grad_layer([grad, x2, self.feat_layer.get_derivative_index()])
+            else:
+                grad = ks.backend.batch_dot(grad, x2, axes=(2, 1))
             y_pred = [atpot, grad]
         elif self.precomputed_features and self.energy_only:
             x1 = x[0]
@@ -196,13 +211,25 @@ class EnergyGradientModel(ks.Model):
             out = y_pred
         return out
 
-    @tf.function
+    def _call_energy_from_features(self, feat_flat, training=False):
+        feat_flat_std = self.std_layer(feat_flat, training=training)
+        temp_hidden = self.mlp_layer(feat_flat_std, training=training)
+        return self.energy_layer(temp_hidden)
+
     def predict_chunk_feature(self, tf_x, training=False):
-        with tf.GradientTape() as tape2:
-            tape2.watch(tf_x)
-            feat_pred = self.feat_layer(tf_x, training=training)  # Forward pass
-        grad = tape2.batch_jacobian(feat_pred, tf_x)
-        return feat_pred, grad
+        # Sparse feature derivative of shape (batch, features, K, 3) or full jacobian (batch, features, atoms, 3).
+        # The chunk is padded to a bucket size, so that a smaller last chunk is not traced again.
+        predict_feature = self._predict_chunk_feature_xla if self.use_xla else self._predict_chunk_feature
+        return call_in_bucket(
+            lambda x: predict_feature(x, training=training, sparse=self.sparse_feature_derivative), tf_x)
+
+    @tf.function
+    def _predict_chunk_feature(self, tf_x, training=False, sparse=True):
+        return self.feat_layer.call_with_derivative(tf_x, sparse=sparse, training=training)
+
+    @tf.function(jit_compile=True)
+    def _predict_chunk_feature_xla(self, tf_x, training=False, sparse=True):
+        return self.feat_layer.call_with_derivative(tf_x, sparse=sparse, training=training)
 
     def precompute_feature_in_chunks(self, x, batch_size, training=False):
         np_x = []
@@ -210,7 +237,7 @@ class EnergyGradientModel(ks.Model):
         for j in range(int(np.ceil(len(x) / batch_size))):
             a = int(batch_size * j)
             b = int(batch_size * j + batch_size)
-            tf_x = tf.convert_to_tensor(x[a:b], dtype=tf.float32)
+            tf_x = tf.convert_to_tensor(x[a:b], dtype=self.compute_dtype)
             feat_pred, grad = self.predict_chunk_feature(tf_x, training=training)
             np_x.append(np.array(feat_pred.numpy()))
             np_grad.append(np.array(grad.numpy()))
@@ -223,6 +250,15 @@ class EnergyGradientModel(ks.Model):
     def fit(self, **kwargs):
         return super(EnergyGradientModel, self).fit(**kwargs)
 
+    def compile(self, **kwargs):
+        kwargs.setdefault("jit_compile", self.use_xla)
+        return super(EnergyGradientModel, self).compile(**kwargs)
+
+    def predict(self, x, batch_size=None, **kwargs):
+        if self.use_xla:
+            return predict_in_buckets(super(EnergyGradientModel, self).predict, x, batch_size=batch_size, **kwargs)
+        return super(EnergyGradientModel, self).predict(x, batch_size=batch_size, **kwargs)
+
     def get_config(self):
         # conf = super(EnergyGradientModel, self).get_config()
         conf = {}
@@ -244,6 +280,9 @@ class EnergyGradientModel(ks.Model):
             'energy_only': self.energy_only,
             'precomputed_features': self.precomputed_features,
             'output_as_dict': self.output_as_dict,
+            'gradient_mode': self.gradient_mode,
+            'use_xla': self.use_xla,
+            "precision": self.precision,
             "model_module": self.model_module
         })
         return conf
@@ -260,7 +299,11 @@ class EnergyGradientModel(ks.Model):
 
     def call_to_tensor_input(self, x):
         # No precomputed features necessary
-        return tf.convert_to_tensor(x, dtype=tf.float32)
+        return tf.convert_to_tensor(x, dtype=self.compute_dtype)
+
+    def get_input_signature(self):
+        # Coordinates for inference, see pyNNsMD.utils.inference.
+        return [tf.TensorSpec(shape=(None, self.eg_atoms, 3), dtype=self.compute_dtype)]
 
     def call_to_numpy_output(self, y):
         if self.output_as_dict:
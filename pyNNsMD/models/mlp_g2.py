@@ -3,9 +3,11 @@ import tensorflow as tf
 import tensorflow.keras as ks
 
 from pyNNsMD.layers.features import FeatureGeometric
-from pyNNsMD.layers.gradients import PropagateNACGradient2
+from pyNNsMD.layers.gradients import PropagateNACGradient2, PropagateSparseFeatureGradient
 from pyNNsMD.layers.mlp import MLP
 from pyNNsMD.layers.normalize import DummyLayer
+from pyNNsMD.utils.buckets import call_in_bucket
+from pyNNsMD.utils.precision import get_precision_policy, precision_scope
 
 
 class GradientModel2(ks.Model):
@@ -30,6 +32,7 @@ class GradientModel2(ks.Model):
                  dropout=0.01,
                  normalization_mode=1,
                  precomputed_features=False,
+                 precision="float32",
                  model_module="mlp_g2",
                  **kwargs):
         """Initialize a Gradient with hyperparameters.
@@ -38,7 +41,9 @@ class GradientModel2(ks.Model):
             hyper (dict): Hyperparamters.
             **kwargs (dict): Additional keras.model parameters.
         """
-        super(GradientModel2, self).__init__(**kwargs)
+        hidden_policy, io_dtype = get_precision_policy(precision)
+        super(GradientModel2, self).__init__(dtype=io_dtype, **kwargs)
+        self.precision = precision
 
         self.in_invd_index = invd_index
         self.in_angle_index = angle_index
@@ -86,36 +91,41 @@ class GradientModel2(ks.Model):
         if use_dihed_index:
             in_model_dim += len(dihed_index)
 
-        self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
-                                           angle_shape=angle_shape,
-                                           dihed_shape=dihed_shape,
-                                           name="feat_geo"
-                                           )
-        self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
-
-        if normalization_mode == 1:
-            self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
-        elif normalization_mode == 2:
-            self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
-        else:
-            self.std_layer = DummyLayer()
-
-        self.mlp_layer = MLP(nn_size,
-                             dense_depth=depth,
-                             dense_bias=True,
-                             dense_bias_last=False,
-                             dense_activ=activ,
-                             dense_activ_last=activ,
-                             dense_activity_regularizer=use_reg_activ,
-                             dense_kernel_regularizer=use_reg_weight,
-                             dense_bias_regularizer=use_reg_bias,
-                             dropout_use=use_dropout,
-                             dropout_dropout=dropout,
-                             name='mlp'
-                             )
-        self.virt_layer = ks.layers.Dense(out_dim * in_model_dim, name='virt', use_bias=False, activation='linear')
-        self.resh_layer = tf.keras.layers.Reshape((out_dim, in_model_dim))
-        self.prop_grad_layer = PropagateNACGradient2(axis=(2, 1))
+        with precision_scope(io_dtype):
+            self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
+                                               angle_shape=angle_shape,
+                                               dihed_shape=dihed_shape,
+                                               name="feat_geo"
+                                               )
+            self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
+
+            if normalization_mode == 1:
+                self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
+            elif normalization_mode == 2:
+                self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
+            else:
+                self.std_layer = DummyLayer()
+
+            with precision_scope(hidden_policy):
+                self.mlp_layer = MLP(nn_size,
+                                     dense_depth=depth,
+                                     dense_bias=True,
+                                     dense_bias_last=False,
+                                     dense_activ=activ,
+                                     dense_activ_last=activ,
+                                     dense_activity_regularizer=use_reg_activ,
+                                     dense_kernel_regularizer=use_reg_weight,
+                                     dense_bias_regularizer=use_reg_bias,
+                                     dropout_use=use_dropout,
+                                     dropout_dropout=dropout,
+                                     name='mlp'
+                                     )
+            self.virt_layer = ks.layers.Dense(out_dim * in_model_dim, name='virt', use_bias=False, activation='linear')
+            self.resh_layer = tf.keras.layers.Reshape((out_dim, in_model_dim))
+            self.prop_grad_layer = PropagateNACGradient2(axis=(2, 1))
+            self.sparse_grad_layer = PropagateSparseFeatureGradient(atoms=indim, name='sparse_grad')
+        # Feature derivative for precomputed features is sparse for the atoms of each feature
+        self.sparse_feature_derivative = True
 
         # Build all layers
         self.precomputed_features = False
@@ -135,10 +145,13 @@ class GradientModel2(ks.Model):
         x = data
         # Compute predictions
         if not self.precomputed_features:
-            with tf.GradientTape() as tape2:
-                tape2.watch(x)
-                feat_flat = self.feat_layer(x)
-            temp_grad = tape2.batch_jacobian(feat_flat, x)
+            if self.sparse_feature_derivative:
+                feat_flat, temp_grad = self.feat_layer.call_with_derivative(x)
+            else:
+                with tf.GradientTape() as tape2:
+                    tape2.watch(x)
+                    feat_flat = self.feat_layer(x)
+                temp_grad = tape2.batch_jacobian(feat_flat, x)
 
             feat_flat_std = self.std_layer(feat_flat, training=training)
             temp_hidden = self.mlp_layer(feat_flat_std, training=training)
@@ -146,7 +159,10 @@ class GradientModel2(ks.Model):
             temp_v = self.virt_layer(temp_hidden)
             temp_va = self.resh_layer(temp_v)
             # y_pred = ks.backend.batch_dot(temp_va,temp_grad ,axes=(2,1))
-            y_pred = self.prop_grad_layer([temp_va, temp_grad])
+            if self.sparse_feature_derivative:
+                y_pred = self.sparse_grad_layer([temp_va, temp_grad, self.feat_layer.get_derivative_index()])
+            else:
+                y_pred = self.prop_grad_layer([temp_va, temp_grad])
         else:
             x1 = x[0]
             x2 = x[1]
@@ -155,17 +171,22 @@ class GradientModel2(ks.Model):
             temp_v = self.virt_layer(temp_hidden)
             temp_va = self.resh_layer(temp_v)
             # y_pred = ks.backend.batch_dot(temp_va, x2, axes=(2, 1))
-            y_pred = self.prop_grad_layer([temp_va, x2])
+            if self.sparse_feature_derivative:
+                y_pred = self.sparse_grad_layer([temp_va, x2, self.feat_layer.get_derivative_index()])
+            else:
+                y_pred = self.prop_grad_layer([temp_va, x2])
 
         return y_pred
 
-    @tf.function
     def predict_chunk_feature(self, tf_x, training=False):
-        with tf.GradientTape() as tape2:
-            tape2.watch(tf_x)
-            feat_pred = self.feat_layer(tf_x, training=training)  # Forward pass
-        grad = tape2.batch_jacobian(feat_pred, tf_x)
-        return feat_pred, grad
+        # Sparse feature derivative of shape (batch, features, K, 3) or full jacobian (batch, features, atoms, 3).
+        # The chunk is padded to a bucket size, so that a smaller last chunk is not traced again.
+        return call_in_bucket(
+            lambda x: self._predict_chunk_feature(x, training=training, sparse=self.sparse_feature_derivative), tf_x)
+
+    @tf.function
+    def _predict_chunk_feature(self, tf_x, training=False, sparse=True):
+        return self.feat_layer.call_with_derivative(tf_x, sparse=sparse, training=training)
 
     def precompute_feature_in_chunks(self, x, batch_size, training=False):
         np_x = []
@@ -173,7 +194,7 @@ class GradientModel2(ks.Model):
         for j in range(int(np.ceil(len(x) / batch_size))):
             a = int(batch_size * j)
             b = int(batch_size * j + batch_size)
-            tf_x = tf.convert_to_tensor(x[a:b], dtype=tf.float32)
+            tf_x = tf.convert_to_tensor(x[a:b], dtype=self.compute_dtype)
             feat_pred, grad = self.predict_chunk_feature(tf_x, training=training)
             np_x.append(np.array(feat_pred.numpy()))
             np_grad.append(np.array(grad.numpy()))
@@ -206,6 +227,7 @@ class GradientModel2(ks.Model):
             'dropout': self.dropout,
             'normalization_mode': self.normalization_mode,
             'precomputed_features': self.precomputed_features,
+            "precision": self.precision,
             "model_module": self.model_module
         })
         return conf
@@ -222,7 +244,11 @@ class GradientModel2(ks.Model):
 
     def call_to_tensor_input(self, x):
         # No precomputed features necessary
-        return tf.convert_to_tensor(x, dtype=tf.float32)
+        return tf.convert_to_tensor(x, dtype=self.compute_dtype)
+
+    def get_input_signature(self):
+        # Coordinates for inference, see pyNNsMD.utils.inference.
+        return [tf.TensorSpec(shape=(None, self.y_atoms, 3), dtype=self.compute_dtype)]
 
     def call_to_numpy_output(self, y):
         if isinstance(y, np.ndarray):
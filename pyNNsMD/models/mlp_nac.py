@@ -3,8 +3,11 @@ import tensorflow as tf
 import tensorflow.keras as ks
 
 from pyNNsMD.layers.features import FeatureGeometric
+from pyNNsMD.layers.gradients import PropagateSparseNACGradient
 from pyNNsMD.layers.mlp import MLP
 from pyNNsMD.layers.normalize import DummyLayer
+from pyNNsMD.utils.buckets import call_in_bucket
+from pyNNsMD.utils.precision import get_precision_policy, precision_scope
 
 
 class NACModel(ks.Model):
@@ -29,6 +32,7 @@ class NACModel(ks.Model):
                  dropout=0.01,
                  normalization_mode=1,
                  precomputed_features=False,
+                 precision="float32",
                  model_module="mlp_nac",
                  **kwargs):
         """Initialize a NACModel with hyperparameters.
@@ -37,7 +41,9 @@ class NACModel(ks.Model):
             hyper (dict): Hyperparamters.
             **kwargs (dict): Additional keras.model parameters.
         """
-        super(NACModel, self).__init__(**kwargs)
+        hidden_policy, io_dtype = get_precision_policy(precision)
+        super(NACModel, self).__init__(dtype=io_dtype, **kwargs)
+        self.precision = precision
         self.model_module = model_module
         self.in_invd_index = invd_index
         self.in_angle_index = angle_index
@@ -77,35 +83,41 @@ class NACModel(ks.Model):
         angle_shape = angle_index.shape if use_angle_index else None
         dihed_shape = dihed_index.shape if use_dihed_index else None
 
-        self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
-                                           angle_shape=angle_shape,
-                                           dihed_shape=dihed_shape,
-                                           name="feat_geo"
-                                           )
-        self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
-
-        if normalization_mode == 1:
-            self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
-        elif normalization_mode == 2:
-            self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
-        else:
-            self.std_layer = DummyLayer()
-
-        self.mlp_layer = MLP(nn_size,
-                             dense_depth=depth,
-                             dense_bias=True,
-                             dense_bias_last=False,
-                             dense_activ=activ,
-                             dense_activ_last=activ,
-                             dense_activity_regularizer=use_reg_activ,
-                             dense_kernel_regularizer=use_reg_weight,
-                             dense_bias_regularizer=use_reg_bias,
-                             dropout_use=use_dropout,
-                             dropout_dropout=dropout,
-                             name='mlp'
-                             )
-        self.virt_layer = ks.layers.Dense(out_dim * indim, name='virt', use_bias=False, activation='linear')
-        self.resh_layer = tf.keras.layers.Reshape((out_dim, indim))
+        with precision_scope(io_dtype):
+            self.feat_layer = FeatureGeometric(invd_shape=invd_shape,
+                                               angle_shape=angle_shape,
+                                               dihed_shape=dihed_shape,
+                                               name="feat_geo"
+                                               )
+            self.feat_layer.set_mol_index(invd_index, angle_index, dihed_index)
+
+            if normalization_mode == 1:
+                self.std_layer = tf.keras.layers.BatchNormalization(name='feat_std')
+            elif normalization_mode == 2:
+                self.std_layer = tf.keras.layers.LayerNormalization(name='feat_std')
+            else:
+                self.std_layer = DummyLayer()
+
+            with precision_scope(hidden_policy):
+                self.mlp_layer = MLP(nn_size,
+                                     dense_depth=depth,
+                                     dense_bias=True,
+                                     dense_bias_last=False,
+                                     dense_activ=activ,
+                                     dense_activ_last=activ,
+                                     dense_activity_regularizer=use_reg_activ,
+                                     dense_kernel_regularizer=use_reg_weight,
+                                     dense_bias_regularizer=use_reg_bias,
+                                     dropout_use=use_dropout,
+                                     dropout_dropout=dropout,
+                                     name='mlp'
+                                     )
+            self.virt_layer = ks.layers.Dense(out_dim * indim, name='virt', use_bias=False, activation='linear')
+            # Virtual potential is only used by its kernel for the diagonal NACs.
+            self.virt_layer.build((None, nn_size))
+            self.sparse_nac_layer = PropagateSparseNACGradient(states=out_dim, atoms=indim, name='sparse_nac')
+        # Feature derivative for precomputed features is sparse for the atoms of each feature
+        self.sparse_feature_derivative = True
 
         # Build all layers
         self.precomputed_features = False
@@ -124,44 +136,38 @@ class NACModel(ks.Model):
 
         """
         x = data
-        # Compute predictions
+        # The virtual potential is linear in the last hidden layer. The diagonal NACs are obtained from the jacobian
+        # of the hidden layer with respect to features and the kernel of the virtual layer, which avoids the
+        # jacobian of the potential of shape (batch, states, atoms, atoms, 3).
         if not self.precomputed_features:
-            with tf.GradientTape() as tape2:
-                tape2.watch(x)
-                feat_flat = self.feat_layer(x)
-                feat_flat_std = self.std_layer(feat_flat, training=training)
-                temp_hidden = self.mlp_layer(feat_flat_std, training=training)
-                temp_v = self.virt_layer(temp_hidden)
-                temp_va = self.resh_layer(temp_v)
-            temp_grad = tape2.batch_jacobian(temp_va, x)
-            grad = ks.backend.concatenate(
-                [ks.backend.expand_dims(temp_grad[:, :, i, i, :], axis=2) for i in range(self.nac_atoms)], axis=2)
-            y_pred = grad
+            feat_flat, feat_grad = self.feat_layer.call_with_derivative(x, sparse=True)
+            sparse = True
+        else:
+            feat_flat, feat_grad = x[0], x[1]
+            sparse = self.sparse_feature_derivative
+        with tf.GradientTape() as tape2:
+            tape2.watch(feat_flat)
+            feat_flat_std = self.std_layer(feat_flat, training=training)
+            temp_hidden = self.mlp_layer(feat_flat_std, training=training)
+        grad = tape2.batch_jacobian(temp_hidden, feat_flat)
+        if sparse:
+            y_pred = self.sparse_nac_layer([grad, feat_grad, self.virt_layer.kernel,
+                                            self.feat_layer.get_derivative_index()])
         else:
-            x1 = x[0]
-            x2 = x[1]
-            with tf.GradientTape() as tape2:
-                tape2.watch(x1)
-                feat_flat_std = self.std_layer(x1, training=training)
-                temp_hidden = self.mlp_layer(feat_flat_std, training=training)
-                temp_v = self.virt_layer(temp_hidden)
-                temp_va = self.resh_layer(temp_v)
-            grad = tape2.batch_jacobian(temp_va, x1)
-            # grad = ks.backend.reshape(grad, (ks.backend.shape(x1)[0], self.nac_states,
-            #                                  self.nac_atoms, ks.backend.shape(grad)[2]))
-            grad = ks.backend.batch_dot(grad, x2, axes=(3, 1))
-            y_pred = ks.backend.concatenate(
-                [ks.backend.expand_dims(grad[:, :, i, i, :], axis=2) for i in range(self.nac_atoms)], axis=2)
+            kernel = tf.reshape(tf.cast(self.virt_layer.kernel, grad.dtype), (-1, self.in_states, self.nac_atoms))
+            y_pred = tf.einsum("bhf,bfic,hsi->bsic", grad, feat_grad, kernel)
 
         return y_pred
 
-    @tf.function
     def predict_chunk_feature(self, tf_x, training=False):
-        with tf.GradientTape() as tape2:
-            tape2.watch(tf_x)
-            feat_pred = self.feat_layer(tf_x, training=training)  # Forward pass
-        grad = tape2.batch_jacobian(feat_pred, tf_x)
-        return feat_pred, grad
+        # Sparse feature derivative of shape (batch, features, K, 3) or full jacobian (batch, features, atoms, 3).
+        # The chunk is padded to a bucket size, so that a smaller last chunk is not traced again.
+        return call_in_bucket(
+            lambda x: self._predict_chunk_feature(x, training=training, sparse=self.sparse_feature_derivative), tf_x)
+
+    @tf.function
+    def _predict_chunk_feature(self, tf_x, training=False, sparse=True):
+        return self.feat_layer.call_with_derivative(tf_x, sparse=sparse, training=training)
 
     def precompute_feature_in_chunks(self, x, batch_size, training=False):
         np_x = []
@@ -169,7 +175,7 @@ class NACModel(ks.Model):
         for j in range(int(np.ceil(len(x) / batch_size))):
             a = int(batch_size * j)
             b = int(batch_size * j + batch_size)
-            tf_x = tf.convert_to_tensor(x[a:b], dtype=tf.float32)
+            tf_x = tf.convert_to_tensor(x[a:b], dtype=self.compute_dtype)
             feat_pred, grad = self.predict_chunk_feature(tf_x, training=training)
             np_x.append(np.array(feat_pred.numpy()))
             np_grad.append(np.array(grad.numpy()))
@@ -200,6 +206,7 @@ class NACModel(ks.Model):
             'dropout': self.dropout,
             'normalization_mode': self.normalization_mode,
             'precomputed_features': self.precomputed_features,
+            "precision": self.precision,
             "model_module": self.model_module
         })
         return conf
@@ -216,7 +223,11 @@ class NACModel(ks.Model):
 
     def call_to_tensor_input(self, x):
         # No precomputed features necessary
-        return tf.convert_to_tensor(x, dtype=tf.float32)
+        return tf.convert_to_tensor(x, dtype=self.compute_dtype)
+
+    def get_input_signature(self):
+        # Coordinates for inference, see pyNNsMD.utils.inference.
+        return [tf.TensorSpec(shape=(None, self.nac_atoms, 3), dtype=self.compute_dtype)]
 
     def call_to_numpy_output(self, y):
         if isinstance(y, np.ndarray):
@@ -0,0 +1,103 @@
+"""
+Tensorflow keras model with the scaler of an ensemble member folded into the graph.
+
+The model takes coordinates in units of the data and returns the output of `scaler.inverse_transform()`. The scaling
+is done by constant affine layers, so that the saved model is self-contained for MD code and no numpy pre- and
+post-processing is required per call.
+
+.. code-block:: python
+
+    scaled_model = ScaledModel(model, scaler)
+    scaled_model.save("model_tf")
+
+"""
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.keras as ks
+
+from pyNNsMD.layers.normalize import ConstAffineTransform
+
+
+class ScaledModel(ks.Model):
+    """Subclassed tf.keras.model that wraps a model with the constant transformation of its scaler.
+
+    The model is supposed to be saved and exported for MD code.
+    """
+
+    def __init__(self, model, scaler, input_shape=None, **kwargs):
+        """Initialize model.
+
+        Args:
+            model (ks.Model): Model of coordinates, e.g. :obj:`EnergyGradientModel` or :obj:`NACModel`.
+            scaler (ScalerBase): Scaler that implements `get_affine_transform()`.
+            input_shape (tuple): Shape of coordinates. Default is None, which uses the build shape of `model`.
+            **kwargs
+        """
+        # Coordinates and output are transformed in the dtype of the model, e.g. float64.
+        kwargs.setdefault("dtype", getattr(model, "dtype", None))
+        super(ScaledModel, self).__init__(**kwargs)
+        if hasattr(model, "predict_to_tensor_input"):
+            raise NotImplementedError("Scaled model requires plain coordinate input, which is not the case for %s" %
+                                      type(model).__name__)
+        # Precomputed features are only used for training.
+        if getattr(model, "precomputed_features", False):
+            model_config = model.get_config()
+            model_config["precomputed_features"] = False
+            model_copy = type(model)(**model_config)
+            model_copy.set_weights(model.get_weights())
+            model = model_copy
+        if input_shape is None:
+            input_shape = getattr(model, "_build_input_shape", None)
+        if input_shape is None:
+            raise ValueError("Can not determine input shape of model %s." % type(model).__name__)
+        self.scaled_input_shape = tuple(input_shape)
+
+        affine = scaler.get_affine_transform()
+        self.model_layer = model
+        self.x_layer = self._make_affine_layer(affine["x"], name="scale_x", dtype=self.dtype)
+        self.y_layers = [self._make_affine_layer(y, name="scale_y%s" % i, dtype=self.dtype)
+                         for i, y in enumerate(affine["y"])]
+        # Marker that is saved with the model, so that a loaded model is known to return unscaled output.
+        self.scaler_included = tf.Variable(True, trainable=False, name="scaler_included")
+        self.build(self.scaled_input_shape)
+
+    @staticmethod
+    def _make_affine_layer(scale_offset, name, dtype=None):
+        scale, offset = scale_offset
+        layer = ConstAffineTransform(scale_shape=np.shape(scale), offset_shape=np.shape(offset), name=name,
+                                     dtype=dtype)
+        layer.set_affine(scale, offset)
+        return layer
+
+    def call(self, data, training=False, **kwargs):
+        """Call the scaled model output, forward pass.
+
+        Args:
+            data (tf.tensor): Coordinates.
+            training (bool, optional): Training Mode. Defaults to False.
+
+        Returns:
+            y_pred: Output of the model with the inverse transformation of the scaler.
+        """
+        x = self.x_layer(data)
+        y = self.model_layer(x, training=training)
+        y_flat = tf.nest.flatten(y)
+        if len(y_flat) != len(self.y_layers):
+            raise ValueError("Scaler has %s outputs but model returns %s." % (len(self.y_layers), len(y_flat)))
+        y_flat = [layer(y_i) for layer, y_i in zip(self.y_layers, y_flat)]
+        return tf.nest.pack_sequence_as(y, y_flat)
+
+    def save(self, filepath, **kwargs):
+        # Make graph with coordinate input.
+        self.predict(np.ones((1,) + self.scaled_input_shape[1:]))
+        tf.keras.models.save_model(self, filepath, **kwargs)
+
+    def call_to_tensor_input(self, x):
+        return tf.convert_to_tensor(x, dtype=self.compute_dtype)
+
+    def get_input_signature(self):
+        return [tf.TensorSpec(shape=(None,) + self.scaled_input_shape[1:], dtype=self.compute_dtype)]
+
+    def call_to_numpy_output(self, y):
+        return tf.nest.map_structure(lambda y_i: y_i.numpy(), y)
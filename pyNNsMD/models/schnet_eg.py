@@ -1,9 +1,14 @@
 import tensorflow as tf
 from kgcnn.layers.modules import OptionalInputEmbedding
 from pyNNsMD.layers.schnet import SchNetInteraction, NodeDistance, DenseMasked, ApplyMask, PoolingNodes
+from pyNNsMD.layers.schnet import DenseToDisjoint, DisjointNodeDistance, DisjointPoolingNodes
+from pyNNsMD.layers.gradients import batch_output_gradient
 from kgcnn.layers.geom import GaussBasisLayer
-from kgcnn.utils.adj import define_adjacency_from_distance, coordinates_to_distancematrix
 from kgcnn.layers.mlp import MLP
+from pyNNsMD.utils.neighbors import NeighborList
+from pyNNsMD.utils.buckets import get_bucket_size, predict_in_buckets
+from pyNNsMD.utils.padding import pad_batch, pack_schnet_input
+from pyNNsMD.utils.precision import get_precision_policy, precision_scope
 import numpy as np
 
 ks = tf.keras
@@ -38,28 +43,58 @@ class SchNetEnergy(ks.Model):
                  use_output_mlp: bool = None,
                  output_mlp: dict = None,
                  max_neighbours: int = None,
+                 neighbor_args: dict = None,
+                 gradient_mode: str = "batch_jacobian",
+                 disjoint: bool = False,
+                 use_xla: bool = False,
+                 precision: str = "float32",
                  **kwargs):
-        super(SchNetEnergy, self).__init__(**kwargs)
+        hidden_policy, io_dtype = get_precision_policy(precision)
+        super(SchNetEnergy, self).__init__(dtype=io_dtype, **kwargs)
         local_input = locals()
         kwargs_list = ["name", "model_module", "energy_only", "output_as_dict", "inputs", "input_embedding",
                        "gauss_args", "interaction_args", "node_pooling_args", "depth", "verbose", "last_mlp",
-                       "output_embedding", "use_output_mlp", "output_mlp", "max_neighbours"]
+                       "output_embedding", "use_output_mlp", "output_mlp", "max_neighbours", "neighbor_args",
+                       "gradient_mode", "disjoint", "use_xla", "precision"]
         self._model_kwargs = {x: local_input[x] for x in kwargs_list}
         self.depth = depth
         self.energy_only = energy_only
         self.output_as_dict = output_as_dict
         self.max_neighbours = max_neighbours
+        self.gradient_mode = gradient_mode
+        self.disjoint = disjoint
+        self.use_xla = use_xla
+        self.precision = precision
+        if use_xla and disjoint:
+            raise ValueError("Disjoint SchNet has dynamic number of nodes and edges and can not be compiled by XLA.")
+        output_units = output_mlp["units"]
+        self.num_states = int(output_units[-1] if isinstance(output_units, (list, tuple)) else output_units)
         self.range_dist = gauss_args["distance"]
+        # Stateful neighbor list for edge indices, e.g. with Verlet skin for MD.
+        self.neighbor_list = NeighborList(cutoff=self.range_dist, max_neighbours=max_neighbours,
+                                          **(neighbor_args if neighbor_args is not None else {}))
         # layers
-        self.lay_embed = OptionalInputEmbedding(**input_embedding['node'], use_embedding=len(inputs[1]['shape']) < 2)
-        self.lay_dist = NodeDistance()
-        self.lay_gauss = GaussBasisLayer(**gauss_args)
-        self.lay_linear = DenseMasked(interaction_args["units"], activation='linear')
-        self.lay_int = [SchNetInteraction(**interaction_args) for _ in range(0, depth)]
-        self.lay_pool = PoolingNodes(**node_pooling_args)
-        self.lay_mask = ApplyMask()
-        self.lay_mlp_last = MLP(**last_mlp)
-        self.lay_mlp_output = MLP(**output_mlp)
+        # Node embedding and interactions compute with the hidden policy, distances and output in `io_dtype`.
+        with precision_scope(io_dtype):
+            with precision_scope(hidden_policy):
+                self.lay_embed = OptionalInputEmbedding(**input_embedding['node'],
+                                                        use_embedding=len(inputs[1]['shape']) < 2)
+            self.lay_gauss = GaussBasisLayer(**gauss_args)
+            with precision_scope(hidden_policy):
+                self.lay_linear = DenseMasked(interaction_args["units"], activation='linear')
+                self.lay_int = [SchNetInteraction(**interaction_args, disjoint=disjoint) for _ in range(0, depth)]
+            if self.disjoint:
+                # Padded input is converted to flattened nodes and edges, so that padding is not computed.
+                self.lay_disjoint = DenseToDisjoint()
+                self.lay_dist = DisjointNodeDistance()
+                self.lay_pool = DisjointPoolingNodes(**node_pooling_args)
+            else:
+                self.lay_dist = NodeDistance()
+                self.lay_pool = PoolingNodes(**node_pooling_args)
+            self.lay_mask = ApplyMask()
+            with precision_scope(hidden_policy):
+                self.lay_mlp_last = MLP(**last_mlp)
+            self.lay_mlp_output = MLP(**output_mlp)
 
         input_shape = [tf.TensorShape([None] + list(x["shape"])) for x in inputs]
         self.build(input_shape)
@@ -67,6 +102,8 @@ class SchNetEnergy(ks.Model):
 
     @tf.function
     def call_energy(self, inputs, **kwargs):
+        if self.disjoint:
+            return self.call_energy_disjoint(inputs, **kwargs)
         # Make input
         x, n, edi, mask_n, mask_e = inputs
         edi = tf.cast(edi, dtype="int64")
@@ -87,6 +124,20 @@ class SchNetEnergy(ks.Model):
         out = self.lay_mlp_output(out)
         return out
 
+    def call_energy_disjoint(self, inputs, **kwargs):
+        x, n, edi, graph_id = self.lay_disjoint(inputs)
+        n = self.lay_embed(n)
+        ed = self.lay_dist([x, edi])
+        ed = self.lay_gauss(ed)
+        n = self.lay_linear(n)
+        for i in range(0, self.depth):
+            n = self.lay_int[i]([n, ed, edi])
+
+        n = self.lay_mlp_last(n)
+        out = self.lay_pool([n, graph_id, tf.shape(inputs[0], out_type="int64")[0]])
+        out = self.lay_mlp_output(out)
+        return out
+
     def call(self, data, training=False, **kwargs):
         """Call the model output, forward pass.
 
@@ -103,10 +154,10 @@ class SchNetEnergy(ks.Model):
                 out = {'energy': out}
         else:
             x, n, edi, mask_n, mask_e = data
-            with tf.GradientTape() as tape2:
-                tape2.watch(x)
-                temp_e = self.call_energy([x, n, edi, mask_n, mask_e], training=training, **kwargs)
-            temp_g = tape2.batch_jacobian(temp_e, x)
+            temp_e, temp_g = batch_output_gradient(
+                lambda *args: self.call_energy(list(args), training=training, **kwargs), x, self.num_states,
+                gradient_mode=self.gradient_mode, args=[n, edi, mask_n, mask_e],
+                use_pfor=not self.use_xla)
             if self.output_as_dict:
                 out = {'energy': temp_e, 'force': temp_g}
             else:
@@ -118,22 +169,40 @@ class SchNetEnergy(ks.Model):
         conf.update(self._model_kwargs)
         return conf
 
+    def compile(self, **kwargs):
+        kwargs.setdefault("jit_compile", self.use_xla)
+        return super(SchNetEnergy, self).compile(**kwargs)
+
+    def predict(self, x, batch_size=None, **kwargs):
+        if self.use_xla:
+            return predict_in_buckets(super(SchNetEnergy, self).predict, x, batch_size=batch_size, **kwargs)
+        return super(SchNetEnergy, self).predict(x, batch_size=batch_size, **kwargs)
+
     def predict_to_tensor_input(self, inputs):
+        # Candidate pairs are only kept for calls of single steps in MD, not for a dataset.
+        return self._make_tensor_input(inputs, keep_neighbors=False)
+
+    def _make_tensor_input(self, inputs, keep_neighbors: bool = True):
         atoms, coords = inputs
-        dist_mat = [coordinates_to_distancematrix(x) for x in coords]
-        index_mat = [np.argsort(x, axis=1) for x in dist_mat]
-        dist_okay = [np.take_along_axis(x, i, axis=1) < self.range_dist for x, i in zip(dist_mat, index_mat)]
-        index_mat = [x[:, 1:self.max_neighbours + 1] for x in index_mat]
-        dist_okay = [x[:, 1:self.max_neighbours + 1] for x in dist_okay]
-        n, mask_n = self.padd_batch_dim(atoms)
-        pos, _ = self.padd_batch_dim(coords)
-        edi, _ = self.padd_batch_dim(index_mat)
-        mask_e, _ = self.padd_batch_dim(dist_okay)
-        X = [pos, n, edi, np.expand_dims(mask_n, axis=-1), np.expand_dims(mask_e, axis=-1)]
+        index_mat, dist_okay = self.neighbor_list(coords, keep_state=keep_neighbors)
+        if self.use_xla:
+            # Atoms and neighbours are padded to bucket sizes, so that XLA only compiles a few shapes.
+            X = pack_schnet_input(atoms, coords, index_mat, dist_okay,
+                                  num_atoms=get_bucket_size(max([len(x) for x in atoms])),
+                                  num_neighbours=get_bucket_size(max([np.shape(x)[1] for x in index_mat])))
+        else:
+            X = pack_schnet_input(atoms, coords, index_mat, dist_okay)
         return X
 
     def call_to_tensor_input(self, inputs):
-        return self.predict_to_tensor_input(inputs)
+        return self._make_tensor_input(inputs, keep_neighbors=True)
+
+    def get_input_signature(self):
+        # Padded coordinates, atoms, neighbour indices and masks, see pyNNsMD.utils.inference.
+        inputs = self._model_kwargs["inputs"]
+        dtypes = [self.compute_dtype] + [x["dtype"] for x in inputs[1:]]
+        return [tf.TensorSpec(shape=(None,) + tuple(x["shape"]), dtype=dtype, name=x["name"])
+                for x, dtype in zip(inputs, dtypes)]
 
     def call_to_numpy_output(self, y):
         if self.energy_only:
@@ -150,15 +219,7 @@ class SchNetEnergy(ks.Model):
 
     @staticmethod
     def padd_batch_dim(values):
-        max_shape = np.amax([x.shape for x in values], axis=0)
-        final_shape = np.concatenate([np.array([len(values)]), max_shape])
-        padded = np.zeros(final_shape, dtype=values[0].dtype)
-        mask = np.zeros(final_shape, dtype="bool")
-        for i, x in enumerate(values):
-            index = [i] + [slice(0, int(j)) for j in x.shape]
-            padded[tuple(index)] = x
-            mask[tuple(index)] = True
-        return padded, mask
+        return pad_batch(values)
 
 # from pyNNsMD.hypers.hyper_schnet_e import DEFAULT_HYPER_PARAM_SCHNET_E
 # schnet = SchNetEnergy(**DEFAULT_HYPER_PARAM_SCHNET_E["model"]["config"])
@@ -17,12 +17,16 @@ class SchnetEnergy(ks.Model):
                  energy_only: bool = True,
                  output_as_dict: bool = True,
                  schnet_kwargs=None,
+                 gradient_mode: str = "batch_jacobian",
                  **kwargs):
         super(SchnetEnergy, self).__init__(**kwargs)
+        if gradient_mode not in ["batch_jacobian", "vjp"]:
+            raise ValueError("Gradient mode %s is not supported for ragged input." % gradient_mode)
         self.schnet_kwargs = schnet_kwargs
         self.model_module = model_module
         self.energy_only = energy_only
         self.output_as_dict = output_as_dict
+        self.gradient_mode = gradient_mode
         self._schnet_model = make_model(**schnet_kwargs)
 
         # Build the model with example data.
@@ -51,13 +55,21 @@ class SchnetEnergy(ks.Model):
             with tf.GradientTape(persistent=True) as tape2:
                 tape2.watch(geos.values)
                 temp_e = self._schnet_model(x)
-            temp_g = tape2.jacobian(temp_e, geos.values)
-            temp_g = tf.transpose(temp_g, [0, 2, 1, 3])
-            temp_g = tf.map_fn(lambda l_arg: tf.gather(l_arg[0], tf.range(l_arg[1], l_arg[1] + l_arg[2]), axis=0),
-                               [temp_g, geos.row_starts(), geos.row_lengths()],
-                               fn_output_signature=tf.RaggedTensorSpec(shape=[None, temp_e.shape[1], 3],
-                                                                       ragged_rank=0,
-                                                                       dtype=tf.float32))
+                # Graphs in batch are disjoint, gradient of the batch sum yields gradients of all atoms.
+                temp_e_sum = tf.reduce_sum(temp_e, axis=0)
+            if self.gradient_mode == "vjp":
+                # One vectorized reverse pass per state instead of per state and molecule.
+                temp_g = tape2.jacobian(temp_e_sum, geos.values)
+                temp_g = tf.transpose(temp_g, [1, 0, 2])
+                temp_g = tf.RaggedTensor.from_row_splits(temp_g, geos.row_splits)
+            else:
+                temp_g = tape2.jacobian(temp_e, geos.values)
+                temp_g = tf.transpose(temp_g, [0, 2, 1, 3])
+                temp_g = tf.map_fn(
+                    lambda l_arg: tf.gather(l_arg[0], tf.range(l_arg[1], l_arg[1] + l_arg[2]), axis=0),
+                    [temp_g, geos.row_starts(), geos.row_lengths()],
+                    fn_output_signature=tf.RaggedTensorSpec(shape=[None, temp_e.shape[1], 3], ragged_rank=0,
+                                                            dtype=tf.float32))
             if self.output_as_dict:
                 out = {'energy': temp_e, 'force': temp_g}
             else:
@@ -73,6 +85,7 @@ class SchnetEnergy(ks.Model):
             "schnet_kwargs": self.schnet_kwargs,
             "energy_only": self.energy_only,
             "output_as_dict": self.output_as_dict,
+            "gradient_mode": self.gradient_mode,
         })
         return conf
 
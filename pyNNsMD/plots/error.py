@@ -46,12 +46,34 @@ def plot_error_vec_mean(
         y_pred = [y_pred]
     if not isinstance(y_true, list):
         y_true = [y_true]
+
+    mean_errors = [np.mean(np.abs(y_pred[i] - y_true[i]), axis=0).flatten() for i in range(len(y_pred))]
+    return plot_mean_error_curves(mean_errors, label_curves=label_curves, unit_predicted=unit_predicted,
+                                  filename=filename, dir_save=dir_save, save_plot_to_file=save_plot_to_file,
+                                  filetypeout=filetypeout, x_label=x_label, plot_title=plot_title)
+
+
+def plot_mean_error_curves(
+        mean_errors,
+        label_curves="Vector",
+        unit_predicted="#",
+        filename='fit',
+        dir_save="",
+        save_plot_to_file=False,
+        filetypeout='.png',
+        x_label="Vector components",
+        plot_title="Component mean error"
+):
+    """Plot precomputed mean absolute error of each component, e.g. of
+    :obj:`pyNNsMD.datasets.evaluate.ErrorStatistics`."""
+    if not isinstance(mean_errors, list):
+        mean_errors = [mean_errors]
     if isinstance(label_curves, str):
         label_curves = [label_curves]
 
     fig = plt.figure()
-    for i in range(len(y_pred)):
-        preds = np.mean(np.abs(y_pred[i] - y_true[i]), axis=0).flatten()
+    for i in range(len(mean_errors)):
+        preds = np.asarray(mean_errors[i]).flatten()
         if i < len(label_curves):
             temp_label = label_curves[i]
         else:
@@ -84,8 +106,6 @@ def plot_error_vec_max(y_pred,
         y_pred = [y_pred]
     if not isinstance(y_true, list):
         y_true = [y_true]
-    if isinstance(label_curves, str):
-        label_curves = [label_curves]
 
     err_max = []
     err_rel = []
@@ -94,6 +114,30 @@ def plot_error_vec_max(y_pred,
         err_max.append(temp_err)
         err_rel.append(temp_rel)
 
+    return plot_max_error_curves(err_max, err_rel, label_curves=label_curves, unit_predicted=unit_predicted,
+                                 filename=filename, dir_save=dir_save, save_plot_to_file=save_plot_to_file,
+                                 filetypeout=filetypeout, x_label=x_label, plot_title=plot_title)
+
+
+def plot_max_error_curves(err_max,
+                          err_rel,
+                          label_curves="Vector",
+                          unit_predicted="#",
+                          filename='fit',
+                          dir_save="",
+                          save_plot_to_file=False,
+                          filetypeout='.png',
+                          x_label="Vector components",
+                          plot_title="Component max error"):
+    """Plot precomputed maximum and relative maximum error of each component, e.g. of
+    :obj:`pyNNsMD.datasets.evaluate.ErrorStatistics`."""
+    if not isinstance(err_max, list):
+        err_max = [err_max]
+    if not isinstance(err_rel, list):
+        err_rel = [err_rel]
+    if isinstance(label_curves, str):
+        label_curves = [label_curves]
+
     fig1 = plt.figure()
     ax1 = fig1.add_subplot(111)
     for i in range(len(err_max)):
@@ -1,5 +1,16 @@
 
 
+from pyNNsMD.scaler.moments import accumulate_shape
+
+
+def _merge_encountered_shape(shape, other_shape):
+    if isinstance(shape, list):
+        return [_merge_encountered_shape(x, y) for x, y in zip(shape, other_shape)]
+    if other_shape is None:
+        return shape
+    return accumulate_shape(shape, other_shape)
+
+
 class ScalerBase:
 
     def __init__(self, **kwargs):
@@ -14,9 +25,54 @@ class ScalerBase:
     def fit(self, **kwargs):
         raise NotImplementedError("Must be implemented in sub-class.")
 
+    def partial_fit(self, **kwargs):
+        raise NotImplementedError("Must be implemented in sub-class.")
+
     def fit_transform(self, **kwargs):
         raise NotImplementedError("Must be implemented in sub-class.")
 
+    def _update_params(self):
+        raise NotImplementedError("Must be implemented in sub-class.")
+
+    def get_affine_transform(self):
+        """Scaling as constant affine transformation for :obj:`pyNNsMD.models.scaled.ScaledModel`.
+
+        Returns:
+            dict: Pair of `(scale, offset)` for `x` of `transform()` and list of pairs for each output of
+                `inverse_transform()` in the order of `tf.nest.flatten` for key "y".
+        """
+        raise NotImplementedError("Must be implemented in sub-class.")
+
+    def merge(self, other):
+        """Merge the statistics of another scaler of the same type, e.g. fitted on different data or in a different
+        process, and update the scaling.
+
+        Args:
+            other (ScalerBase): Scaler fitted with `partial_fit()` or `fit()`.
+
+        Returns:
+            self
+        """
+        if type(other) is not type(self):
+            raise ValueError("Can not merge scaler %s with %s." % (type(self).__name__, type(other).__name__))
+        for key, moments in self._moments.items():
+            moments.merge(other._moments[key])
+        self._encountered_y_shape = _merge_encountered_shape(self._encountered_y_shape, other._encountered_y_shape)
+        self._update_params()
+        return self
+
+    def _get_moments_state(self):
+        state = {key: value.get_state() for key, value in self._moments.items()}
+        return {"moments": state, "encountered_y_shape": self._encountered_y_shape}
+
+    def _set_moments_state(self, state):
+        # Weights saved before partial fit was supported have no statistics.
+        if state is None:
+            return
+        for key, value in state["moments"].items():
+            self._moments[key].set_state(value)
+        self._encountered_y_shape = state["encountered_y_shape"]
+
     def save(self, file_path):
         pass
 
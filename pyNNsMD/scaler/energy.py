@@ -1,6 +1,7 @@
 import numpy as np
 
 from pyNNsMD.scaler.base import ScalerBase
+from pyNNsMD.scaler.moments import RunningMoments, accumulate_shape
 
 
 class EnergyStandardScaler(ScalerBase):
@@ -25,6 +26,7 @@ class EnergyStandardScaler(ScalerBase):
 
         self._encountered_y_shape = None
         self._encountered_y_std = None
+        self._moments = {"x": RunningMoments(axis=None), "energy": RunningMoments(axis=0, keepdims=True)}
         self.scaler_module = scaler_module
 
     def transform(self, x=None, y=None):
@@ -36,6 +38,11 @@ class EnergyStandardScaler(ScalerBase):
             y_res = (y - self.energy_mean) / self.energy_std
         return x_res, y_res
 
+    def get_affine_transform(self):
+        x_scale = 1 / np.array(self.x_std)
+        return {"x": (x_scale, -np.array(self.x_mean) * x_scale),
+                "y": [(np.array(self.energy_std), np.array(self.energy_mean))]}
+
     def inverse_transform(self, x=None, y=None):
         if y is not None:
             y = y * self.energy_std + self.energy_mean
@@ -46,18 +53,38 @@ class EnergyStandardScaler(ScalerBase):
         return x, y
 
     def fit(self, x=None, y=None):
+        for moments in self._moments.values():
+            moments.reset()
+        self._encountered_y_shape = None
+        self.partial_fit(x=x, y=y)
+
+    def partial_fit(self, x=None, y=None):
+        """Update the scaling with a chunk of data, e.g. a batch of a memory-mapped dataset or new data points.
+
+        Args:
+            x (np.ndarray): Coordinates of shape (batch, atoms, 3). Can be None if x is not scaled.
+            y (np.ndarray): Energies of shape (batch, states).
+        """
+        if x is not None and (self.use_x_mean or self.use_x_std):
+            self._moments["x"].update(x)
+        if y is not None:
+            self._moments["energy"].update(y)
+            self._encountered_y_shape = accumulate_shape(self._encountered_y_shape, np.shape(y))
+        self._update_params()
+
+    def _update_params(self):
         npeps = np.finfo(float).eps
-        if self.use_x_mean:
-            self.x_mean = np.mean(x)
-        if self.use_x_std:
-            self.x_std = np.std(x) + npeps
-        if self.use_energy_mean:
-            self.energy_mean = np.mean(y, axis=0, keepdims=True)
-        if self.use_energy_std:
-            self.energy_std = np.std(y, axis=0, keepdims=True) + npeps
-
-        self._encountered_y_shape = np.array(y.shape)
-        self._encountered_y_std = np.std(y, axis=0)
+        x_moments, energy_moments = self._moments["x"], self._moments["energy"]
+        if self.use_x_mean and x_moments.count > 0:
+            self.x_mean = x_moments.get_mean()
+        if self.use_x_std and x_moments.count > 0:
+            self.x_std = x_moments.std + npeps
+        if energy_moments.count > 0:
+            if self.use_energy_mean:
+                self.energy_mean = energy_moments.get_mean()
+            if self.use_energy_std:
+                self.energy_std = energy_moments.std + npeps
+            self._encountered_y_std = energy_moments.std[0]
 
     def fit_transform(self, x=None, y=None):
         self.fit(x=x, y=y)
@@ -86,12 +113,14 @@ class EnergyStandardScaler(ScalerBase):
         self.x_std = np.array(weights['x_std'])
         self.energy_mean = np.array(weights['energy_mean'])
         self.energy_std = np.array(weights['energy_std'])
+        self._set_moments_state(weights.get('moments'))
 
     def save_weights(self, file_path):
         outdict = {'x_mean': np.array(self.x_mean),
                    'x_std': np.array(self.x_std),
                    'energy_mean': np.array(self.energy_mean),
-                   'energy_std': np.array(self.energy_std)}
+                   'energy_std': np.array(self.energy_std),
+                   'moments': self._get_moments_state()}
         np.save(file_path, outdict)
 
 
@@ -118,6 +147,8 @@ class EnergyGradientStandardScaler(ScalerBase):
 
         self._encountered_y_shape = [None, None]
         self._encountered_y_std = [None, None]
+        self._moments = {"x": RunningMoments(axis=None), "energy": RunningMoments(axis=0, keepdims=True),
+                         "gradient": RunningMoments(axis=(0, 2, 3))}
         self.scaler_module = scaler_module
 
     def transform(self, x=None, y=None):
@@ -142,6 +173,13 @@ class EnergyGradientStandardScaler(ScalerBase):
             y_res = [out_e, out_g]
         return x_res, y_res
 
+    def get_affine_transform(self):
+        x_scale = 1 / np.array(self.x_std) if self.use_x_std else np.ones_like(self.x_std)
+        x_offset = -np.array(self.x_mean) * x_scale if self.use_x_mean else np.zeros_like(self.x_mean)
+        return {"x": (x_scale, x_offset),
+                "y": [(np.array(self.energy_std), np.array(self.energy_mean)),
+                      (np.array(self.gradient_std), np.zeros_like(self.gradient_std))]}
+
     def inverse_transform(self, x=None, y=None):
         x_res = x
         y_res = y
@@ -165,7 +203,18 @@ class EnergyGradientStandardScaler(ScalerBase):
         return x_res, y_res
 
     def fit(self, x=None, y=None):
-        npeps = np.finfo(float).eps
+        for moments in self._moments.values():
+            moments.reset()
+        self._encountered_y_shape = [None, None]
+        self.partial_fit(x=x, y=y)
+
+    def partial_fit(self, x=None, y=None):
+        """Update the scaling with a chunk of data, e.g. a batch of a memory-mapped dataset or new data points.
+
+        Args:
+            x (np.ndarray): Coordinates of shape (batch, atoms, 3).
+            y (list): Energies of shape (batch, states) and gradients of shape (batch, states, atoms, 3).
+        """
         if isinstance(y, list):
             y0 = y[0]
             y1 = y[1]
@@ -174,20 +223,32 @@ class EnergyGradientStandardScaler(ScalerBase):
             y1 = y["force"]
         else:
             raise ValueError("Transform for expected [energy, force] but got %s" % y)
-        if self.use_x_mean:
-            self.x_mean = np.mean(x)
-        if self.use_x_std:
-            self.x_std = np.std(x) + npeps
-        if self.use_energy_mean:
-            self.energy_mean = np.mean(y0, axis=0, keepdims=True)
-        if self.use_energy_std:
-            self.energy_std = np.std(y0, axis=0, keepdims=True) + npeps
+        if x is not None and (self.use_x_mean or self.use_x_std):
+            self._moments["x"].update(x)
+        self._moments["energy"].update(y0)
+        self._moments["gradient"].update(y1)
+        self._encountered_y_shape = [accumulate_shape(self._encountered_y_shape[0], np.shape(y0)),
+                                     accumulate_shape(self._encountered_y_shape[1], np.shape(y1))]
+        self._update_params()
+
+    def _update_params(self):
+        npeps = np.finfo(float).eps
+        x_moments, energy_moments = self._moments["x"], self._moments["energy"]
+        if self.use_x_mean and x_moments.count > 0:
+            self.x_mean = x_moments.get_mean()
+        if self.use_x_std and x_moments.count > 0:
+            self.x_std = x_moments.std + npeps
+        if energy_moments.count > 0:
+            if self.use_energy_mean:
+                self.energy_mean = energy_moments.get_mean()
+            if self.use_energy_std:
+                self.energy_std = energy_moments.std + npeps
 
         self.gradient_std = np.expand_dims(np.expand_dims(self.energy_std, axis=-1), axis=-1) / self.x_std + npeps
         self.gradient_mean = np.zeros_like(self.gradient_std, dtype=np.float32)  # no mean shift expected
 
-        self._encountered_y_shape = [np.array(y0.shape), np.array(y1.shape)]
-        self._encountered_y_std = [np.std(y0, axis=0), np.std(y1, axis=(0, 2, 3))]
+        if energy_moments.count > 0 and self._moments["gradient"].count > 0:
+            self._encountered_y_std = [energy_moments.std[0], self._moments["gradient"].std]
 
     def fit_transform(self, x=None, y=None):
         self.fit(x=x, y=y)
@@ -200,7 +261,8 @@ class EnergyGradientStandardScaler(ScalerBase):
             'energy_mean': self.energy_mean,
             'energy_std': self.energy_std,
             'gradient_mean': self.gradient_mean,
-            'gradient_std': self.gradient_std
+            'gradient_std': self.gradient_std,
+            'moments': self._get_moments_state()
         }
         np.save(file_path, out_dict)
 
@@ -212,6 +274,7 @@ class EnergyGradientStandardScaler(ScalerBase):
         self.energy_std = np.array(indict['energy_std'])
         self.gradient_mean = np.array(indict['gradient_mean'])
         self.gradient_std = np.array(indict['gradient_std'])
+        self._set_moments_state(indict.get('moments'))
 
     def print_params_info(self):
         print("Info: Total-Data gradient std", self._encountered_y_shape[1], ":", self._encountered_y_std[1])
@@ -257,6 +320,7 @@ class GradientStandardScaler(ScalerBase):
 
         self._encountered_y_shape = None
         self._encountered_y_std = None
+        self._moments = {"x": RunningMoments(axis=None), "gradient": RunningMoments(axis=(0, 3), keepdims=True)}
 
     def transform(self, x=None, y=None):
         x_res = x
@@ -267,6 +331,11 @@ class GradientStandardScaler(ScalerBase):
             y_res = (y - self.gradient_mean) / self.gradient_std
         return x_res, y_res
 
+    def get_affine_transform(self):
+        x_scale = 1 / np.array(self.x_std)
+        return {"x": (x_scale, -np.array(self.x_mean) * x_scale),
+                "y": [(np.array(self.gradient_std), np.array(self.gradient_mean))]}
+
     def inverse_transform(self, x=None, y=None):
         x_res = x
         out_gradient = y
@@ -277,17 +346,37 @@ class GradientStandardScaler(ScalerBase):
         return x_res, out_gradient
 
     def fit(self, x, y):
-        npeps = np.finfo(float).eps
-        if self.use_x_mean:
-            self.x_mean = np.mean(x)
-        if self.use_x_std:
-            self.x_std = np.std(x) + npeps
-        if self.use_gradient_std:
-            self.gradient_std = np.std(y, axis=(0, 3), keepdims=True) + npeps
-            self.gradient_mean = np.zeros_like(self.gradient_std)
+        for moments in self._moments.values():
+            moments.reset()
+        self._encountered_y_shape = None
+        self.partial_fit(x=x, y=y)
 
-        self._encountered_y_std = np.std(y, axis=(0, 3), keepdims=True)
-        self._encountered_y_shape = np.array(y.shape)
+    def partial_fit(self, x=None, y=None):
+        """Update the scaling with a chunk of data, e.g. a batch of a memory-mapped dataset or new data points.
+
+        Args:
+            x (np.ndarray): Coordinates of shape (batch, atoms, 3).
+            y (np.ndarray): Gradients of shape (batch, states, atoms, 3).
+        """
+        if x is not None and (self.use_x_mean or self.use_x_std):
+            self._moments["x"].update(x)
+        if y is not None:
+            self._moments["gradient"].update(y)
+            self._encountered_y_shape = accumulate_shape(self._encountered_y_shape, np.shape(y))
+        self._update_params()
+
+    def _update_params(self):
+        npeps = np.finfo(float).eps
+        x_moments, gradient_moments = self._moments["x"], self._moments["gradient"]
+        if self.use_x_mean and x_moments.count > 0:
+            self.x_mean = x_moments.get_mean()
+        if self.use_x_std and x_moments.count > 0:
+            self.x_std = x_moments.std + npeps
+        if gradient_moments.count > 0:
+            if self.use_gradient_std:
+                self.gradient_std = gradient_moments.std + npeps
+                self.gradient_mean = np.zeros_like(self.gradient_std)
+            self._encountered_y_std = gradient_moments.std
 
     def fit_transform(self, x=None, y=None):
         self.fit(x=x, y=y)
@@ -298,7 +387,8 @@ class GradientStandardScaler(ScalerBase):
             'x_mean': self.x_mean,
             'x_std': self.x_std,
             'gradient_mean': self.gradient_mean,
-            'gradient_std': self.gradient_std
+            'gradient_std': self.gradient_std,
+            'moments': self._get_moments_state()
         }
         np.save(file_path, out_dict)
 
@@ -308,6 +398,7 @@ class GradientStandardScaler(ScalerBase):
         self.x_std = np.array(indict['x_std'])
         self.gradient_mean = np.array(indict['gradient_mean'])
         self.gradient_std = np.array(indict['gradient_std'])
+        self._set_moments_state(indict.get('moments'))
 
     def get_config(self):
         conf = {
@@ -0,0 +1,122 @@
+"""
+Running mean and variance for fitting scalers in chunks.
+
+Statistics of each chunk are computed with numpy and combined with the parallel algorithm of Chan et al., which is
+the chunk-wise form of Welford's update. Statistics of different chunks, processes or datasets can be merged in any
+order and give the same result as a single pass over all data up to floating point precision.
+
+.. code-block:: python
+
+    moments = RunningMoments(axis=0)
+    for chunk in chunks:
+        moments.update(chunk)
+    mean, std = moments.mean, moments.std
+
+"""
+
+import numpy as np
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations over the reduced axes of arrays."""
+
+    def __init__(self, axis=None, keepdims: bool = False):
+        """Initialize empty statistics.
+
+        Args:
+            axis (int, tuple): Axes to reduce like in `np.mean`. Default is None, which reduces all axes.
+            keepdims (bool): Whether to keep reduced axes with size one. Default is False.
+        """
+        self.axis = tuple(axis) if isinstance(axis, (list, tuple)) else axis
+        self.keepdims = keepdims
+        self.reset()
+
+    def reset(self):
+        """Remove all statistics."""
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+        self.dtype = None
+
+    def _merge(self, count, mean, m2, dtype):
+        if count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.dtype = count, mean, m2, dtype
+            return self
+        if np.shape(mean) != np.shape(self.mean):
+            raise ValueError("Can not merge statistics of shape %s and %s." % (np.shape(mean), np.shape(self.mean)))
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + np.square(delta) * (self.count * count / total)
+        self.count = total
+        return self
+
+    def update(self, values):
+        """Add a chunk of values.
+
+        Args:
+            values (np.ndarray): Values, which are reduced along `axis`.
+
+        Returns:
+            self
+        """
+        values = np.asarray(values)
+        dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.dtype("float64")
+        axis = tuple(range(values.ndim)) if self.axis is None else self.axis
+        axis = (axis,) if isinstance(axis, int) else axis
+        count = int(np.prod([values.shape[i] for i in axis]))
+        if count == 0:
+            return self
+        values = values.astype("float64", copy=False)
+        mean = np.mean(values, axis=axis, keepdims=True)
+        m2 = np.sum(np.square(values - mean), axis=axis, keepdims=True)
+        if not self.keepdims:
+            mean, m2 = np.squeeze(mean, axis=axis), np.squeeze(m2, axis=axis)
+        return self._merge(count, mean, m2, dtype)
+
+    def merge(self, other):
+        """Add the statistics of another :obj:`RunningMoments`, e.g. computed in a different process.
+
+        Args:
+            other (RunningMoments): Statistics over the same axes.
+
+        Returns:
+            self
+        """
+        return self._merge(other.count, other.mean, other.m2, other.dtype)
+
+    @property
+    def variance(self):
+        """Population variance like `np.var` in the dtype of the input."""
+        return np.asarray(self.m2 / self.count, dtype=self.dtype)
+
+    @property
+    def std(self):
+        """Population standard deviation like `np.std` in the dtype of the input."""
+        return np.asarray(np.sqrt(self.m2 / self.count), dtype=self.dtype)
+
+    def get_mean(self):
+        """Mean like `np.mean` in the dtype of the input."""
+        return np.asarray(self.mean, dtype=self.dtype)
+
+    def get_state(self):
+        """Statistics as dictionary of arrays for saving."""
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "dtype": None if self.dtype is None else str(self.dtype)}
+
+    def set_state(self, state: dict):
+        """Set statistics from :obj:`get_state`."""
+        self.count = int(state["count"])
+        self.mean = None if state["mean"] is None else np.array(state["mean"])
+        self.m2 = None if state["m2"] is None else np.array(state["m2"])
+        self.dtype = None if state["dtype"] is None else np.dtype(state["dtype"])
+        return self
+
+
+def accumulate_shape(shape, new_shape):
+    """Shape of concatenated arrays along the first axis for info prints."""
+    if shape is None or shape[0] is None:
+        return np.array(new_shape)
+    return np.array([shape[0] + new_shape[0]] + list(new_shape[1:]))
@@ -2,6 +2,7 @@ import json
 
 import numpy as np
 from pyNNsMD.scaler.base import ScalerBase
+from pyNNsMD.scaler.moments import RunningMoments, accumulate_shape
 
 
 class NACStandardScaler(ScalerBase):
@@ -26,6 +27,7 @@ class NACStandardScaler(ScalerBase):
 
         self._encountered_y_shape = None
         self._encountered_y_std = None
+        self._moments = {"x": RunningMoments(axis=None), "nac": RunningMoments(axis=(0, 3), keepdims=True)}
 
     def transform(self, x=None, y=None):
         x_res = x
@@ -36,6 +38,11 @@ class NACStandardScaler(ScalerBase):
             y_res = (y - self.nac_mean) / self.nac_std
         return x_res, y_res
 
+    def get_affine_transform(self):
+        x_scale = 1 / np.array(self.x_std)
+        return {"x": (x_scale, -np.array(self.x_mean) * x_scale),
+                "y": [(np.array(self.nac_std), np.array(self.nac_mean))]}
+
     def inverse_transform(self, x=None, y=None):
         x_res = x
         out_nac = y
@@ -46,17 +53,37 @@ class NACStandardScaler(ScalerBase):
         return x_res, out_nac
 
     def fit(self, x, y):
-        npeps = np.finfo(float).eps
-        if self.use_x_mean:
-            self.x_mean = np.mean(x)
-        if self.use_x_std:
-            self.x_std = np.std(x) + npeps
-        if self.use_nac_std:
-            self.nac_std = np.std(y, axis=(0, 3), keepdims=True) + npeps
-            self.nac_mean = np.zeros_like(self.nac_std)
+        for moments in self._moments.values():
+            moments.reset()
+        self._encountered_y_shape = None
+        self.partial_fit(x=x, y=y)
+
+    def partial_fit(self, x=None, y=None):
+        """Update the scaling with a chunk of data, e.g. a batch of a memory-mapped dataset or new data points.
 
-        self._encountered_y_std = np.std(y, axis=(0, 3), keepdims=True)
-        self._encountered_y_shape = np.array(y.shape)
+        Args:
+            x (np.ndarray): Coordinates of shape (batch, atoms, 3).
+            y (np.ndarray): NACs of shape (batch, states, atoms, 3).
+        """
+        if x is not None and (self.use_x_mean or self.use_x_std):
+            self._moments["x"].update(x)
+        if y is not None:
+            self._moments["nac"].update(y)
+            self._encountered_y_shape = accumulate_shape(self._encountered_y_shape, np.shape(y))
+        self._update_params()
+
+    def _update_params(self):
+        npeps = np.finfo(float).eps
+        x_moments, nac_moments = self._moments["x"], self._moments["nac"]
+        if self.use_x_mean and x_moments.count > 0:
+            self.x_mean = x_moments.get_mean()
+        if self.use_x_std and x_moments.count > 0:
+            self.x_std = x_moments.std + npeps
+        if nac_moments.count > 0:
+            if self.use_nac_std:
+                self.nac_std = nac_moments.std + npeps
+                self.nac_mean = np.zeros_like(self.nac_std)
+            self._encountered_y_std = nac_moments.std
 
     def fit_transform(self, x=None, y=None):
         self.fit(x=x, y=y)
@@ -67,7 +94,8 @@ class NACStandardScaler(ScalerBase):
             'x_mean': self.x_mean,
             'x_std': self.x_std,
             'nac_mean': self.nac_mean,
-            'nac_std': self.nac_std
+            'nac_std': self.nac_std,
+            'moments': self._get_moments_state()
         }
         np.save(file_path, out_dict)
 
@@ -77,6 +105,7 @@ class NACStandardScaler(ScalerBase):
         self.x_std = np.array(indict['x_std'])
         self.nac_mean = np.array(indict['nac_mean'])
         self.nac_std = np.array(indict['nac_std'])
+        self._set_moments_state(indict.get('moments'))
 
     def get_config(self):
         conf = {
@@ -0,0 +1,324 @@
+"""
+Persistent inference server for a :obj:`NeuralNetEnsemble`.
+
+The server loads the ensemble once, keeps the traced graphs in memory and answers requests of MD drivers over a
+unix socket. Requests of concurrent trajectories are batched automatically.
+
+.. code-block:: bash
+
+    python -m pyNNsMD.serve TestEnergyGradient/ --socket /tmp/nnsmd.sock
+
+.. code-block:: python
+
+    from pyNNsMD.serve import InferenceClient
+    with InferenceClient("/tmp/nnsmd.sock") as client:
+        mean, std = client.call(geos[:1])
+
+"""
+
+import os
+import json
+import socket
+import struct
+import socketserver
+import argparse
+import logging
+
+import numpy as np
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+_HEADER_SIZE = struct.Struct("!Q")
+
+
+def _recv_exact(sock, size: int):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        num = sock.recv_into(view[received:], size - received)
+        if num == 0:
+            raise ConnectionError("Socket closed while receiving message.")
+        received += num
+    return buffer
+
+
+def send_message(sock, header: dict, arrays: list = None):
+    """Send a message of a json header and raw numpy arrays over a socket.
+
+    Args:
+        sock (socket.socket): Connected socket.
+        header (dict): Json serializable header.
+        arrays (list): List of numpy arrays to send. Default is None.
+    """
+    arrays = [np.ascontiguousarray(x) for x in arrays] if arrays is not None else []
+    header = dict(header)
+    header["arrays"] = [{"dtype": x.dtype.str, "shape": list(x.shape)} for x in arrays]
+    header_bytes = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER_SIZE.pack(len(header_bytes)) + header_bytes)
+    for x in arrays:
+        sock.sendall(memoryview(x).cast("B"))
+
+
+def receive_message(sock):
+    """Receive a message that was sent by :obj:`send_message`.
+
+    Args:
+        sock (socket.socket): Connected socket.
+
+    Returns:
+        tuple: Header dictionary and list of numpy arrays.
+    """
+    header_size, = _HEADER_SIZE.unpack(_recv_exact(sock, _HEADER_SIZE.size))
+    header = json.loads(_recv_exact(sock, header_size).decode("utf-8"))
+    arrays = []
+    for info in header.pop("arrays", []):
+        dtype = np.dtype(info["dtype"])
+        size = int(np.prod(info["shape"], dtype="int64")) * dtype.itemsize
+        arrays.append(np.frombuffer(_recv_exact(sock, size), dtype=dtype).reshape(info["shape"]))
+    return header, arrays
+
+
+def make_ensemble_function(ensemble):
+    """Make a batch function that returns the flattened mean and std output of the ensemble.
+
+    Args:
+        ensemble (NeuralNetEnsemble): Loaded ensemble.
+
+    Returns:
+        callable: Function that maps coordinates to a list of `[mean_0, ..., std_0, ...]`.
+    """
+    def ensemble_function(x):
+        y_mean, y_std, _ = ensemble.call_fused(x)
+        y_mean = y_mean if isinstance(y_mean, list) else [y_mean]
+        y_std = y_std if isinstance(y_std, list) else [y_std]
+        return y_mean + y_std
+
+    return ensemble_function
+
+
+class _EnsembleRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                header, arrays = receive_message(self.request)
+            except ConnectionError:
+                break
+            op = header.get("op")
+            try:
+                if op == "call":
+                    # Invalid input is rejected here, so that it does not fail the batch of other clients.
+                    x = self.server.check_input(arrays)
+                    y = batcher.submit(x).result()
+                    send_message(self.request, {"status": "ok", "num_outputs": len(y) // 2}, y)
+                elif op == "ping":
+                    send_message(self.request, {"status": "ok", "dtype": self.server.dtype.str})
+                elif op == "close":
+                    send_message(self.request, {"status": "ok"})
+                    break
+                else:
+                    raise ValueError("Unknown request operation %s" % op)
+            except Exception as error:
+                send_message(self.request, {"status": "error", "message": str(error)})
+
+
+class EnsembleServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that answers coordinate requests with the ensemble prediction.
+
+    Each connection is handled in a separate thread and all requests are passed to a shared
+    :obj:`pyNNsMD.src.batching.DynamicBatcher`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, batcher, input_shape: tuple = None, dtype: str = "float32"):
+        """Initialize server and bind socket.
+
+        Args:
+            socket_path (str): Path of the unix socket. An existing file at this path is removed.
+            batcher (DynamicBatcher): Batcher that evaluates the requests.
+            input_shape (tuple): Shape of a single sample, e.g. `(atoms, 3)`. Default is None, which only checks
+                the rank of the coordinates.
+            dtype (str): Dtype of the coordinates of the ensemble, which is reported to clients. Default is "float32".
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.batcher = batcher
+        self.input_shape = tuple(input_shape) if input_shape is not None else None
+        self.dtype = np.dtype(dtype)
+        self.socket_path = socket_path
+        super(EnsembleServer, self).__init__(socket_path, _EnsembleRequestHandler)
+
+    def check_input(self, arrays: list):
+        """Check the coordinates of a request before they are batched with the requests of other clients.
+
+        Args:
+            arrays (list): Arrays of the request.
+
+        Returns:
+            np.ndarray: Coordinates of shape `(batch, atoms, 3)` in the dtype of the server.
+        """
+        if len(arrays) != 1:
+            raise ValueError("Expected a single array of coordinates but got %s arrays." % len(arrays))
+        x = arrays[0]
+        if x.dtype.kind not in ["f", "i", "u"]:
+            raise ValueError("Expected numeric coordinates but got dtype %s." % x.dtype)
+        if x.ndim != 3 or x.shape[0] == 0 or x.shape[-1] != 3:
+            raise ValueError("Expected coordinates of shape (batch, atoms, 3) but got %s." % list(x.shape))
+        if self.input_shape is not None and tuple(x.shape[1:]) != self.input_shape:
+            raise ValueError("Expected coordinates of shape (batch, %s, %s) but got %s." % (
+                self.input_shape[0], self.input_shape[1], list(x.shape)))
+        return x.astype(self.dtype, copy=False)
+
+    def server_close(self):
+        super(EnsembleServer, self).server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class InferenceClient:
+    """Client stub for :obj:`EnsembleServer`.
+
+    Keeps a single connection open, so that each call only costs one round trip over the socket. Coordinates are sent
+    in the dtype of the server, which is requested on connect, e.g. float64 for models with precision "float64".
+    """
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        """Connect to server.
+
+        Args:
+            socket_path (str): Path of the unix socket of the server.
+            timeout (float): Socket timeout in seconds. Default is None.
+        """
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        header, _ = self._request({"op": "ping"})
+        self.dtype = np.dtype(header["dtype"]) if "dtype" in header else None
+
+    def _request(self, header: dict, arrays: list = None):
+        send_message(self._sock, header, arrays)
+        header, arrays = receive_message(self._sock)
+        if header.get("status") != "ok":
+            raise RuntimeError("Server error: %s" % header.get("message"))
+        return header, arrays
+
+    def call(self, x):
+        """Predict mean and standard deviation of the ensemble for coordinates.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(batch, atoms, 3)`.
+
+        Returns:
+            tuple: List of mean and list of std output, e.g. `[energy, gradient]` or `[nac]`.
+        """
+        header, arrays = self._request({"op": "call"}, [np.asarray(x, dtype=self.dtype)])
+        num = header["num_outputs"]
+        return arrays[:num], arrays[num:]
+
+    def ping(self):
+        self._request({"op": "ping"})
+        return True
+
+    def close(self):
+        try:
+            send_message(self._sock, {"op": "close"})
+            receive_message(self._sock)
+        except (ConnectionError, OSError):
+            pass
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _count_models(directory: str):
+    return len([x for x in os.listdir(directory) if x.startswith("model_v")])
+
+
+def serve(directory: str, number_models: int = None, socket_path: str = None, max_batch_size: int = 256,
+          batch_timeout: float = 0.002, load_model: bool = False, shm_name: str = None, shm_slots: int = 0):
+    """Load ensemble from directory and serve requests until interrupted.
+
+    Args:
+        directory (str): Directory of the :obj:`NeuralNetEnsemble`.
+        number_models (int): Number of models. Default is None, which counts model folders in directory.
+        socket_path (str): Path to the unix socket. Default is `nnsmd.sock` in directory.
+        max_batch_size (int): Number of samples that triggers a batch evaluation. Default is 256.
+        batch_timeout (float): Maximum time a request waits for other requests in seconds. Default is 0.002.
+        load_model (bool): Whether to load saved keras models instead of recreating them. Default is False.
+        shm_name (str): Name of a shared memory buffer to serve in addition. Default is None.
+        shm_slots (int): Number of slots of the shared memory buffer. Default is 0, which disables the buffer.
+    """
+    from pyNNsMD.NNsMD import NeuralNetEnsemble
+    from pyNNsMD.src.batching import DynamicBatcher
+
+    directory = os.path.realpath(directory)
+    if number_models is None:
+        number_models = _count_models(directory)
+    if socket_path is None:
+        socket_path = os.path.join(directory, "nnsmd.sock")
+
+    # Trace graphs before accepting requests.
+    ensemble = NeuralNetEnsemble(directory, number_models)
+    ensemble.load(load_model=load_model, warmup=False)
+    timings = ensemble.warmup()
+
+    atoms = ensemble[0].get_config().get("atoms") if hasattr(ensemble[0], "get_config") else None
+    # Models revived with `load_model` have no input signature and are skipped by the warm-up.
+    if any([t is None for t in timings]) and atoms is not None:
+        module_logger.info("Warm-up fused call for %s atoms." % atoms)
+        ensemble.call_fused(np.zeros((1, int(atoms), 3)))
+
+    # Coordinates are passed in the compute dtype of the models, e.g. float64 for energy conservation in MD.
+    dtype = ensemble._get_fused_dtype().as_numpy_dtype
+    shm_server = None
+    if shm_slots > 0:
+        if atoms is None:
+            raise ValueError("Shared memory buffer requires models with `atoms` in config.")
+        from pyNNsMD.src.shared import SharedMemoryServer
+        shm_server = SharedMemoryServer(ensemble, slots=shm_slots, atoms=int(atoms), name=shm_name).start()
+
+    batcher = DynamicBatcher(make_ensemble_function(ensemble), max_batch_size=max_batch_size,
+                             batch_timeout=batch_timeout).start()
+    input_shape = (int(atoms), 3) if atoms is not None else None
+    server = EnsembleServer(socket_path, batcher, input_shape=input_shape, dtype=dtype)
+    module_logger.info("Serving %s models from %s at %s" % (number_models, directory, socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        module_logger.info("Shutting down server.")
+    finally:
+        server.server_close()
+        batcher.stop()
+        if shm_server is not None:
+            shm_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve predictions of a NeuralNetEnsemble over a unix socket.')
+    parser.add_argument("directory", help="Directory of the ensemble")
+    parser.add_argument("-n", "--number_models", default=None, type=int, help="Number of models in ensemble")
+    parser.add_argument("-s", "--socket", default=None, help="Path of the unix socket")
+    parser.add_argument("-b", "--max_batch_size", default=256, type=int, help="Samples that trigger a batch")
+    parser.add_argument("-t", "--batch_timeout", default=0.002, type=float, help="Batch window in seconds")
+    parser.add_argument("-g", "--gpus", default=-1, type=int, help="Index of gpu to use")
+    parser.add_argument("--load_model", action="store_true", help="Load saved keras models instead of recreating")
+    parser.add_argument("--shm_name", default=None, help="Name of shared memory buffer for MD workers")
+    parser.add_argument("--shm_slots", default=0, type=int, help="Number of slots of shared memory buffer")
+    args = vars(parser.parse_args())
+
+    from pyNNsMD.src.device import set_gpu
+    set_gpu([args["gpus"]])
+
+    serve(args["directory"], number_models=args["number_models"], socket_path=args["socket"],
+          max_batch_size=args["max_batch_size"], batch_timeout=args["batch_timeout"],
+          load_model=args["load_model"], shm_name=args["shm_name"], shm_slots=args["shm_slots"])
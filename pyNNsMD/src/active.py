@@ -0,0 +1,445 @@
+"""
+Active learning with the uncertainty of a :obj:`NeuralNetEnsemble`.
+
+Candidate geometries are scored in batches by the standard deviation of the ensemble prediction. Only the candidates
+with the highest score above a threshold are kept, so that memory is bounded for millions of candidates. From these,
+a diverse subset is selected by farthest-point sampling in feature space, labeled by an oracle, e.g. quantum
+chemistry, appended to the dataset of the ensemble and the models are refitted.
+
+.. code-block:: python
+
+    active = ActiveLearning(nn, oracle=MorsePotential(states=2), training_scripts=["training_mlp_eg"]*2,
+                            threshold=0.05, num_select=50)
+    info = active.run(candidates, iterations=5)
+
+The oracle takes geometries of shape `(N, atoms, 3)` and returns a dictionary of arrays for
+:obj:`NeuralNetEnsemble.data`, e.g. `energies` and `forces`. :obj:`MorsePotential` is an analytic potential that can
+replace quantum chemistry for testing.
+"""
+
+import time
+import logging
+
+import numpy as np
+import tensorflow as tf
+
+from pyNNsMD.utils.xyz import iter_xyz_blocks
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+
+def iter_candidate_batches(candidates, batch_size: int = 4096):
+    """Iterate over candidate geometries in batches.
+
+    Args:
+        candidates: Array of shape `(N, atoms, 3)`, which can be memory-mapped, path to a xyz-file or iterable of
+            arrays of geometries, e.g. a generator of MD snapshots.
+        batch_size (int): Number of geometries per batch for arrays and xyz-files. Default is 4096.
+
+    Yields:
+        tuple: Index of the first geometry of the batch and geometries of shape `(batch, atoms, 3)`.
+    """
+    if isinstance(candidates, str):
+        start = 0
+        for _, coordinates, _ in iter_xyz_blocks(candidates, block_size=batch_size):
+            yield start, coordinates
+            start += len(coordinates)
+    elif isinstance(candidates, np.ndarray):
+        for start in range(0, len(candidates), batch_size):
+            yield start, np.asarray(candidates[start:start + batch_size])
+    else:
+        start = 0
+        for x in candidates:
+            x = np.asarray(x)
+            yield start, x
+            start += len(x)
+
+
+def reduce_uncertainty(std, reduction: str = "max", output_weights: list = None):
+    """Reduce the standard deviation of the ensemble output to a score per sample.
+
+    Each output is reduced over all axes but the first and the score is the maximum of the weighted outputs.
+
+    Args:
+        std (np.ndarray, list): Standard deviation of the output or list of outputs, e.g. energy and gradient.
+        reduction (str): Reduction over the axes of each sample "max" or "mean". Default is "max".
+        output_weights (list): Weight for each output, e.g. `[1.0, 0.0]` to use the energy only. Default is None.
+
+    Returns:
+        np.ndarray: Score of shape `(batch, )`.
+    """
+    if reduction not in ["max", "mean"]:
+        raise ValueError("Unknown reduction %s, use 'max' or 'mean'." % reduction)
+    std = list(std) if isinstance(std, (list, tuple)) else [std]
+    output_weights = [1.0] * len(std) if output_weights is None else output_weights
+    if len(output_weights) != len(std):
+        raise ValueError("Expected %s output weights, but got %s." % (len(std), len(output_weights)))
+    scores = []
+    for y, weight in zip(std, output_weights):
+        y = np.reshape(np.asarray(y), (len(y), -1))
+        scores.append(weight * (np.max(y, axis=-1) if reduction == "max" else np.mean(y, axis=-1)))
+    return np.max(np.stack(scores, axis=0), axis=0)
+
+
+def inverse_distance_features(x):
+    """Inverse distances of all pairs of atoms.
+
+    Args:
+        x (np.ndarray): Coordinates of shape `(batch, atoms, 3)`.
+
+    Returns:
+        np.ndarray: Features of shape `(batch, atoms*(atoms-1)/2)`.
+    """
+    x = np.asarray(x)
+    i, j = np.triu_indices(x.shape[1], k=1)
+    return 1 / np.linalg.norm(x[:, i] - x[:, j], axis=-1)
+
+
+def get_feature_function(nn):
+    """Features of geometries for the diversity of the selection.
+
+    Args:
+        nn (NeuralNetEnsemble): Ensemble. The feature layer of the first model is used, if it has one.
+
+    Returns:
+        callable: Function of coordinates that returns features of shape `(batch, features)`.
+    """
+    model = nn[0] if len(nn) > 0 else None
+    if model is None or not hasattr(model, "feat_layer"):
+        return inverse_distance_features
+
+    def feature_function(x):
+        return model.feat_layer(tf.convert_to_tensor(x, dtype=model.compute_dtype)).numpy()
+
+    return feature_function
+
+
+def farthest_point_sampling(features, num_select: int, start: int = 0, reference=None, min_distance: float = None):
+    """Greedy selection of points that are farthest from the points selected before.
+
+    Args:
+        features (np.ndarray): Features of candidates of shape `(N, features)`.
+        num_select (int): Maximum number of points to select.
+        start (int): Index of the first point, if there is no reference. Default is 0.
+        reference (np.ndarray): Features of points that are already selected, e.g. training data. Default is None.
+        min_distance (float): Stop if the distance of the next point is smaller. Default is None.
+
+    Returns:
+        np.ndarray: Indices of selected points in order of selection.
+    """
+    features = np.reshape(np.asarray(features, dtype="float64"), (len(features), -1))
+    if len(features) == 0 or num_select <= 0:
+        return np.zeros(0, dtype="int64")
+    distance = np.full(len(features), np.inf)
+    if reference is not None and len(reference) > 0:
+        reference = np.reshape(np.asarray(reference, dtype="float64"), (len(reference), -1))
+        for r in reference:
+            distance = np.minimum(distance, np.linalg.norm(features - r, axis=-1))
+        start = int(np.argmax(distance))
+    selected = []
+    current = int(start)
+    for _ in range(min(num_select, len(features))):
+        if min_distance is not None and distance[current] < min_distance:
+            break
+        selected.append(current)
+        distance = np.minimum(distance, np.linalg.norm(features - features[current], axis=-1))
+        distance[current] = -np.inf
+        current = int(np.argmax(distance))
+    return np.array(selected, dtype="int64")
+
+
+class CandidatePool:
+    """Candidates with the highest score above a threshold with bounded size."""
+
+    def __init__(self, max_size: int, threshold: float = 0.0):
+        """Initialize empty pool.
+
+        Args:
+            max_size (int): Maximum number of candidates to keep.
+            threshold (float): Minimum score of candidates. Default is 0.0.
+        """
+        self.max_size = int(max_size)
+        self.threshold = threshold
+        self.geometries = None
+        self.scores = np.zeros(0)
+        self.indices = np.zeros(0, dtype="int64")
+        self.num_scored = 0
+        self.num_above = 0
+        self.max_score = -np.inf
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, geometries, scores, indices):
+        """Add a batch of candidates and keep the highest scores.
+
+        Args:
+            geometries (np.ndarray): Geometries of the batch.
+            scores (np.ndarray): Score of each geometry.
+            indices (np.ndarray): Index of each geometry in the candidates.
+        """
+        self.num_scored += len(scores)
+        if len(scores) > 0:
+            self.max_score = max(self.max_score, float(np.max(scores)))
+        is_above = scores > self.threshold
+        self.num_above += int(np.sum(is_above))
+        if not np.any(is_above):
+            return
+        geometries, scores, indices = np.asarray(geometries)[is_above], scores[is_above], indices[is_above]
+        if self.geometries is not None:
+            geometries = np.concatenate([self.geometries, geometries], axis=0)
+            scores = np.concatenate([self.scores, scores], axis=0)
+            indices = np.concatenate([self.indices, indices], axis=0)
+        if len(scores) > self.max_size:
+            keep = np.argpartition(-scores, self.max_size - 1)[:self.max_size]
+            geometries, scores, indices = geometries[keep], scores[keep], indices[keep]
+        self.geometries, self.scores, self.indices = geometries, scores, indices
+
+
+class MorsePotential:
+    """Sum of Morse potentials of all pairs of atoms with energies and gradients for multiple states.
+
+    State `s` has the well depth `depth*(1+s/2)` and an energy offset `s*state_shift`. The analytic potential stands
+    in for quantum chemistry to test active learning.
+    """
+
+    def __init__(self, states: int = 1, depth: float = 1.0, width: float = 1.0, distance: float = 1.5,
+                 state_shift: float = 1.0):
+        """Initialize potential.
+
+        Args:
+            states (int): Number of states. Default is 1.
+            depth (float): Well depth of the ground state. Default is 1.0.
+            width (float): Width parameter of the exponential. Default is 1.0.
+            distance (float): Equilibrium distance. Default is 1.5.
+            state_shift (float): Energy offset between states. Default is 1.0.
+        """
+        self.states = states
+        self.depth = depth
+        self.width = width
+        self.distance = distance
+        self.state_shift = state_shift
+
+    def energy_and_gradient(self, x):
+        """Energies of shape `(N, states)` and gradients of shape `(N, states, atoms, 3)` for coordinates `x`."""
+        x = np.asarray(x, dtype="float64")
+        diff = x[:, :, None, :] - x[:, None, :, :]
+        mask = ~np.eye(x.shape[1], dtype="bool")
+        r = np.linalg.norm(diff, axis=-1)
+        r_safe = np.where(mask, r, 1.0)
+        exp_r = np.exp(-self.width * (r_safe - self.distance))
+        # Each pair is counted twice in the full matrix of pairs.
+        e_pair = np.sum(np.where(mask, (1 - exp_r) ** 2, 0.0), axis=(1, 2)) / 2
+        de_pair = np.where(mask, 2 * self.width * exp_r * (1 - exp_r) / r_safe, 0.0)
+        g_pair = np.sum(de_pair[..., None] * diff, axis=2)
+        depth = self.depth * (1 + np.arange(self.states) / 2)
+        energies = depth[None, :] * e_pair[:, None] + np.arange(self.states)[None, :] * self.state_shift
+        gradients = depth[None, :, None, None] * g_pair[:, None, :, :]
+        return energies, gradients
+
+    def __call__(self, geometries):
+        energies, gradients = self.energy_and_gradient(geometries)
+        return {"energies": energies, "forces": gradients}
+
+
+class ActiveLearning:
+    """Active learning loop of scoring, selection, labeling and refit for a :obj:`NeuralNetEnsemble`.
+
+    The ensemble must have a dataset, train and test indices and training configs for `fit_mode`. The default
+    "training" refits the models from new weights, since the scaler of each model is refitted on the extended dataset.
+    """
+
+    def __init__(self, nn, oracle, training_scripts: list, threshold: float, num_select: int = 100,
+                 batch_size: int = 4096, max_candidates: int = 10000, reduction: str = "max",
+                 output_weights: list = None, feature_function=None, min_distance: float = None,
+                 test_size: float = 0.2, atoms: list = None, fit_mode: str = "training", fit_kwargs: dict = None,
+                 predict_kwargs: dict = None, random_state: int = None, logger=None):
+        """Initialize active learning.
+
+        Args:
+            nn (NeuralNetEnsemble): Ensemble with at least two models.
+            oracle (callable): Function of geometries that returns a dictionary of labels for
+                :obj:`NeuralNetEnsemble.data`, e.g. :obj:`MorsePotential`.
+            training_scripts (list): Training scripts for each model for :obj:`NeuralNetEnsemble.fit`.
+            threshold (float): Minimum uncertainty score of selected candidates.
+            num_select (int): Maximum number of candidates to label per iteration. Default is 100.
+            batch_size (int): Number of candidates to score at once. Default is 4096.
+            max_candidates (int): Number of candidates with the highest score to keep for selection. Default is 10000.
+            reduction (str): Reduction of the uncertainty of each sample "max" or "mean". Default is "max".
+            output_weights (list): Weight of each output for the score. Default is None.
+            feature_function (callable): Features of geometries for farthest-point sampling. Default is None, which
+                uses :obj:`get_feature_function`.
+            min_distance (float): Minimum feature distance of selected candidates. Default is None.
+            test_size (float): Fraction of new samples for the test split of each model. Default is 0.2.
+            atoms (list): Atomic symbols of the molecule, if the dataset has atoms. Default is None.
+            fit_mode (str): Fit mode for refit. Default is "training".
+            fit_kwargs (dict): Further arguments for :obj:`NeuralNetEnsemble.fit`. Default is None.
+            predict_kwargs (dict): Further arguments for :obj:`NeuralNetEnsemble.predict`, e.g.
+                `{"reduction": "max_norm"}` to score gradients by the norm per atom. Default is None.
+            random_state (int): Seed for the split of new samples. Default is None.
+            logger: Logger for this class.
+        """
+        if len(nn) < 2:
+            raise ValueError("Active learning requires an ensemble of at least two models, but got %s." % len(nn))
+        self.nn = nn
+        self.oracle = oracle
+        self.training_scripts = training_scripts
+        self.threshold = threshold
+        self.num_select = num_select
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+        self.reduction = reduction
+        self.output_weights = output_weights
+        self.feature_function = feature_function
+        self.min_distance = min_distance
+        self.test_size = test_size
+        self.atoms = atoms
+        self.fit_mode = fit_mode
+        self.fit_kwargs = fit_kwargs if fit_kwargs is not None else {}
+        self.predict_kwargs = {"verbose": 0}
+        self.predict_kwargs.update(predict_kwargs if predict_kwargs is not None else {})
+        self._rng = np.random.default_rng(random_state)
+        self.logger = module_logger if logger is None else logger
+        self.history = []
+
+    def score_batch(self, x):
+        """Uncertainty score of a batch of geometries.
+
+        Args:
+            x (np.ndarray): Geometries of shape `(batch, atoms, 3)`.
+
+        Returns:
+            np.ndarray: Score of shape `(batch, )`.
+        """
+        _, out_std = self.nn.predict(x, return_uncertainty=True, **self.predict_kwargs)
+        return reduce_uncertainty(out_std, reduction=self.reduction, output_weights=self.output_weights)
+
+    def score(self, candidates):
+        """Score candidates in batches and keep those with the highest score above the threshold.
+
+        Args:
+            candidates: Candidate geometries, see :obj:`iter_candidate_batches`.
+
+        Returns:
+            CandidatePool: Pool of at most `max_candidates` geometries above the threshold.
+        """
+        pool = CandidatePool(self.max_candidates, threshold=self.threshold)
+        for start, x in iter_candidate_batches(candidates, batch_size=self.batch_size):
+            pool.add(x, self.score_batch(x), np.arange(start, start + len(x)))
+        return pool
+
+    def select(self, pool: CandidatePool):
+        """Select diverse candidates of the pool by farthest-point sampling from the highest score.
+
+        Args:
+            pool (CandidatePool): Scored candidates.
+
+        Returns:
+            np.ndarray: Positions of selected candidates in the pool.
+        """
+        if len(pool) == 0:
+            return np.zeros(0, dtype="int64")
+        feature_function = self.feature_function if self.feature_function is not None else get_feature_function(
+            self.nn)
+        features = np.concatenate([feature_function(pool.geometries[i:i + self.batch_size])
+                                   for i in range(0, len(pool), self.batch_size)], axis=0)
+        return farthest_point_sampling(features, self.num_select, start=int(np.argmax(pool.scores)),
+                                       min_distance=self.min_distance)
+
+    def label(self, geometries):
+        """Label geometries with the oracle.
+
+        Args:
+            geometries (np.ndarray): Geometries of shape `(N, atoms, 3)`.
+
+        Returns:
+            dict: Data for :obj:`NeuralNetEnsemble.data` including the geometries.
+        """
+        labels = dict(self.oracle(geometries))
+        labels["geometries"] = geometries
+        if self.atoms is not None:
+            labels["atoms"] = np.array([self.atoms] * len(geometries))
+        return labels
+
+    def update(self, labels: dict):
+        """Append labeled samples to the dataset of the ensemble and add them to the train and test indices.
+
+        Args:
+            labels (dict): Data for :obj:`NeuralNetEnsemble.data`.
+
+        Returns:
+            np.ndarray: Indices of the new samples in the dataset.
+        """
+        num_new = len(labels["geometries"])
+        manifest = self.nn.data(append=True, **labels)
+        indices = np.arange(manifest["length"] - num_new, manifest["length"])
+        self.nn.add_train_test_indices(indices, test_size=self.test_size,
+                                       random_state=int(self._rng.integers(2 ** 31)))
+        return indices
+
+    def refit(self):
+        """Fit the models of the ensemble on the extended dataset.
+
+        Returns:
+            list: Fit error of each model.
+        """
+        return self.nn.fit(self.training_scripts, fit_mode=self.fit_mode, **self.fit_kwargs)
+
+    def step(self, candidates):
+        """Run one iteration of scoring, selection, labeling, appending and refit.
+
+        Args:
+            candidates: Candidate geometries, see :obj:`iter_candidate_batches`.
+
+        Returns:
+            dict: Information of the iteration. No refit is done if no candidate is above the threshold.
+        """
+        info = {}
+        start = time.perf_counter()
+        pool = self.score(candidates)
+        info.update({"num_scored": pool.num_scored, "num_above_threshold": pool.num_above,
+                     "max_score": pool.max_score, "time_score": time.perf_counter() - start})
+        self.logger.info("Scored %s candidates, %s above threshold %s, max score %s." % (
+            pool.num_scored, pool.num_above, self.threshold, pool.max_score))
+        selected = self.select(pool)
+        info.update({"selected": pool.indices[selected], "scores": pool.scores[selected], "fit_error": None})
+        if len(selected) == 0:
+            return info
+        start = time.perf_counter()
+        labels = self.label(pool.geometries[selected])
+        info["time_label"] = time.perf_counter() - start
+        info["dataset_indices"] = self.update(labels)
+        self.logger.info("Added %s samples to dataset, refit ensemble." % len(selected))
+        start = time.perf_counter()
+        info["fit_error"] = self.refit()
+        info["time_fit"] = time.perf_counter() - start
+        return info
+
+    def run(self, candidates, iterations: int = 1):
+        """Run iterations of active learning until no candidate is above the threshold.
+
+        Args:
+            candidates: Candidate geometries, see :obj:`iter_candidate_batches`, or a function of the iteration that
+                returns candidates, e.g. to sample new MD trajectories with the refitted ensemble. Candidates are
+                scored in every iteration, so that a generator or iterator is only allowed for a single iteration.
+            iterations (int): Maximum number of iterations. Default is 1.
+
+        Returns:
+            list: Information of each iteration.
+        """
+        if iterations > 1 and not callable(candidates) and not isinstance(candidates, (str, np.ndarray)):
+            if iter(candidates) is candidates:
+                raise ValueError("Candidates can only be iterated once, use a list, an array or a function of the "
+                                 "iteration that returns new candidates for %s iterations." % iterations)
+        history = []
+        for i in range(iterations):
+            info = self.step(candidates(i) if callable(candidates) else candidates)
+            info["iteration"] = i
+            history.append(info)
+            self.history.append(info)
+            if len(info["selected"]) == 0:
+                self.logger.info("No candidates above threshold, stop active learning.")
+                break
+        return history
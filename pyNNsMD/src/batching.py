@@ -0,0 +1,367 @@
+"""
+Collect requests from concurrent callers and evaluate them as one batch.
+"""
+
+import threading
+import queue
+import time
+import asyncio
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+
+from pyNNsMD.src.selection import predict_uncertainty
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+
+def _squeeze_first(y):
+    """Remove the first axis of length one of a (nested) output."""
+    if isinstance(y, dict):
+        return {key: _squeeze_first(value) for key, value in y.items()}
+    if isinstance(y, (list, tuple)):
+        return [_squeeze_first(value) for value in y]
+    return y[0]
+
+
+def _split_batch_output(y, splits):
+    """Split a (nested) batch output along the first axis at the given positions."""
+    if isinstance(y, dict):
+        parts = {key: _split_batch_output(value, splits) for key, value in y.items()}
+        return [{key: value[i] for key, value in parts.items()} for i in range(len(splits) + 1)]
+    if isinstance(y, (list, tuple)):
+        parts = [_split_batch_output(value, splits) for value in y]
+        return [[value[i] for value in parts] for i in range(len(splits) + 1)]
+    return np.split(y, splits, axis=0)
+
+
+class BatchStatistics:
+    """Record occupancy and latency of flushed batches.
+
+    For each batch the number of samples and requests, the occupancy relative to the maximum batch size, the waiting
+    time of the oldest request before flush and the time of the batch function are stored.
+    """
+
+    def __init__(self, max_batch_size: int, max_records: int = 100000):
+        """Initialize empty statistics.
+
+        Args:
+            max_batch_size (int): Maximum batch size to compute the occupancy.
+            max_records (int): Maximum number of batches to keep. Older records are dropped. Default is 100000.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remove all records."""
+        with self._lock:
+            self.batch_size = []
+            self.num_requests = []
+            self.wait_time = []
+            self.compute_time = []
+            self.request_latency = []
+
+    def record(self, batch_size: int, num_requests: int, wait_time: float, compute_time: float,
+               request_latency: list):
+        """Add the record of a single batch."""
+        with self._lock:
+            self.batch_size.append(batch_size)
+            self.num_requests.append(num_requests)
+            self.wait_time.append(wait_time)
+            self.compute_time.append(compute_time)
+            self.request_latency.extend(request_latency)
+            if len(self.batch_size) > self.max_records:
+                num_drop = len(self.batch_size) - self.max_records
+                for x in [self.batch_size, self.num_requests, self.wait_time, self.compute_time]:
+                    del x[:num_drop]
+                del self.request_latency[:max(len(self.request_latency) - self.max_records, 0)]
+
+    def summary(self):
+        """Summary of the recorded batches.
+
+        Returns:
+            dict: Number of batches and requests, mean occupancy and percentiles of latency in seconds.
+        """
+        with self._lock:
+            if len(self.batch_size) == 0:
+                return {"batches": 0, "requests": 0}
+            batch_size = np.array(self.batch_size)
+            latency = np.array(self.request_latency)
+            return {
+                "batches": len(batch_size),
+                "requests": int(np.sum(self.num_requests)),
+                "samples": int(np.sum(batch_size)),
+                "mean_batch_size": float(np.mean(batch_size)),
+                "mean_occupancy": float(np.mean(batch_size / self.max_batch_size)),
+                "mean_requests_per_batch": float(np.mean(self.num_requests)),
+                "mean_wait_time": float(np.mean(self.wait_time)),
+                "mean_compute_time": float(np.mean(self.compute_time)),
+                "latency_p50": float(np.percentile(latency, 50)),
+                "latency_p90": float(np.percentile(latency, 90)),
+                "latency_p99": float(np.percentile(latency, 99)),
+            }
+
+
+class DynamicBatcher:
+    """Batch inputs of concurrent callers into a single call of a batch function.
+
+    Requests are collected in a queue by :obj:`submit()`. A worker thread flushes the pending requests as one batch,
+    if either the number of samples reaches `max_batch_size` or the oldest pending request waited `batch_timeout`
+    seconds. The output of the batch function is split and returned to each caller via a future.
+
+    .. code-block:: python
+
+        batcher = DynamicBatcher(lambda x: 2*x, max_batch_size=64, batch_timeout=0.001).start()
+        y = batcher.submit(np.ones((1, 12, 3))).result()
+        batcher.stop()
+
+    """
+
+    def __init__(self, batch_function, max_batch_size: int = 256, batch_timeout: float = 0.002, logger=None):
+        """Initialize batcher.
+
+        Args:
+            batch_function (callable): Function that takes a numpy array of shape `(batch, ...)` and returns a numpy
+                array or nested list or dict of numpy arrays with the same first dimension.
+            max_batch_size (int): Number of samples to trigger a flush. Default is 256.
+            batch_timeout (float): Maximum waiting time in seconds of a request before flush. Default is 0.002.
+            logger: Logger for this class.
+        """
+        self.logger = module_logger if logger is None else logger
+        self.batch_function = batch_function
+        self.max_batch_size = int(max_batch_size)
+        self.batch_timeout = float(batch_timeout)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        self.statistics = BatchStatistics(self.max_batch_size)
+
+    def start(self):
+        """Start the worker thread.
+
+        Returns:
+            self
+        """
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="DynamicBatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the worker thread after flushing all pending requests."""
+        if self._thread is None:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, x):
+        """Submit an input for the next batch.
+
+        Args:
+            x (np.ndarray): Input of shape `(n, ...)`, where `n` can be one or more samples.
+
+        Returns:
+            Future: Future that holds the output for `x`.
+        """
+        future = Future()
+        if not self._running:
+            future.set_exception(RuntimeError("Batcher is not running, call `start()` first."))
+            return future
+        self._queue.put((np.asarray(x), future, time.perf_counter()))
+        return future
+
+    async def submit_async(self, x):
+        """Submit an input for the next batch from an asyncio task.
+
+        Args:
+            x (np.ndarray): Input of shape `(n, ...)`.
+
+        Returns:
+            Output for `x`.
+        """
+        return await asyncio.wrap_future(self.submit(x))
+
+    def __call__(self, x):
+        return self.submit(x).result()
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is None:
+            return []
+        pending = [item]
+        num_samples = len(item[0])
+        deadline = item[2] + self.batch_timeout
+        while num_samples < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=max(timeout, 0.0)) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put back stop signal to exit after this batch.
+                self._queue.put(None)
+                break
+            pending.append(item)
+            num_samples += len(item[0])
+        return pending
+
+    def _flush(self, pending):
+        # Requests that were cancelled while waiting are dropped. Afterwards the futures can not be cancelled anymore.
+        pending = [item for item in pending if item[1].set_running_or_notify_cancel()]
+        if len(pending) == 0:
+            return
+        lengths = [len(x) for x, _, _ in pending]
+        splits = np.cumsum(lengths)[:-1]
+        time_start = time.perf_counter()
+        try:
+            x_batch = np.concatenate([x for x, _, _ in pending], axis=0) if len(pending) > 1 else pending[0][0]
+            y_batch = self.batch_function(x_batch)
+            y_split = _split_batch_output(y_batch, splits)
+        except Exception as error:
+            self.logger.error("Batch function failed with %s" % error)
+            for _, future, _ in pending:
+                future.set_exception(error)
+            return
+        time_end = time.perf_counter()
+        for (_, future, _), y in zip(pending, y_split):
+            future.set_result(y)
+        self.statistics.record(batch_size=int(np.sum(lengths)), num_requests=len(pending),
+                               wait_time=time_start - pending[0][2], compute_time=time_end - time_start,
+                               request_latency=[time_end - t for _, _, t in pending])
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if len(pending) > 0:
+                # A failure of a single batch must not end the worker thread.
+                try:
+                    self._flush(pending)
+                except Exception as error:
+                    self.logger.error("Flush of batch failed with %s" % error)
+                    for _, future, _ in pending:
+                        if not future.done():
+                            future.set_exception(error)
+            if not self._running and self._queue.empty():
+                break
+
+
+class TrajectoryScheduler:
+    """Scheduler to propagate many independent trajectories with a :obj:`NeuralNetEnsemble`.
+
+    Each trajectory, running in its own thread or asyncio task, requests the prediction for its current geometry
+    with :obj:`step()` or :obj:`step_async()`. Pending geometries are evaluated in a single batch by the ensemble and
+    the output is scattered back to the trajectories. Occupancy and latency of the batches are available from
+    :obj:`statistics()` to tune `max_batch_size` and `batch_timeout`.
+
+    .. code-block:: python
+
+        scheduler = TrajectoryScheduler(nn, max_batch_size=128, batch_timeout=0.001)
+        with scheduler:
+            # In each trajectory thread:
+            (energy, gradient), (energy_std, gradient_std) = scheduler.step(x)
+        print(scheduler.statistics())
+
+    """
+
+    def __init__(self, ensemble, max_batch_size: int = 256, batch_timeout: float = 0.002, fused: bool = True,
+                 logger=None):
+        """Initialize scheduler.
+
+        Args:
+            ensemble (NeuralNetEnsemble): Loaded ensemble.
+            max_batch_size (int): Number of geometries that trigger a batch. Default is 256.
+            batch_timeout (float): Maximum waiting time of a geometry in seconds. Default is 0.002.
+            fused (bool): Whether to use :obj:`call_fused()` of the ensemble, otherwise :obj:`call()` is used and
+                mean and std are computed from the output list. Default is True.
+            logger: Logger for this class.
+        """
+        self.logger = module_logger if logger is None else logger
+        self.ensemble = ensemble
+        self.fused = fused
+        self._batcher = DynamicBatcher(self._call_ensemble, max_batch_size=max_batch_size,
+                                       batch_timeout=batch_timeout, logger=self.logger)
+
+    def _call_ensemble(self, x):
+        if self.fused:
+            y_mean, y_std, _ = self.ensemble.call_fused(x)
+            return [y_mean, y_std]
+        y_list = self.ensemble.call(x)
+        y_mean, y_std = predict_uncertainty(None, y_list, len(y_list))
+        return [y_mean, y_std]
+
+    def start(self):
+        """Start batching.
+
+        Returns:
+            self
+        """
+        self._batcher.start()
+        return self
+
+    def stop(self):
+        """Stop batching after all pending geometries are evaluated."""
+        self._batcher.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def step(self, x):
+        """Get the ensemble prediction for the geometry of one trajectory. Blocks until the batch is evaluated.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(atoms, 3)` or `(n, atoms, 3)`.
+
+        Returns:
+            tuple: Mean and std output of the ensemble.
+        """
+        x = np.asarray(x)
+        single = x.ndim == 2
+        y_mean, y_std = self._batcher.submit(x[None] if single else x).result()
+        if single:
+            y_mean, y_std = _squeeze_first(y_mean), _squeeze_first(y_std)
+        return y_mean, y_std
+
+    async def step_async(self, x):
+        """Get the ensemble prediction for the geometry of one trajectory from an asyncio task.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(atoms, 3)` or `(n, atoms, 3)`.
+
+        Returns:
+            tuple: Mean and std output of the ensemble.
+        """
+        x = np.asarray(x)
+        single = x.ndim == 2
+        y_mean, y_std = await self._batcher.submit_async(x[None] if single else x)
+        if single:
+            y_mean, y_std = _squeeze_first(y_mean), _squeeze_first(y_std)
+        return y_mean, y_std
+
+    def statistics(self):
+        """Occupancy and latency summary of all evaluated batches.
+
+        Returns:
+            dict: Summary from :obj:`BatchStatistics.summary()`.
+        """
+        return self._batcher.statistics.summary()
+
+    def reset_statistics(self):
+        """Remove all batch records, e.g. after warm-up."""
+        self._batcher.statistics.reset()
+
+    def log_statistics(self):
+        """Write the statistics summary to the logger."""
+        summary = self.statistics()
+        self.logger.info("Batch statistics: %s" % ", ".join(["%s=%.4g" % (k, v) for k, v in summary.items()]))
@@ -2,6 +2,7 @@
 Sets the devices for training scripts.
 """
 
+import os
 import tensorflow as tf
 
 
@@ -52,3 +53,75 @@ def set_gpu(gpu_ids_list):
         except RuntimeError as e:
             # Visible devices must be set before GPUs have been initialized
             print(e)
+
+
+def get_available_cpus():
+    """Return the list of cpu indices that the current process may run on.
+
+    Returns:
+        list: Sorted cpu indices.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def get_cpu_partition(num_models: int, cpus: list = None, cores_per_model: int = None):
+    """Split cpus into disjoint core sets for parallel training processes.
+
+    If there are more models than core sets, the models must be queued on the returned core sets.
+
+    Args:
+        num_models (int): Number of models to train in parallel.
+        cpus (list): List of cpu indices to distribute. Default is None, which uses all available cpus.
+        cores_per_model (int): Number of cores for each model. Default is None, which divides the cpus equally
+            with at least one core per model.
+
+    Returns:
+        list: List of core sets, e.g. `[[0, 1], [2, 3]]`. Length is at most `num_models`.
+    """
+    cpus = get_available_cpus() if cpus is None else list(cpus)
+    if len(cpus) == 0 or num_models <= 0:
+        raise ValueError("Can not partition %s cpus for %s models." % (len(cpus), num_models))
+    if cores_per_model is None:
+        cores_per_model = max(len(cpus) // num_models, 1)
+    cores_per_model = min(int(cores_per_model), len(cpus))
+    num_slots = min(len(cpus) // cores_per_model, num_models)
+    return [cpus[i * cores_per_model:(i + 1) * cores_per_model] for i in range(num_slots)]
+
+
+def set_cpu(cpu_list: list = None, intra_op_threads: int = None, inter_op_threads: int = None):
+    """Pin the current process to cpus and set matching thread counts of TensorFlow and numerical libraries.
+
+    Must be called before TensorFlow executes any operation.
+
+    Args:
+        cpu_list (list): List of cpu indices. Default is None, which does not change the affinity.
+        intra_op_threads (int): Threads for a single operation. Default is None, which is the number of cpus.
+        inter_op_threads (int): Threads for independent operations. Default is None, which is `min(2, intra)`.
+
+    Returns:
+        None.
+    """
+    if cpu_list is not None and len(cpu_list) > 0 and hasattr(os, "sched_setaffinity"):
+        available = set(cpu_list) & os.sched_getaffinity(0)
+        if len(available) > 0:
+            os.sched_setaffinity(0, available)
+            print("Info: Setting cpu affinity:", sorted(available))
+        else:
+            print("Warning: CPUs %s not available, keep affinity" % cpu_list)
+    if intra_op_threads is None and cpu_list is not None and len(cpu_list) > 0:
+        intra_op_threads = len(cpu_list)
+    if intra_op_threads is None:
+        return
+    if inter_op_threads is None:
+        inter_op_threads = min(2, intra_op_threads)
+    for key in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+        os.environ[key] = str(intra_op_threads)
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        print("Info: Setting threads intra-op:", intra_op_threads, "inter-op:", inter_op_threads)
+    except RuntimeError as e:
+        # Threads must be set before TensorFlow is initialized.
+        print(e)
@@ -16,6 +16,26 @@ def get_path_for_fit_script(fit_script):
     return os.path.join(filepath, fit_script)
 
 
+def get_training_script_file(fit_script):
+    """Return the full path of a training script with file extension.
+
+    Args:
+        fit_script (str): Name of the training routine, e.g. 'training_mlp_eg'.
+
+    Returns:
+        str: Path to the python file of the training script.
+    """
+    py_script = get_path_for_fit_script(fit_script)
+
+    if os.path.splitext(py_script)[-1] == "":
+        py_script = os.path.realpath(os.path.splitext(py_script)[0] + ".py")
+
+    if not os.path.exists(py_script):
+        module_logger.error("Wrong training script %s, please check path" % py_script)
+        raise FileNotFoundError("Can not find training script %s, please check path" % py_script)
+    return py_script
+
+
 def fit_model_get_python_cmd_os():
     """Return proper commandline command for pyhton depending on os.
 
@@ -30,7 +50,7 @@ def fit_model_get_python_cmd_os():
         return 'python3'
 
 
-def fit_model_by_script(i, fit_script, g, filepath, m, proc_async):
+def fit_model_by_script(i, fit_script, g, filepath, m, proc_async, cpus=None):
     """
     Run the training script in subprocess.
 
@@ -41,30 +61,27 @@ def fit_model_by_script(i, fit_script, g, filepath, m, proc_async):
         g (int): GPU index to use.
         m (str): Fitmode.
         proc_async (bool):
+        cpus (list): List of cpu indices to pin the training process to. Default is None.
 
     Returns:
         subprocess
     """
     module_logger.info("Run: {0} for {1} of model {2} async {3}".format(fit_script, i, filepath, proc_async))
-    py_script = get_path_for_fit_script(fit_script)
+    py_script = get_training_script_file(fit_script)
     py_cmd = fit_model_get_python_cmd_os()
 
     if py_script is None:
         module_logger.error("Empty training script. Not starting training.")
         return
 
-    if os.path.splitext(py_script)[-1] == "":
-        py_script = os.path.realpath(os.path.splitext(py_script)[0] + ".py")
-
-    if not os.path.exists(py_script):
-        module_logger.error("Wrong training script %s, please check path %s" % py_script)
-        raise FileNotFoundError("Can not find training script %s, please check path" % py_script)
+    cmd = [py_cmd, py_script, "-i", str(i), '-f', filepath, "-g", str(g), '-m', str(m)]
+    if cpus is not None:
+        cmd += ["-c", ",".join([str(x) for x in cpus])]
 
     if proc_async:
-        proc = subprocess.Popen([py_cmd, py_script, "-i", str(i), '-f', filepath, "-g", str(g), '-m', str(m)])
+        proc = subprocess.Popen(cmd)
         return proc
 
     if not proc_async:
-        proc = subprocess.run([py_cmd, py_script, "-i", str(i), '-f', filepath, "-g", str(g), '-m', str(m)],
-                              capture_output=False, shell=False)
+        proc = subprocess.run(cmd, capture_output=False, shell=False)
         return proc
@@ -0,0 +1,204 @@
+"""
+Pool of persistent worker processes that run the training scripts.
+
+Each worker imports TensorFlow once and then runs training scripts in its own interpreter, so that repeated fits,
+e.g. in an active learning loop, do not pay the start-up cost of a new python process. Parsed data files are cached
+per worker and reused in the next fit if the files did not change. The workers report the progress of every epoch to
+the parent process.
+
+.. code-block:: python
+
+    with TrainingWorkerPool(num_workers=4, threads_per_worker=2) as pool:
+        fit_error = nn.fit(["training_mlp_eg"]*4, fit_mode="training", pool=pool)
+
+"""
+
+import sys
+import time
+import queue
+import runpy
+import logging
+import traceback
+import multiprocessing
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+
+def _run_training_script(py_script: str, argv: list):
+    """Run a training script as `__main__` and restore stdout and stderr, which are redirected by the script."""
+    sys_argv = sys.argv
+    sys.argv = [py_script] + argv
+    try:
+        runpy.run_path(py_script, run_name="__main__")
+    finally:
+        sys.argv = sys_argv
+        for stream in [sys.stdout, sys.stderr]:
+            if stream not in [sys.__stdout__, sys.__stderr__] and not stream.closed:
+                stream.close()
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+
+def _worker_main(worker_id: int, cpus: list, threads: int, task_queue, result_queue):
+    """Main loop of a worker process."""
+    from pyNNsMD.src.device import set_cpu
+    set_cpu(cpus, intra_op_threads=threads)
+    import tensorflow as tf
+    from pyNNsMD.utils.data import set_file_cache
+    from pyNNsMD.utils.callbacks import set_progress_handler
+
+    set_file_cache(True)
+    current_task = [None]
+
+    def send_progress(info):
+        result_queue.put(("progress", current_task[0], worker_id, info))
+
+    set_progress_handler(send_progress)
+    result_queue.put(("ready", None, worker_id, None))
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, py_script, argv = task
+        current_task[0] = task_id
+        error = None
+        time_start = time.time()
+        try:
+            _run_training_script(py_script, argv)
+        except BaseException:
+            error = traceback.format_exc()
+        tf.keras.backend.clear_session()
+        result_queue.put(("done", task_id, worker_id, {"error": error, "time": time.time() - time_start}))
+        current_task[0] = None
+
+
+class TrainingWorkerPool:
+    """Persistent process pool to fit the models of a :obj:`NeuralNetEnsemble`.
+
+    Workers are started with the `spawn` method, since TensorFlow is not fork-safe. Each worker can be pinned to a set
+    of cpus and the number of threads of TensorFlow and BLAS can be limited. Training scripts write their output to
+    `fitlog.txt` in the model directory as for :obj:`pyNNsMD.src.fit.fit_model_by_script`.
+    """
+
+    def __init__(self, num_workers: int = 1, cpu_sets: list = None, threads_per_worker: int = None,
+                 logger=None):
+        """Start worker processes.
+
+        Args:
+            num_workers (int): Number of worker processes. Default is 1.
+            cpu_sets (list, str): List of cpu indices for each worker, e.g. `[[0, 1], [2, 3]]`, or "auto" to
+                split the available cpus with :obj:`pyNNsMD.src.device.get_cpu_partition`. Default is None.
+            threads_per_worker (int): Number of threads per worker. Default is None, which is the number of cpus of
+                the worker if `cpu_sets` is given and otherwise not limited.
+            logger: Logger for this class.
+        """
+        self.logger = module_logger if logger is None else logger
+        if isinstance(cpu_sets, str) and cpu_sets == "auto":
+            from pyNNsMD.src.device import get_cpu_partition
+            cpu_sets = get_cpu_partition(num_workers)
+            num_workers = len(cpu_sets)
+        if cpu_sets is not None and len(cpu_sets) != num_workers:
+            raise ValueError("CPU sets must match number of workers %s but got %s" % (num_workers, len(cpu_sets)))
+        self.num_workers = int(num_workers)
+        self.cpu_sets = cpu_sets
+        self.threads_per_worker = threads_per_worker
+        self._context = multiprocessing.get_context("spawn")
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._task_counter = 0
+        self._pending = {}
+        self._results = {}
+        self._workers = []
+        for k in range(self.num_workers):
+            cpus = cpu_sets[k] if cpu_sets is not None else None
+            proc = self._context.Process(target=_worker_main, name="TrainingWorker-%s" % k,
+                                         args=(k, cpus, threads_per_worker, self._task_queue, self._result_queue),
+                                         daemon=True)
+            proc.start()
+            self._workers.append(proc)
+        self.logger.info("Started %s training workers." % self.num_workers)
+
+    def submit(self, fit_script: str, i: int, filepath: str, gpu: int = -1, mode: str = "training"):
+        """Submit the fit of a single model.
+
+        Args:
+            fit_script (str): Name of the training routine, e.g. 'training_mlp_eg'.
+            i (int): Index of model.
+            filepath (str): Filepath to model.
+            gpu (int): GPU index to use. A worker keeps the GPU of its first fit. Default is -1.
+            mode (str): Fit mode. Default is 'training'.
+
+        Returns:
+            int: Task id.
+        """
+        from pyNNsMD.src.fit import get_training_script_file
+        if not self._workers:
+            raise RuntimeError("Training pool is closed.")
+        py_script = get_training_script_file(fit_script)
+        task_id = self._task_counter
+        self._task_counter += 1
+        self._pending[task_id] = {"model_index": int(i), "filepath": filepath}
+        self._task_queue.put((task_id, py_script, ["-i", str(i), "-f", filepath, "-g", str(gpu), "-m", str(mode)]))
+        self.logger.info("Submitted %s for model %s to pool." % (fit_script, i))
+        return task_id
+
+    def _log_progress(self, info):
+        losses = ", ".join(["%s: %.4g" % (key, value) for key, value in info["logs"].items() if "loss" in key])
+        eta = " ETA: %.0fs" % info["eta"] if info["eta"] is not None else ""
+        self.logger.info("Model %s epoch %s/%s %s%s" % (info["model_index"], info["epoch"], info["epochs"], losses,
+                                                         eta))
+
+    def wait(self, task_ids: list = None, progress_callback=None, progress_step: int = 1, timeout: float = None):
+        """Wait for submitted fits and forward the progress of the workers.
+
+        Args:
+            task_ids (list): Task ids to wait for. Default is None, which waits for all pending tasks.
+            progress_callback (callable): Function that takes the progress dictionary with keys "model_index",
+                "epoch", "epochs", "elapsed", "eta" and "logs". Default is None, which logs every `progress_step`
+                epoch.
+            progress_step (int): Epoch interval for the default progress logging. Default is 1.
+            timeout (float): Timeout in seconds. Default is None.
+
+        Returns:
+            dict: Result for each task id with keys "error" and "time". Error is None for a successful fit.
+        """
+        task_ids = list(self._pending.keys()) if task_ids is None else list(task_ids)
+        time_start = time.time()
+        while not all(x in self._results for x in task_ids):
+            if timeout is not None and time.time() - time_start > timeout:
+                raise TimeoutError("Training pool did not finish within %s s." % timeout)
+            try:
+                kind, task_id, worker_id, info = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p.name for p in self._workers if not p.is_alive()]
+                if dead:
+                    raise RuntimeError("Training workers %s terminated unexpectedly." % dead)
+                continue
+            if kind == "progress":
+                if progress_callback is not None:
+                    progress_callback(info)
+                elif info["epoch"] % progress_step == 0:
+                    self._log_progress(info)
+            elif kind == "done":
+                self._results[task_id] = info
+                task = self._pending.pop(task_id, {})
+                if info["error"] is not None:
+                    self.logger.error("Fit of model %s failed:\n%s" % (task.get("model_index"), info["error"]))
+                else:
+                    self.logger.info("Fit of model %s finished in %.1f s." % (task.get("model_index"), info["time"]))
+        return {x: self._results.pop(x) for x in task_ids}
+
+    def close(self):
+        """Stop all workers after their current fit."""
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for proc in self._workers:
+            proc.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -11,10 +11,11 @@ from pyNNsMD.models.mlp_nac import NACModel
 from pyNNsMD.models.mlp_nac2 import NACModel2
 from pyNNsMD.models.mlp_g2 import GradientModel2
 
-from pyNNsMD.nn_pes_src.hypers.hyper_mlp_e import DEFAULT_HYPER_PARAM_ENERGY
-from pyNNsMD.nn_pes_src.hypers.hyper_mlp_eg import DEFAULT_HYPER_PARAM_ENERGY_GRADS
-from pyNNsMD.nn_pes_src.hypers.hyper_mlp_g2 import DEFAULT_HYPER_PARAM_GRADS2
-from pyNNsMD.nn_pes_src.hypers.hyper_mlp_nac import DEFAULT_HYPER_PARAM_NAC
+from pyNNsMD.hypers.hyper_mlp_e import DEFAULT_HYPER_PARAM_ENERGY
+from pyNNsMD.hypers.hyper_mlp_eg import DEFAULT_HYPER_PARAM_ENERGY_GRADS
+from pyNNsMD.hypers.hyper_mlp_g2 import DEFAULT_HYPER_PARAM_GRADS2
+from pyNNsMD.hypers.hyper_mlp_nac import DEFAULT_HYPER_PARAM_NAC
+from pyNNsMD.hypers.hyper_mlp_nac2 import DEFAULT_HYPER_PARAM_NAC as DEFAULT_HYPER_PARAM_NAC2
 
 from pyNNsMD.scaler.energy import EnergyGradientStandardScaler, EnergyStandardScaler, GradientStandardScaler
 from pyNNsMD.scaler.nac import NACStandardScaler
@@ -35,7 +36,7 @@ def get_default_hyperparameters_by_modeltype(model_type):
                   'mlp_e': DEFAULT_HYPER_PARAM_ENERGY,
                   'mlp_g2': DEFAULT_HYPER_PARAM_GRADS2,
                   'mlp_nac': DEFAULT_HYPER_PARAM_NAC,
-                  'mlp_nac2': DEFAULT_HYPER_PARAM_NAC}
+                  'mlp_nac2': DEFAULT_HYPER_PARAM_NAC2}
     return model_dict[model_type]
 
 
@@ -117,25 +118,120 @@ def get_model_by_type(model_type, hyper):
         raise TypeError(f"Error: Unknown model type forn{model_type}")
 
 
-def predict_uncertainty(model_type, out, mult_nn):
-    if isinstance(out[0], list):
-        out_mean = []
+UNCERTAINTY_REDUCTIONS = [None, "atom_norm", "max_norm"]
+
+
+class UncertaintyAccumulator:
+    """Streaming mean and standard deviation of the output of ensemble members with Welford's algorithm.
+
+    The output of each member is added one at a time and updates the running mean and sum of squared deviations in
+    place. Only these and one buffer per output are held in memory, instead of the stacked output of all members.
+    The standard deviation has `ddof=1` as :obj:`np.std` and is zero for a single member.
+    """
+
+    def __init__(self):
+        """Initialize empty accumulator."""
+        self.count = 0
+        self._is_list = None
+        self._mean = None
+        self._m2 = None
+        self._buffer = None
+
+    def add(self, y):
+        """Add the output of one member.
+
+        Args:
+            y (np.ndarray, list): Output of a model, either an array or a list of arrays of multiple outputs.
+
+        Returns:
+            self
+        """
+        is_list = isinstance(y, (list, tuple))
+        y = list(y) if is_list else [y]
+        if self.count == 0:
+            self._is_list = is_list
+            self._mean = [np.array(y_i, dtype=np.result_type(np.asarray(y_i).dtype, np.float32)) for y_i in y]
+            self._m2 = [np.zeros_like(y_i) for y_i in self._mean]
+            self._buffer = [np.empty_like(y_i) for y_i in self._mean]
+            self.count = 1
+            return self
+        if is_list != self._is_list or len(y) != len(self._mean):
+            raise ValueError("Output structure of member %s does not match previous members." % self.count)
+        self.count += 1
+        n = self.count
+        for y_i, mean, m2, buffer in zip(y, self._mean, self._m2, self._buffer):
+            # With delta = y - mean, the update is mean += delta/n and m2 += (n-1)/n * delta^2 = n*(n-1)*(delta/n)^2.
+            np.subtract(y_i, mean, out=buffer)
+            buffer /= n
+            mean += buffer
+            np.square(buffer, out=buffer)
+            buffer *= n * (n - 1)
+            m2 += buffer
+        return self
+
+    def _format(self, values):
+        return values if self._is_list else values[0]
+
+    def mean(self):
+        """Mean of the output of all members added so far.
+
+        Returns:
+            np.ndarray, list: Mean of the output in the structure of the output of a member.
+        """
+        if self.count == 0:
+            raise ValueError("No output was added to the accumulator.")
+        return self._format(self._mean)
+
+    def std(self, reduction: str = None):
+        """Standard deviation of the output of all members added so far.
+
+        Vector outputs with a last axis of size 3, e.g. gradients or NACs of shape `(batch, states, atoms, 3)`, can be
+        reduced to the norm of the standard deviation per atom or the maximum norm over atoms. Other outputs are
+        returned unchanged.
+
+        Args:
+            reduction (str): None for the elementwise standard deviation, "atom_norm" for the norm per atom
+                and "max_norm" for the maximum norm over atoms. Default is None.
+
+        Returns:
+            np.ndarray, list: Standard deviation in the structure of the output of a member.
+        """
+        if reduction not in UNCERTAINTY_REDUCTIONS:
+            raise ValueError("Unknown reduction %s, must be in %s." % (reduction, UNCERTAINTY_REDUCTIONS))
+        if self.count == 0:
+            raise ValueError("No output was added to the accumulator.")
         out_std = []
-        for i in range(len(out[0])):
-            out_mean.append(np.mean(np.array([x[i] for x in out]), axis=0))
-            if mult_nn > 1:
-                out_std.append(np.std(np.array([x[i] for x in out]), axis=0, ddof=1))
-            else:
-                out_std.append(np.zeros_like(out_mean[-1]))
-
-        return out_mean, out_std
-    else:
-        out_mean = np.mean(np.array(out), axis=0)
-        if mult_nn > 1:
-            out_std = np.std(np.array(out), axis=0, ddof=1)
-        else:
-            out_std = np.zeros_like(out_mean)
-        return out_mean, out_std
+        for m2 in self._m2:
+            ddof = max(self.count - 1, 1)
+            if reduction is None or m2.ndim < 3 or m2.shape[-1] != 3:
+                out_std.append(np.sqrt(m2 / ddof))
+                continue
+            std_atom = np.sqrt(np.sum(m2, axis=-1) / ddof)
+            out_std.append(std_atom if reduction == "atom_norm" else np.max(std_atom, axis=-1))
+        return self._format(out_std)
+
+
+def predict_uncertainty(model_type, out, mult_nn, reduction: str = None):
+    """Mean and standard deviation of the output of an ensemble.
+
+    The output of the members is accumulated one at a time with :obj:`UncertaintyAccumulator`, without stacking.
+
+    Args:
+        model_type (str): Model type. Not used.
+        out (list): Output of each member as array or list of arrays.
+        mult_nn (int): Number of members. The standard deviation is zero for a single member.
+        reduction (str): Reduction of vector outputs, see :obj:`UncertaintyAccumulator.std`. Default is None.
+
+    Returns:
+        tuple: Mean and standard deviation in the structure of the output of a member.
+    """
+    accumulator = UncertaintyAccumulator()
+    for y in out:
+        accumulator.add(y)
+    out_std = accumulator.std(reduction=reduction)
+    if mult_nn <= 1:
+        out_std = [np.zeros_like(y) for y in out_std] if isinstance(out_std, list) else np.zeros_like(out_std)
+    return accumulator.mean(), out_std
 
 
 def unpack_convert_y_to_numpy(model_type, temp):
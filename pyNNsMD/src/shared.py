@@ -0,0 +1,283 @@
+"""
+Shared memory exchange of coordinates and ensemble output between MD worker processes and the ensemble.
+
+The buffer consists of a fixed number of slots. Each slot holds a status flag, the coordinates of one geometry and the
+mean and standard deviation of the ensemble output. A worker writes coordinates into its slot and sets the status to
+`REQUEST`. The server collects all pending slots, evaluates them as one batch and writes the result directly into
+the output arrays of the slots before setting the status to `DONE`. No data is pickled or sent over a pipe.
+
+.. code-block:: python
+
+    # Server process
+    server = SharedMemoryServer(nn, slots=128, atoms=12, name="nnsmd")
+    server.serve_forever()
+
+    # Worker process
+    client = SharedMemoryClient("nnsmd", slot=0)
+    client.geometry[:] = x
+    mean, std = client.call()
+
+"""
+
+import json
+import time
+import threading
+import logging
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+logging.basicConfig()
+module_logger = logging.getLogger(__name__)
+module_logger.setLevel(logging.INFO)
+
+SLOT_FREE = 0
+SLOT_REQUEST = 1
+SLOT_DONE = 2
+SLOT_ERROR = 3
+
+_HEADER_BYTES = 4096
+_ALIGN = 64
+# Segments created by this process, which are registered with its resource tracker by the owner.
+_created_segments = set()
+
+
+def _aligned(offset: int):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _attach_shared_memory(name: str):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers every attached segment with the resource tracker, which would unlink it on exit.
+        # Child processes of multiprocessing share the tracker of the parent, which owns the segment.
+        shm = shared_memory.SharedMemory(name=name)
+        if multiprocessing.parent_process() is None and shm._name not in _created_segments:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedGeometryBuffer:
+    """Slot buffer for coordinates and output arrays in a single shared memory segment.
+
+    The layout is stored as json in the first bytes of the segment, so that other processes can attach by name only.
+    """
+
+    def __init__(self, name: str = None, slots: int = None, atoms: int = None, output_shapes: list = None,
+                 dtype: str = "float32", create: bool = False):
+        """Create or attach to a shared buffer.
+
+        Args:
+            name (str): Name of the shared memory segment. Can be None if created.
+            slots (int): Number of slots. Only required for `create=True`.
+            atoms (int): Number of atoms. Only required for `create=True`.
+            output_shapes (list): Shape of each output per sample, e.g. `[(2, ), (2, 12, 3)]`. Each output is stored
+                as mean and std. Only required for `create=True`.
+            dtype (str): Data type of coordinates and output. Default is "float32".
+            create (bool): Whether to create a new segment. Default is False.
+        """
+        if create:
+            layout = {"slots": int(slots), "atoms": int(atoms), "dtype": np.dtype(dtype).str,
+                      "output_shapes": [list(x) for x in output_shapes], "arrays": {}}
+            offset = _HEADER_BYTES
+            array_shapes = {"status": ([slots], np.dtype("int32").str),
+                            "geometry": ([slots, atoms, 3], np.dtype(dtype).str)}
+            for i, shape in enumerate(output_shapes):
+                array_shapes["mean_%s" % i] = ([slots] + list(shape), np.dtype(dtype).str)
+                array_shapes["std_%s" % i] = ([slots] + list(shape), np.dtype(dtype).str)
+            for key, (shape, array_dtype) in array_shapes.items():
+                layout["arrays"][key] = {"offset": offset, "shape": shape, "dtype": array_dtype}
+                offset = _aligned(offset + int(np.prod(shape)) * np.dtype(array_dtype).itemsize)
+            header = json.dumps(layout).encode("utf-8")
+            if len(header) >= _HEADER_BYTES:
+                raise ValueError("Too many outputs for shared buffer header.")
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=offset)
+            _created_segments.add(self.shm._name)
+            self.shm.buf[:len(header)] = header
+            self.shm.buf[len(header):_HEADER_BYTES] = bytes(_HEADER_BYTES - len(header))
+        else:
+            self.shm = _attach_shared_memory(name)
+            layout = json.loads(bytes(self.shm.buf[:_HEADER_BYTES]).rstrip(b"\x00").decode("utf-8"))
+
+        self.owner = create
+        self.name = self.shm.name
+        self.slots = layout["slots"]
+        self.atoms = layout["atoms"]
+        self.output_shapes = [tuple(x) for x in layout["output_shapes"]]
+        self.num_outputs = len(self.output_shapes)
+        self._arrays = {
+            key: np.ndarray(info["shape"], dtype=np.dtype(info["dtype"]), buffer=self.shm.buf, offset=info["offset"])
+            for key, info in layout["arrays"].items()}
+        self.status = self._arrays["status"]
+        self.geometry = self._arrays["geometry"]
+        self.mean = [self._arrays["mean_%s" % i] for i in range(self.num_outputs)]
+        self.std = [self._arrays["std_%s" % i] for i in range(self.num_outputs)]
+        if create:
+            self.status[:] = SLOT_FREE
+
+    def close(self):
+        """Release array views and close the segment. The owner also unlinks the segment."""
+        self._arrays = {}
+        self.status, self.geometry, self.mean, self.std = None, None, [], []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            _created_segments.discard(self.shm._name)
+
+
+class SharedMemoryServer:
+    """Evaluate pending slots of a :obj:`SharedGeometryBuffer` with an ensemble."""
+
+    def __init__(self, ensemble, slots: int, atoms: int, name: str = None, poll_interval: float = 1e-4,
+                 logger=None):
+        """Create the shared buffer for the ensemble output.
+
+        Args:
+            ensemble (NeuralNetEnsemble): Loaded ensemble that supports :obj:`call_fused()`.
+            slots (int): Number of slots, i.e. maximum number of concurrent trajectories.
+            atoms (int): Number of atoms.
+            name (str): Name of the shared memory segment. Default is None.
+            poll_interval (float): Sleep time in seconds if no slot is pending. Default is 1e-4.
+            logger: Logger for this class.
+        """
+        self.logger = module_logger if logger is None else logger
+        self.ensemble = ensemble
+        self.poll_interval = poll_interval
+        # Coordinates and output are stored in the compute dtype of the models, e.g. float64.
+        dtype = ensemble._get_fused_dtype().as_numpy_dtype
+        # Dry run to get output shapes and to trace the graph.
+        y_mean, _, _ = ensemble.call_fused(np.zeros((1, atoms, 3), dtype=dtype))
+        y_mean = y_mean if isinstance(y_mean, list) else [y_mean]
+        self.buffer = SharedGeometryBuffer(name=name, slots=slots, atoms=atoms,
+                                           output_shapes=[x.shape[1:] for x in y_mean], dtype=dtype, create=True)
+        self.name = self.buffer.name
+        self._running = False
+        self._thread = None
+
+    def process_pending(self):
+        """Evaluate all slots that are in request state.
+
+        Returns:
+            int: Number of evaluated slots.
+        """
+        buffer = self.buffer
+        index = np.flatnonzero(buffer.status == SLOT_REQUEST)
+        if len(index) == 0:
+            return 0
+        try:
+            y_mean, y_std, _ = self.ensemble.call_fused(buffer.geometry[index])
+        except Exception as error:
+            self.logger.error("Ensemble call failed for shared buffer with %s" % error)
+            buffer.status[index] = SLOT_ERROR
+            return len(index)
+        y_mean = y_mean if isinstance(y_mean, list) else [y_mean]
+        y_std = y_std if isinstance(y_std, list) else [y_std]
+        for out, y in zip(buffer.mean, y_mean):
+            out[index] = y
+        for out, y in zip(buffer.std, y_std):
+            out[index] = y
+        buffer.status[index] = SLOT_DONE
+        return len(index)
+
+    def serve_forever(self):
+        """Poll the buffer until :obj:`stop()` is called."""
+        self._running = True
+        self.logger.info("Serving shared memory buffer %s with %s slots" % (self.name, self.buffer.slots))
+        while self._running:
+            if self.process_pending() == 0:
+                time.sleep(self.poll_interval)
+
+    def start(self):
+        """Run :obj:`serve_forever()` in a background thread.
+
+        Returns:
+            self
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="SharedMemoryServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.buffer.close()
+
+
+class SharedMemoryClient:
+    """Access to one slot of a :obj:`SharedGeometryBuffer` for an MD worker process.
+
+    The coordinates are written to :obj:`geometry` and the output is read from :obj:`mean` and :obj:`std`, which
+    are views into the shared memory. The views are overwritten by the next call.
+    """
+
+    def __init__(self, name: str, slot: int, poll_interval: float = 0.0):
+        """Attach to shared buffer.
+
+        Args:
+            name (str): Name of the shared memory segment.
+            slot (int): Index of the slot used by this client.
+            poll_interval (float): Sleep time while waiting for the result. Default is 0.0.
+        """
+        self.buffer = SharedGeometryBuffer(name=name)
+        if not 0 <= slot < self.buffer.slots:
+            raise ValueError("Slot %s is not in buffer with %s slots." % (slot, self.buffer.slots))
+        self.slot = slot
+        self.poll_interval = poll_interval
+        self.geometry = self.buffer.geometry[slot]
+        self.mean = [x[slot] for x in self.buffer.mean]
+        self.std = [x[slot] for x in self.buffer.std]
+
+    def submit(self, x=None):
+        """Set slot to request state.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(atoms, 3)`. Default is None, if written to :obj:`geometry` already.
+        """
+        if x is not None:
+            self.geometry[...] = x
+        self.buffer.status[self.slot] = SLOT_REQUEST
+
+    def wait(self, timeout: float = None):
+        """Wait for the result of the last request.
+
+        Args:
+            timeout (float): Timeout in seconds. Default is None.
+
+        Returns:
+            tuple: List of mean and std output views.
+        """
+        status = self.buffer.status
+        start = time.perf_counter()
+        while status[self.slot] == SLOT_REQUEST:
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise TimeoutError("No response from shared memory server for slot %s." % self.slot)
+            time.sleep(self.poll_interval)
+        if status[self.slot] == SLOT_ERROR:
+            status[self.slot] = SLOT_FREE
+            raise RuntimeError("Shared memory server failed for slot %s, see server log." % self.slot)
+        status[self.slot] = SLOT_FREE
+        return self.mean, self.std
+
+    def call(self, x=None, timeout: float = None):
+        """Submit coordinates and wait for the result.
+
+        Args:
+            x (np.ndarray): Coordinates of shape `(atoms, 3)`. Default is None.
+            timeout (float): Timeout in seconds. Default is None.
+
+        Returns:
+            tuple: List of mean and std output views.
+        """
+        self.submit(x)
+        return self.wait(timeout=timeout)
+
+    def close(self):
+        self.geometry, self.mean, self.std = None, [], []
+        self.buffer.close()
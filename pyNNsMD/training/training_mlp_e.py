@@ -18,6 +18,7 @@ parser.add_argument("-i", "--index", required=True, help="Index of the NN to tra
 parser.add_argument("-f", "--filepath", required=True, help="Filepath to weights, hyperparameter, data etc. ")
 parser.add_argument("-g", "--gpus", default=-1, required=True, help="Index of gpu to use")
 parser.add_argument("-m", "--mode", default="training", required=True, help="Which mode to use train or retrain")
+parser.add_argument("-c", "--cpus", default=None, help="Comma separated list of cpu indices to use")
 args = vars(parser.parse_args())
 
 file_std_out = open(os.path.join(args['filepath'], "fitlog.txt"), 'w')
@@ -26,17 +27,24 @@ sys.stdout = file_std_out
 
 print("Input argpars:", args)
 
-from pyNNsMD.src.device import set_gpu
+from pyNNsMD.src.device import set_gpu, set_cpu
 
+if args['cpus'] is not None:
+    set_cpu([int(x) for x in args['cpus'].split(",")])
 set_gpu([int(args['gpus'])])
 print("Logic Devices:", tf.config.experimental.list_logical_devices('GPU'))
 
 import pyNNsMD.utils.callbacks
 import pyNNsMD.utils.activ
 from pyNNsMD.models.mlp_e import EnergyModel
-from pyNNsMD.utils.data import load_json_file, read_xyz_file, save_json_file
+from pyNNsMD.utils.data import load_json_file, save_json_file
+from pyNNsMD.datasets.access import IndexedDataset
+from pyNNsMD.datasets.pipeline import make_feature_input
+from pyNNsMD.datasets.features import FeatureCache, FEATURE_CACHE_FOLDER
+from pyNNsMD.datasets.evaluate import evaluate_split
 from pyNNsMD.scaler.energy import EnergyStandardScaler
 from pyNNsMD.utils.loss import ScaledMeanAbsoluteError, get_lr_metric, r2_metric
+from pyNNsMD.utils.precision import get_precision_optimizer
 from pyNNsMD.plots.loss import plot_loss_curves, plot_learning_curve
 from pyNNsMD.plots.pred import plot_scatter_prediction
 
@@ -74,15 +82,15 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
     initialize_weights = training_config['initialize_weights']
     learning_rate = training_config['learning_rate']
     use_callbacks = training_config['callbacks']
+    feature_pipeline = training_config.get("feature_pipeline", "precompute")
+    shared_feature_cache = training_config.get("shared_feature_cache", False)
 
     # Load data.
     data_dir = os.path.dirname(out_dir)
-    xyz = read_xyz_file(os.path.join(data_dir, "geometries.xyz"))
-    x = np.array([x[1] for x in xyz])
-    if x.shape[1] != num_atoms:
-        raise ValueError(f"Mismatch Shape between {x.shape} model and data {num_atoms}")
-    y = load_json_file(os.path.join(data_dir, "energies.json"))
-    y = np.array(y)
+    dataset = IndexedDataset.from_directory(data_dir, ["geometries", "energies"])
+    if dataset.shape("geometries")[1] != num_atoms:
+        raise ValueError(f"Mismatch Shape between {dataset.shape('geometries')} model and data {num_atoms}")
+    data_train, data_val = dataset.subset(i_train), dataset.subset(i_val)
 
     # Fit stats dir
     dir_save = os.path.join(out_dir, "fit_stats")
@@ -95,6 +103,7 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
             # tf.keras.utils.get_registered_object()
             cb = tf.keras.utils.deserialize_keras_object(cb_item)
             cbks.append(cb)
+    cbks.append(pyNNsMD.utils.callbacks.FitProgressCallback(model_index=i))
 
     # Make Model
     # Only works for Energy model here
@@ -111,23 +120,32 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
 
     # Recalculate standardization
     scaler = EnergyStandardScaler(**scaler_config["config"])
-    scaler.fit(x[i_train], y[i_train])
-    x_rescale, y1 = scaler.transform(x, y)
-
-    # Model + Model precompute layer +feat
-    feat_x, feat_grad = out_model.precompute_feature_in_chunks(x_rescale, batch_size=batch_size)
-
-    # Train Test split
-    xtrain = [feat_x[i_train], feat_grad[i_train]]
-    ytrain = y1[i_train]
-    xval = [feat_x[i_val], feat_grad[i_val]]
-    yval = y1[i_val]
+    # Fit scaler chunk-wise from the memory-mapped data.
+    for batch in data_train.iter_batches(batch_size=4096, keys=["geometries", "energies"]):
+        scaler.partial_fit(batch["geometries"], batch["energies"])
+
+    def scale(batch):
+        return scaler.transform(batch["geometries"], batch["energies"])
+
+    # Features of all samples are shared with the other models of the ensemble, e.g. for retraining.
+    features = None
+    if shared_feature_cache and feature_pipeline == "stream":
+        print("Warning: Shared feature cache is not used for 'stream' feature pipeline.")
+    elif shared_feature_cache:
+        feature_cache = FeatureCache(os.path.join(data_dir, FEATURE_CACHE_FOLDER))
+        features = feature_cache.get_or_compute(dataset, out_model, scaler, batch_size=batch_size)
+
+    # Model + Model precompute layer +feat, for train and test split
+    fit_data, xtrain, xval = make_feature_input(data_train, data_val, out_model, scale, batch_size=batch_size,
+                                                pipeline=feature_pipeline,
+                                                cache_dir=os.path.join(out_dir, "feature_cache"), features=features)
 
     # Compile model
     # This is only for metric to without std.
     scaled_metric = ScaledMeanAbsoluteError(scaling_shape=scaler.energy_std.shape)
     scaled_metric.set_scale(scaler.energy_std)
-    optimizer = tf.keras.optimizers.Adam(lr=learning_rate)
+    optimizer = get_precision_optimizer(tf.keras.optimizers.Adam(lr=learning_rate),
+                                        out_model.precision)
     lr_metric = get_lr_metric(optimizer)
     out_model.compile(optimizer=optimizer,
                       loss='mean_squared_error',
@@ -138,8 +156,7 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
     out_model.summary()
     print("")
     print("Start fit.")
-    hist = out_model.fit(x=xtrain, y=ytrain, epochs=epo, batch_size=batch_size, callbacks=cbks, validation_freq=epostep,
-                         validation_data=(xval, yval), verbose=2)
+    hist = out_model.fit(**fit_data, epochs=epo, callbacks=cbks, validation_freq=epostep, verbose=2)
     print("End fit.")
     print("")
 
@@ -152,16 +169,16 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
     scaler.save_weights(os.path.join(out_dir, "scaler_weights.npy"))
 
     # Plot and Save
-    yval_plot = y[i_val]
-    ytrain_plot = y[i_train]
-    # Convert back scaler
-    pval = out_model.predict(xval)
-    ptrain = out_model.predict(xtrain)
-    _, pval = scaler.inverse_transform(y=pval)
-    _, ptrain = scaler.inverse_transform(y=ptrain)
-
-    print("Info: Predicted Energy shape:", ptrain.shape)
-    print("Info: Predicted Gradient shape:", ptrain.shape)
+    # Predict each split once in batches and accumulate errors, so that no full split is held in memory.
+    def inverse_transform(y):
+        return [scaler.inverse_transform(y=y)[1]]
+
+    stats_val, _ = evaluate_split(out_model, xval, data_val, ["energies"], inverse_transform, batch_size=batch_size)
+    stats_train, ptrain = evaluate_split(out_model, xtrain, data_train, ["energies"], inverse_transform,
+                                         batch_size=batch_size)
+    pval_plot, yval_plot = stats_val[0].scatter()
+
+    print("Info: Predicted Energy shape of first batch:", ptrain[0].shape)
     print("Info: Plot fit stats...")
 
     # Plot
@@ -170,25 +187,23 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
                      filename='fit' + str(i), filetypeout='.png', unit_loss=unit_label_energy, loss_name="MAE",
                      plot_title="Energy")
 
-    plot_scatter_prediction(pval, yval_plot, save_plot_to_file=True, dir_save=dir_save, filename='fit' + str(i),
+    plot_scatter_prediction(pval_plot, yval_plot, save_plot_to_file=True, dir_save=dir_save, filename='fit' + str(i),
                             filetypeout='.png', unit_actual=unit_label_energy, unit_predicted=unit_label_energy,
                             plot_title="Prediction")
 
     plot_learning_curve(hist.history['lr'], filename='fit' + str(i), dir_save=dir_save)
 
-    # Safe fitting Error MAE
-    pval = out_model.predict(xval)
-    ptrain = out_model.predict(xtrain)
-    _, pval = scaler.inverse_transform(y=pval)
-    _, ptrain = scaler.inverse_transform(y=ptrain)
+    # Compare precomputed features with direct computation for the first batch.
     out_model.precomputed_features = False
-    ptrain2 = out_model.predict(x_rescale[i_train])
+    x_check = data_train.batch(np.arange(len(ptrain[0])), keys=["geometries"])["geometries"]
+    x_train_rescale, _ = scaler.transform(x=x_check)
+    ptrain2 = out_model.predict(x_train_rescale)
     _, ptrain2 = scaler.inverse_transform(y=ptrain2)
 
     print("Info: Max error between precomputed and direct gradient:")
-    print("Energy", np.max(np.abs(ptrain - ptrain2)))
-    error_val = np.mean(np.abs(pval - y[i_val]))
-    error_train = np.mean(np.abs(ptrain - y[i_train]))
+    print("Energy", np.max(np.abs(ptrain[0] - ptrain2)))
+    error_val = stats_val[0].mae()
+    error_train = stats_train[0].mae()
     print("error_val:", error_val)
     print("error_train:", error_train)
     error_dict = {"train": error_train.tolist(), "valid": error_val.tolist()}
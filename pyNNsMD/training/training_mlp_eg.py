@@ -15,6 +15,7 @@ parser.add_argument("-i", "--index", required=True, help="Index of the NN to tra
 parser.add_argument("-f", "--filepath", required=True, help="Filepath to weights, hyperparameter, data etc. ")
 parser.add_argument("-g", "--gpus", default=-1, required=True, help="Index of gpu to use")
 parser.add_argument("-m", "--mode", default="training", required=True, help="Which mode to use train or retrain")
+parser.add_argument("-c", "--cpus", default=None, help="Comma separated list of cpu indices to use")
 args = vars(parser.parse_args())
 
 fstdout = open(os.path.join(args['filepath'], "fitlog.txt"), 'w')
@@ -23,8 +24,10 @@ sys.stdout = fstdout
 
 print("Input argpars:", args)
 
-from pyNNsMD.src.device import set_gpu
+from pyNNsMD.src.device import set_gpu, set_cpu
 
+if args['cpus'] is not None:
+    set_cpu([int(x) for x in args['cpus'].split(",")])
 set_gpu([int(args['gpus'])])
 print("Logic Devices:", tf.config.experimental.list_logical_devices('GPU'))
 
@@ -33,10 +36,15 @@ import pyNNsMD.utils.activ
 from pyNNsMD.models.mlp_eg import EnergyGradientModel
 from pyNNsMD.scaler.energy import EnergyGradientStandardScaler
 from pyNNsMD.utils.loss import get_lr_metric, ScaledMeanAbsoluteError, r2_metric, ZeroEmptyLoss
-from pyNNsMD.utils.data import load_json_file, read_xyz_file, save_json_file
+from pyNNsMD.utils.precision import get_precision_optimizer
+from pyNNsMD.utils.data import load_json_file, save_json_file
+from pyNNsMD.datasets.access import IndexedDataset
+from pyNNsMD.datasets.pipeline import make_feature_input
+from pyNNsMD.datasets.features import FeatureCache, FEATURE_CACHE_FOLDER
+from pyNNsMD.datasets.evaluate import evaluate_split
 from pyNNsMD.plots.loss import plot_loss_curves, plot_learning_curve
 from pyNNsMD.plots.pred import plot_scatter_prediction
-from pyNNsMD.plots.error import plot_error_vec_mean, plot_error_vec_max
+from pyNNsMD.plots.error import plot_mean_error_curves, plot_max_error_curves
 
 
 def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
@@ -74,17 +82,16 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
     learning_rate = training_config['learning_rate']
     loss_weights = training_config['loss_weights']
     use_callbacks = list(training_config["callbacks"])
+    feature_pipeline = training_config.get("feature_pipeline", "precompute")
+    shared_feature_cache = training_config.get("shared_feature_cache", False)
 
     # Load data.
     data_dir = os.path.dirname(out_dir)
-    xyz = read_xyz_file(os.path.join(data_dir, "geometries.xyz"))
-    x = np.array([x[1] for x in xyz])
-    if x.shape[1] != num_atoms:
-        raise ValueError(f"Mismatch Shape between {x.shape} model and data {num_atoms}")
-    y1 = np.array(load_json_file(os.path.join(data_dir, "energies.json")))
-    y2 = np.array(load_json_file(os.path.join(data_dir, "forces.json")))
-    print("INFO: Shape of y", y1.shape, y2.shape)
-    y = [y1, y2]
+    dataset = IndexedDataset.from_directory(data_dir, ["geometries", "energies", "forces"])
+    if dataset.shape("geometries")[1] != num_atoms:
+        raise ValueError(f"Mismatch Shape between {dataset.shape('geometries')} model and data {num_atoms}")
+    print("INFO: Shape of y", dataset.shape("energies"), dataset.shape("forces"))
+    data_train, data_val = dataset.subset(i_train), dataset.subset(i_val)
 
     # Fit stats dir
     dir_save = os.path.join(out_dir, "fit_stats")
@@ -97,9 +104,10 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
             # tf.keras.utils.get_registered_object()
             cb = tf.keras.utils.deserialize_keras_object(cb_item)
             cbks.append(cb)
+    cbks.append(pyNNsMD.utils.callbacks.FitProgressCallback(model_index=i))
 
     # Index train test split
-    print("Info: Train-Test split at Train:", len(i_train), "Test", len(i_val), "Total", len(x))
+    print("Info: Train-Test split at Train:", len(i_train), "Test", len(i_val), "Total", len(dataset))
 
     # Make all Model
     assert model_config["class_name"] == "EnergyGradientModel", "Training script only for EnergyGradientModel"
@@ -119,21 +127,30 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
 
     # Scale x,y
     scaler = EnergyGradientStandardScaler(**scaler_config["config"])
-    scaler.fit(x[i_train], [y[0][i_train], y[1][i_train]])
-    x_rescale, y_rescale = scaler.transform(x, y)
-    y1, y2 = y_rescale
-
-    # Model + Model precompute layer +feat
-    feat_x, feat_grad = out_model.precompute_feature_in_chunks(x_rescale, batch_size=batch_size)
-
-    # Train Test split
-    xtrain = [feat_x[i_train], feat_grad[i_train]]
-    ytrain = [y1[i_train], y2[i_train]]
-    xval = [feat_x[i_val], feat_grad[i_val]]
-    yval = [y1[i_val], y2[i_val]]
+    # Fit scaler chunk-wise from the memory-mapped data.
+    for batch in data_train.iter_batches(batch_size=4096, keys=["geometries", "energies", "forces"]):
+        scaler.partial_fit(batch["geometries"], [batch["energies"], batch["forces"]])
+
+    def scale(batch):
+        return scaler.transform(batch["geometries"], [batch["energies"], batch["forces"]])
+
+    # Features of all samples are shared with the other models of the ensemble, e.g. for retraining.
+    features = None
+    if shared_feature_cache and feature_pipeline == "stream":
+        print("Warning: Shared feature cache is not used for 'stream' feature pipeline.")
+    elif shared_feature_cache:
+        feature_cache = FeatureCache(os.path.join(data_dir, FEATURE_CACHE_FOLDER))
+        features = feature_cache.get_or_compute(dataset, out_model, scaler, batch_size=batch_size)
+
+    # Model + Model precompute layer +feat, for train and test split
+    fit_data, xtrain, xval = make_feature_input(data_train, data_val, out_model, scale, batch_size=batch_size,
+                                                pipeline=feature_pipeline,
+                                                cache_dir=os.path.join(out_dir, "feature_cache"), features=features,
+                                                target_names=["energy", "force"])
 
     # Setting constant feature normalization
-    optimizer = tf.keras.optimizers.Adam(lr=learning_rate)
+    optimizer = get_precision_optimizer(tf.keras.optimizers.Adam(lr=learning_rate),
+                                        out_model.precision)
     lr_metric = get_lr_metric(optimizer)
     mae_energy = ScaledMeanAbsoluteError(scaling_shape=scaler.energy_std.shape)
     mae_force = ScaledMeanAbsoluteError(scaling_shape=scaler.gradient_std.shape)
@@ -154,9 +171,7 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
     print("")
     print("Start fit.")
     out_model.summary()
-    hist = out_model.fit(x=xtrain, y={'energy': ytrain[0], 'force': ytrain[1]}, epochs=epo, batch_size=batch_size,
-                         callbacks=cbks, validation_freq=epostep,
-                         validation_data=(xval, {'energy': yval[0], 'force': yval[1]}), verbose=2)
+    hist = out_model.fit(**fit_data, epochs=epo, callbacks=cbks, validation_freq=epostep, verbose=2)
     print("End fit.")
     print("")
     out_model.energy_only = False
@@ -170,16 +185,19 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
     scaler.save_weights(os.path.join(out_dir, "scaler_weights.npy"))
 
     # Plot and Save
-    yval_plot = [y[0][i_val], y[1][i_val]]
-    ytrain_plot = [y[0][i_train], y[1][i_train]]
-    # Convert back scaler
-    pval = out_model.predict(xval)
-    ptrain = out_model.predict(xtrain)
-    _, pval = scaler.inverse_transform(y=[pval['energy'], pval['force']])
-    _, ptrain = scaler.inverse_transform(y=[ptrain['energy'], ptrain['force']])
-
-    print("Info: Predicted Energy shape:", ptrain[0].shape)
-    print("Info: Predicted Gradient shape:", ptrain[1].shape)
+    # Predict each split once in batches and accumulate errors, so that no full split is held in memory.
+    def inverse_transform(y):
+        return scaler.inverse_transform(y=[y['energy'], y['force']])[1]
+
+    keys = ["energies", "forces"]
+    stats_val, _ = evaluate_split(out_model, xval, data_val, keys, inverse_transform, batch_size=batch_size)
+    stats_train, ptrain = evaluate_split(out_model, xtrain, data_train, keys, inverse_transform,
+                                         batch_size=batch_size)
+    pval_plot = [stats.scatter()[0] for stats in stats_val]
+    yval_plot = [stats.scatter()[1] for stats in stats_val]
+
+    print("Info: Predicted Energy shape of first batch:", ptrain[0].shape)
+    print("Info: Predicted Gradient shape of first batch:", ptrain[1].shape)
     print("Info: Plot fit stats...")
 
     # Plot
@@ -193,41 +211,41 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
 
     plot_learning_curve(hist.history['energy_lr'], filename='fit' + str(i), dir_save=dir_save)
 
-    plot_scatter_prediction(pval[0], yval_plot[0], save_plot_to_file=True, dir_save=dir_save,
+    plot_scatter_prediction(pval_plot[0], yval_plot[0], save_plot_to_file=True, dir_save=dir_save,
                             filename='fit' + str(i) + "_energy",
                             filetypeout='.png', unit_actual=unit_label_energy, unit_predicted=unit_label_energy,
                             plot_title="Prediction Energy")
 
-    plot_scatter_prediction(pval[1], yval_plot[1], save_plot_to_file=True, dir_save=dir_save,
+    plot_scatter_prediction(pval_plot[1], yval_plot[1], save_plot_to_file=True, dir_save=dir_save,
                             filename='fit' + str(i) + "_grad",
                             filetypeout='.png', unit_actual=unit_label_grad, unit_predicted=unit_label_grad,
                             plot_title="Prediction Gradient")
 
-    plot_error_vec_mean([pval[1], ptrain[1]], [yval_plot[1], ytrain_plot[1]],
-                        label_curves=["Validation gradients", "Training Gradients"], unit_predicted=unit_label_grad,
-                        filename='fit' + str(i) + "_grad", dir_save=dir_save, save_plot_to_file=True,
-                        filetypeout='.png', x_label='Gradients xyz * #atoms * #states ',
-                        plot_title="Gradient mean error")
-
-    plot_error_vec_max([pval[1], ptrain[1]], [yval_plot[1], ytrain_plot[1]],
-                       label_curves=["Validation", "Training"],
-                       unit_predicted=unit_label_grad, filename='fit' + str(i) + "_grad",
-                       dir_save=dir_save, save_plot_to_file=True, filetypeout='.png',
-                       x_label='Gradients xyz * #atoms * #states ', plot_title="Gradient max error")
-
-    pval = out_model.predict(xval)
-    ptrain = out_model.predict(xtrain)
-    _, pval = scaler.inverse_transform(y=[pval['energy'], pval['force']])
-    _, ptrain = scaler.inverse_transform(y=[ptrain['energy'], ptrain['force']])
+    plot_mean_error_curves([stats_val[1].mean_error(), stats_train[1].mean_error()],
+                           label_curves=["Validation gradients", "Training Gradients"], unit_predicted=unit_label_grad,
+                           filename='fit' + str(i) + "_grad", dir_save=dir_save, save_plot_to_file=True,
+                           filetypeout='.png', x_label='Gradients xyz * #atoms * #states ',
+                           plot_title="Gradient mean error")
+
+    plot_max_error_curves([stats_val[1].max_error()[0], stats_train[1].max_error()[0]],
+                          [stats_val[1].max_error()[1], stats_train[1].max_error()[1]],
+                          label_curves=["Validation", "Training"],
+                          unit_predicted=unit_label_grad, filename='fit' + str(i) + "_grad",
+                          dir_save=dir_save, save_plot_to_file=True, filetypeout='.png',
+                          x_label='Gradients xyz * #atoms * #states ', plot_title="Gradient max error")
+
+    # Compare precomputed features with full gradient computation for the first batch.
     out_model.precomputed_features = False
     out_model.output_as_dict = False
-    ptrain2 = out_model.predict(x_rescale[i_train])
+    x_check = data_train.batch(np.arange(len(ptrain[0])), keys=["geometries"])["geometries"]
+    x_train_rescale, _ = scaler.transform(x=x_check)
+    ptrain2 = out_model.predict(x_train_rescale)
     _, ptrain2 = scaler.inverse_transform(y=[ptrain2[0], ptrain2[1]])
     print("Info: Max error precomputed and full gradient computation:")
     print("Energy", np.max(np.abs(ptrain[0] - ptrain2[0])))
     print("Gradient", np.max(np.abs(ptrain[1] - ptrain2[1])))
-    error_val = [np.mean(np.abs(pval[0] - y[0][i_val])), np.mean(np.abs(pval[1] - y[1][i_val]))]
-    error_train = [np.mean(np.abs(ptrain[0] - y[0][i_train])), np.mean(np.abs(ptrain[1] - y[1][i_train]))]
+    error_val = [stats_val[0].mae(), stats_val[1].mae()]
+    error_train = [stats_train[0].mae(), stats_train[1].mae()]
     print("error_val:", error_val)
     print("error_train:", error_train)
     error_dict = {"train": [error_train[0].tolist(), error_train[1].tolist()],
@@ -14,6 +14,7 @@ parser.add_argument("-i", "--index", required=True, help="Index of the NN to tra
 parser.add_argument("-f", "--filepath", required=True, help="Filepath to weights, hyperparameter, data etc. ")
 parser.add_argument("-g", "--gpus", default=-1, required=True, help="Index of gpu to use")
 parser.add_argument("-m", "--mode", default="training", required=True, help="Which mode to use train or retrain")
+parser.add_argument("-c", "--cpus", default=None, help="Comma separated list of cpu indices to use")
 args = vars(parser.parse_args())
 
 fstdout = open(os.path.join(args['filepath'], "fitlog.txt"), 'w')
@@ -22,8 +23,10 @@ sys.stdout = fstdout
 
 print("Input argpars:", args)
 
-from pyNNsMD.src.device import set_gpu
+from pyNNsMD.src.device import set_gpu, set_cpu
 
+if args['cpus'] is not None:
+    set_cpu([int(x) for x in args['cpus'].split(",")])
 set_gpu([int(args['gpus'])])
 print("Logic Devices:", tf.config.experimental.list_logical_devices('GPU'))
 
@@ -32,7 +35,9 @@ import pyNNsMD.utils.activ
 from pyNNsMD.models.schnet_eg import SchNetEnergy
 from pyNNsMD.scaler.energy import EnergyGradientStandardScaler
 from pyNNsMD.utils.loss import get_lr_metric, ScaledMeanAbsoluteError, r2_metric, ZeroEmptyLoss
-from pyNNsMD.utils.data import load_json_file, read_xyz_file, save_json_file
+from pyNNsMD.utils.precision import get_precision_optimizer
+from pyNNsMD.utils.data import load_json_file, save_json_file
+from pyNNsMD.datasets.store import load_dataset
 from pyNNsMD.plots.loss import plot_loss_curves, plot_learning_curve
 from pyNNsMD.plots.pred import plot_scatter_prediction
 from pyNNsMD.plots.error import plot_error_vec_mean, plot_error_vec_max
@@ -93,6 +98,7 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
             # tf.keras.utils.get_registered_object()
             cb = tf.keras.utils.deserialize_keras_object(cb_item)
             cbks.append(cb)
+    cbks.append(pyNNsMD.utils.callbacks.FitProgressCallback(model_index=i))
 
     # Make all Model
     assert model_config["class_name"] == "SchNetEnergy", "Training script only for EnergyModel"
@@ -102,13 +108,13 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
 
     # Load data.
     data_dir = os.path.dirname(out_dir)
-    xyz = read_xyz_file(os.path.join(data_dir, "geometries.xyz"))
-    x = np.array([x[1] for x in xyz])
-    coords = [np.array(x[1]) for x in xyz]
-    atoms = [np.array([global_proton_dict[at] for at in x[0]]) for x in xyz]
+    dataset = load_dataset(data_dir, ["atoms", "geometries", "energies", "forces"])
+    x = np.asarray(dataset["geometries"])
+    coords = [np.array(x) for x in dataset["geometries"]]
+    atoms = [np.array([global_proton_dict[at] for at in x]) for x in dataset["atoms"]]
     X = out_model.predict_to_tensor_input([atoms, coords])
-    y1 = np.array(load_json_file(os.path.join(data_dir, "energies.json")))
-    y2 = np.array(load_json_file(os.path.join(data_dir, "forces.json")))
+    y1 = np.array(dataset["energies"])
+    y2 = np.array(dataset["forces"])
     print("INFO: Shape of y", y1.shape, y2.shape)
     y = [y1, y2]
 
@@ -138,7 +144,8 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
 
     # Compile model
     # This is only for metric to without std.
-    optimizer = tf.keras.optimizers.Adam(lr=learning_rate)
+    optimizer = get_precision_optimizer(tf.keras.optimizers.Adam(lr=learning_rate),
+                                        out_model.precision)
     lr_metric = get_lr_metric(optimizer)
     mae_energy = ScaledMeanAbsoluteError(scaling_shape=scaler.energy_std.shape)
     mae_force = ScaledMeanAbsoluteError(scaling_shape=scaler.gradient_std.shape)
@@ -19,6 +19,7 @@ parser.add_argument("-i", "--index", required=True, help="Index of the NN to tra
 parser.add_argument("-f", "--filepath", required=True, help="Filepath to weights, hyperparameter, data etc. ")
 parser.add_argument("-g", "--gpus", default=-1, required=True, help="Index of gpu to use")
 parser.add_argument("-m", "--mode", default="training", required=True, help="Which mode to use train or retrain")
+parser.add_argument("-c", "--cpus", default=None, help="Comma separated list of cpu indices to use")
 args = vars(parser.parse_args())
 
 file_std_out = open(os.path.join(args['filepath'], "fitlog.txt"), 'w')
@@ -27,15 +28,18 @@ sys.stdout = file_std_out
 
 print("Input argpars:", args)
 
-from pyNNsMD.src.device import set_gpu
+from pyNNsMD.src.device import set_gpu, set_cpu
 
+if args['cpus'] is not None:
+    set_cpu([int(x) for x in args['cpus'].split(",")])
 set_gpu([int(args['gpus'])])
 print("Logic Devices:", tf.config.experimental.list_logical_devices('GPU'))
 
 import pyNNsMD.utils.callbacks
 import pyNNsMD.utils.activ
 from pyNNsMD.models.schnet_kgcnn import SchnetEnergy
-from pyNNsMD.utils.data import load_json_file, read_xyz_file, save_json_file
+from pyNNsMD.utils.data import load_json_file, save_json_file
+from pyNNsMD.datasets.store import load_dataset
 from pyNNsMD.scaler.energy import EnergyStandardScaler
 from pyNNsMD.utils.loss import ScaledMeanAbsoluteError, get_lr_metric, r2_metric
 from pyNNsMD.plots.loss import plot_loss_curves, plot_learning_curve
@@ -78,12 +82,12 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
 
     # Load data.
     data_dir = os.path.dirname(out_dir)
-    xyz = read_xyz_file(os.path.join(data_dir, "geometries.xyz"))
-    coords = [np.array(x[1]) for x in xyz]
-    atoms = [np.array([global_proton_dict[at] for at in x[0]]) for x in xyz]
+    dataset = load_dataset(data_dir, ["atoms", "geometries", "energies"])
+    coords = [np.array(x) for x in dataset["geometries"]]
+    atoms = [np.array([global_proton_dict[at] for at in x]) for x in dataset["atoms"]]
     range_indices = [define_adjacency_from_distance(coordinates_to_distancematrix(x),
                                                     max_distance=range_dist)[1] for x in coords]
-    y = load_json_file(os.path.join(data_dir, "energies.json"))
+    y = dataset["energies"]
     y = np.array(y)
 
     # Fit stats dir
@@ -97,6 +101,7 @@ def train_model_energy(i=0, out_dir=None, mode='training'):
             # tf.keras.utils.get_registered_object()
             cb = tf.keras.utils.deserialize_keras_object(cb_item)
             cbks.append(cb)
+    cbks.append(pyNNsMD.utils.callbacks.FitProgressCallback(model_index=i))
 
     # Make Model
     # Only works for Energy model here
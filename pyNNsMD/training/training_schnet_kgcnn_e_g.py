@@ -14,6 +14,7 @@ parser.add_argument("-i", "--index", required=True, help="Index of the NN to tra
 parser.add_argument("-f", "--filepath", required=True, help="Filepath to weights, hyperparameter, data etc. ")
 parser.add_argument("-g", "--gpus", default=-1, required=True, help="Index of gpu to use")
 parser.add_argument("-m", "--mode", default="training", required=True, help="Which mode to use train or retrain")
+parser.add_argument("-c", "--cpus", default=None, help="Comma separated list of cpu indices to use")
 args = vars(parser.parse_args())
 
 fstdout = open(os.path.join(args['filepath'], "fitlog.txt"), 'w')
@@ -22,8 +23,10 @@ sys.stdout = fstdout
 
 print("Input argpars:", args)
 
-from pyNNsMD.src.device import set_gpu
+from pyNNsMD.src.device import set_gpu, set_cpu
 
+if args['cpus'] is not None:
+    set_cpu([int(x) for x in args['cpus'].split(",")])
 set_gpu([int(args['gpus'])])
 print("Logic Devices:", tf.config.experimental.list_logical_devices('GPU'))
 
@@ -32,7 +35,8 @@ import pyNNsMD.utils.activ
 from pyNNsMD.models.schnet_kgcnn import SchnetEnergy
 from pyNNsMD.scaler.energy import EnergyGradientStandardScaler
 from pyNNsMD.utils.loss import get_lr_metric, ScaledMeanAbsoluteError, r2_metric, ZeroEmptyLoss
-from pyNNsMD.utils.data import load_json_file, read_xyz_file, save_json_file
+from pyNNsMD.utils.data import load_json_file, save_json_file
+from pyNNsMD.datasets.store import load_dataset
 from pyNNsMD.plots.loss import plot_loss_curves, plot_learning_curve
 from pyNNsMD.plots.pred import plot_scatter_prediction
 from pyNNsMD.plots.error import plot_error_vec_mean, plot_error_vec_max
@@ -80,15 +84,15 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
 
     # Load data.
     data_dir = os.path.dirname(out_dir)
-    xyz = read_xyz_file(os.path.join(data_dir, "geometries.xyz"))
-    x = np.array([x[1] for x in xyz])
-    coords = [np.array(x[1]) for x in xyz]
-    atoms = [np.array([global_proton_dict[at] for at in x[0]]) for x in xyz]
+    dataset = load_dataset(data_dir, ["atoms", "geometries", "energies", "forces"])
+    x = np.asarray(dataset["geometries"])
+    coords = [np.array(x) for x in dataset["geometries"]]
+    atoms = [np.array([global_proton_dict[at] for at in x]) for x in dataset["atoms"]]
     range_indices = [define_adjacency_from_distance(coordinates_to_distancematrix(x),
                                                     max_distance=range_dist)[1] for x in coords]
 
-    y1 = np.array(load_json_file(os.path.join(data_dir, "energies.json")))
-    y2 = np.array(load_json_file(os.path.join(data_dir, "forces.json")))
+    y1 = np.array(dataset["energies"])
+    y2 = np.array(dataset["forces"])
     print("INFO: Shape of y", y1.shape, y2.shape)
     y = [y1, y2]
 
@@ -103,6 +107,7 @@ def train_model_energy_gradient(i=0, out_dir=None, mode='training'):
             # tf.keras.utils.get_registered_object()
             cb = tf.keras.utils.deserialize_keras_object(cb_item)
             cbks.append(cb)
+    cbks.append(pyNNsMD.utils.callbacks.FitProgressCallback(model_index=i))
 
     # Index train test split
     print("Info: Train-Test split at Train:", len(i_train), "Test", len(i_val), "Total", len(x))
@@ -37,4 +37,4 @@ def shifted_softplus(x):
         tf.tensor: Activation.
 
     """
-    return ks.activations.softplus(x) - ks.backend.log(2.0)
+    return ks.activations.softplus(x) - tf.cast(ks.backend.log(2.0), x.dtype)
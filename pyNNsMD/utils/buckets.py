@@ -0,0 +1,110 @@
+"""
+Padding of the batch dimension to a small set of bucket sizes.
+
+A `tf.function` is traced, and with XLA also compiled, for each new input shape. Padding the batch to the next power
+of two bounds the number of traces by the logarithm of the largest batch, e.g. for the last chunk of a dataset or a
+changing number of trajectories in MD. Samples are padded by repeating the last sample, so that features like inverse
+distances stay finite, and the output of the padded samples is removed.
+
+.. code-block:: python
+
+    y = call_in_bucket(model, x)
+
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def get_bucket_size(size: int, min_size: int = 1):
+    """Smallest power of two that is larger or equal to `size`.
+
+    Args:
+        size (int): Number of samples.
+        min_size (int): Smallest bucket. Default is 1.
+
+    Returns:
+        int: Bucket size.
+    """
+    return int(2 ** int(np.ceil(np.log2(max(size, min_size, 1)))))
+
+
+def get_padded_length(num_samples: int, batch_size: int):
+    """Number of samples to split into batches of the same shape.
+
+    Args:
+        num_samples (int): Number of samples.
+        batch_size (int): Batch size.
+
+    Returns:
+        int: Bucket size if `num_samples` is smaller than `batch_size`, otherwise the next multiple of `batch_size`.
+    """
+    if num_samples <= batch_size:
+        return min(get_bucket_size(num_samples), batch_size)
+    return int(np.ceil(num_samples / batch_size)) * batch_size
+
+
+def pad_batch_to_size(x, size: int):
+    """Pad the first axis of arrays or tensors to `size` by repeating the last sample.
+
+    Args:
+        x: Nested structure of np.ndarray or tf.Tensor with the same first dimension.
+        size (int): Size of first axis after padding.
+
+    Returns:
+        Padded structure of `x`.
+    """
+    def pad(x_i):
+        if isinstance(x_i, np.ndarray):
+            return x_i[np.minimum(np.arange(size), len(x_i) - 1)]
+        return tf.gather(x_i, tf.minimum(tf.range(size), tf.shape(x_i)[0] - 1), axis=0)
+
+    return tf.nest.map_structure(pad, x)
+
+
+def slice_batch(y, size: int):
+    """Remove padded samples from the first axis of a nested structure."""
+    return tf.nest.map_structure(lambda y_i: y_i[:size], y)
+
+
+def call_in_bucket(function, x, min_size: int = 1):
+    """Call a function on input that is padded to the bucket size and remove the padded samples of the output.
+
+    Args:
+        function (callable): Function of `x` with output of the same first dimension, e.g. a `tf.function`.
+        x: Nested structure of np.ndarray or tf.Tensor.
+        min_size (int): Smallest bucket. Default is 1.
+
+    Returns:
+        Output of `function` for the samples of `x`.
+    """
+    size = tf.nest.flatten(x)[0].shape[0]
+    if size is None:
+        # Symbolic batch dimension, e.g. in a `tf.data` map, which is traced only once.
+        return function(x)
+    size = int(size)
+    bucket = get_bucket_size(size, min_size)
+    if bucket == size:
+        return function(x)
+    return slice_batch(function(pad_batch_to_size(x, bucket)), size)
+
+
+def predict_in_buckets(predict, x, batch_size: int = None, **kwargs):
+    """Keras predict with input padded to full batches, so that the last batch is not traced or compiled again.
+
+    Args:
+        predict (callable): Predict method of a keras model.
+        x: Nested structure of np.ndarray or tf.Tensor. A `tf.data.Dataset` is passed without padding.
+        batch_size (int): Batch size. Default is None, which uses 32 like keras.
+        **kwargs: Further arguments of `predict`.
+
+    Returns:
+        Output of `predict` for the samples of `x`.
+    """
+    if isinstance(x, tf.data.Dataset):
+        return predict(x, batch_size=batch_size, **kwargs)
+    batch_size = 32 if batch_size is None else int(batch_size)
+    num_samples = int(tf.nest.flatten(x)[0].shape[0])
+    padded_length = get_padded_length(num_samples, batch_size)
+    y = predict(pad_batch_to_size(x, padded_length), batch_size=min(batch_size, padded_length), **kwargs)
+    return slice_batch(y, num_samples)
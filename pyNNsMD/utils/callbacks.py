@@ -4,6 +4,56 @@ import time
 import numpy as np
 import tensorflow as tf
 
+# Function that receives the progress of a fit, e.g. to send it to a parent process. None disables reporting.
+_progress_handler = None
+
+
+def set_progress_handler(handler):
+    """Set the function that receives the progress of :obj:`FitProgressCallback`.
+
+    Args:
+        handler (callable): Function that takes a progress dictionary. None disables the reporting.
+    """
+    global _progress_handler
+    _progress_handler = handler
+
+
+class FitProgressCallback(tf.keras.callbacks.Callback):
+    """Report epoch, losses and estimated remaining time of a fit to the handler of :obj:`set_progress_handler`.
+
+    The callback does nothing if no handler is set, so that it can always be added in training scripts.
+    """
+
+    def __init__(self, model_index: int = 0, epochs: int = None):
+        """Initialize callback.
+
+        Args:
+            model_index (int): Index of the model in the ensemble. Default is 0.
+            epochs (int): Total number of epochs. Default is None, which takes the value from keras params.
+        """
+        super(FitProgressCallback, self).__init__()
+        self.model_index = int(model_index)
+        self.epochs = epochs
+        self._time_start = None
+
+    def on_train_begin(self, logs=None):
+        self._time_start = time.time()
+        if self.epochs is None:
+            self.epochs = self.params.get("epochs") if self.params is not None else None
+
+    def on_epoch_end(self, epoch, logs=None):
+        if _progress_handler is None:
+            return
+        elapsed = time.time() - self._time_start
+        eta = None
+        if self.epochs is not None:
+            eta = elapsed / (epoch + 1) * max(self.epochs - epoch - 1, 0)
+        _progress_handler({
+            "model_index": self.model_index, "epoch": epoch + 1, "epochs": self.epochs,
+            "elapsed": elapsed, "eta": eta,
+            "logs": {key: float(value) for key, value in (logs or {}).items() if np.ndim(value) == 0}
+        })
+
 
 @tf.keras.utils.register_keras_serializable(package='pyNNsMD', name='StepWiseLearningScheduler')
 class StepWiseLearningScheduler(tf.keras.callbacks.LearningRateScheduler):
@@ -3,7 +3,65 @@ import logging
 import yaml
 import json
 import os
+import numpy as np
 from importlib.machinery import SourceFileLoader
+from pyNNsMD.utils.xyz import format_xyz_frame, write_xyz_file, iter_xyz_chunks
+
+# Cache of parsed files, which is disabled by default. Can be enabled for long-running processes like training workers.
+_file_cache = None
+
+
+def set_file_cache(enabled: bool = True):
+    """Enable or disable the in-memory cache of :obj:`cached_read`.
+
+    Files are identified by path, modification time and size, so that changed files are read again.
+    The cached content is shared between calls and not copied. Numpy arrays in the content are made read-only.
+
+    Args:
+        enabled (bool): Whether to enable the cache. Disabling removes all cached files. Default is True.
+    """
+    global _file_cache
+    _file_cache = {} if enabled else None
+
+
+def _set_read_only(content):
+    if isinstance(content, np.ndarray):
+        content.setflags(write=False)
+    elif isinstance(content, (list, tuple)):
+        for x in content:
+            _set_read_only(x)
+    elif isinstance(content, dict):
+        for x in content.values():
+            _set_read_only(x)
+    elif hasattr(content, "__dict__"):
+        # E.g. a RaggedArray that holds its values as arrays.
+        for x in vars(content).values():
+            _set_read_only(x)
+    return content
+
+
+def cached_read(read_function, file_path, *args):
+    """Read a file with `read_function` or return its content from the file cache, if enabled by
+    :obj:`set_file_cache`.
+
+    Args:
+        read_function (callable): Function that reads the file with signature `read_function(file_path, *args)`.
+            The content should be numpy arrays, which are shared read-only between calls.
+        file_path (str): Path of the file.
+        *args: Further arguments of `read_function`.
+
+    Returns:
+        Content of the file.
+    """
+    if _file_cache is None:
+        return read_function(file_path, *args)
+    file_path = os.path.realpath(file_path)
+    stat = os.stat(file_path)
+    key = (read_function.__module__, read_function.__name__, file_path, args)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if key not in _file_cache or _file_cache[key][0] != version:
+        _file_cache[key] = (version, _set_read_only(read_function(file_path, *args)))
+    return _file_cache[key][1]
 
 
 def save_pickle_file(outlist, filepath):
@@ -79,19 +137,7 @@ def parse_list_to_xyz_str(mol: list, comment: str = ""):
     Returns:
         str: Information in xyz-string format.
     """
-    atoms = mol[0]
-    coordinates = mol[1]
-    if len(atoms) != len(coordinates):
-        raise ValueError("Number of atoms does not match number of coordinates for xyz string.")
-    xyz_str = str(int(len(atoms))) + "\n"
-    if "\n" in comment:
-        raise ValueError("Line break must not be in the comment line for xyz string.")
-    xyz_str = xyz_str + comment + "\n"
-    for a_iter, c_iter in zip(atoms, coordinates):
-        _at_str = str(a_iter)
-        _c_format_str = " {:.10f}" * len(c_iter) + "\n"
-        xyz_str = xyz_str + _at_str + _c_format_str.format(*c_iter)
-    return xyz_str
+    return format_xyz_frame(mol[0], mol[1], comment=comment)
 
 
 def write_list_to_xyz_file(filepath: str, mol_list: list):
@@ -101,10 +147,7 @@ def write_list_to_xyz_file(filepath: str, mol_list: list):
         mol_list (list): List of molecules, which is a list of pairs of atoms and coordinates of
             `[[['C', 'H', ... ], [[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], ... ]], ... ]`.
     """
-    with open(filepath, "w+") as file:
-        for x in mol_list:
-            xyz_str = parse_list_to_xyz_str(x)
-            file.write(xyz_str)
+    write_xyz_file(filepath, [x[0] for x in mol_list], [x[1] for x in mol_list], mode="w+")
 
 
 def read_xyz_file(file_path, delimiter: str = None, line_by_line=False):
@@ -118,6 +161,18 @@ def read_xyz_file(file_path, delimiter: str = None, line_by_line=False):
     Returns:
         list: Nested coordinates from xyz-file.
     """
+    # Chunks of frames are parsed by numpy. Other formats, e.g. with more columns, are parsed line by line.
+    try:
+        mol_list = []
+        for elements, coordinates, _ in iter_xyz_chunks(file_path, delimiter=delimiter):
+            mol_list.extend([[e.tolist(), c.tolist()] for e, c in zip(elements, coordinates)])
+        return mol_list
+    except ValueError:
+        logging.info("Reading xyz file %s line by line." % file_path)
+    return _read_xyz_file_lines(file_path, delimiter, line_by_line)
+
+
+def _read_xyz_file_lines(file_path, delimiter: str = None, line_by_line=False):
     mol_list = []
     comment_list = []
     # open file
@@ -0,0 +1,106 @@
+"""
+Inference functions of models with a fixed input signature.
+
+A model that implements `get_input_signature()` is traced once into a concrete function with a `None` batch
+dimension, which is then reused for any number of samples without tracing again. The time of tracing and of the first
+calls is recorded, so that a warm-up on load can confirm that the first MD step already runs at steady-state latency.
+
+.. code-block:: python
+
+    inference = InferenceFunction(model)
+    y = inference(x)
+    print(inference.timings)
+
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def get_input_signature(model):
+    """Input signature for inference of a model.
+
+    Args:
+        model (ks.Model): Model that implements `get_input_signature()`.
+
+    Returns:
+        list: List of `tf.TensorSpec` or None, if the model does not define a signature.
+    """
+    if not hasattr(model, "get_input_signature"):
+        return None
+    return model.get_input_signature()
+
+
+class InferenceFunction:
+    """Concrete function of a model in inference mode for a fixed input signature."""
+
+    def __init__(self, model, input_signature: list = None):
+        """Trace the concrete function of the model.
+
+        Args:
+            model (ks.Model): Model to call with `training=False`.
+            input_signature (list): List of `tf.TensorSpec` of the model input. Default is None, which uses
+                :obj:`get_input_signature()` of the model.
+        """
+        self.model = model
+        self.input_signature = get_input_signature(model) if input_signature is None else list(input_signature)
+        if self.input_signature is None:
+            raise ValueError("Model %s does not define an input signature." % type(model).__name__)
+        start = time.perf_counter()
+        self._function = tf.function(self._call_model, input_signature=self.input_signature)
+        self.concrete_function = self._function.get_concrete_function()
+        self.timings = {"trace": time.perf_counter() - start}
+
+    def _call_model(self, *args):
+        inputs = args[0] if len(args) == 1 else list(args)
+        return self.model(inputs, training=False)
+
+    def __call__(self, x):
+        """Call the model for input that matches the signature up to its dtype.
+
+        Args:
+            x: Input array or list of input arrays of the model.
+
+        Returns:
+            Output of the model as tensors.
+        """
+        x_flat = tf.nest.flatten(x)
+        if len(x_flat) != len(self.input_signature):
+            raise ValueError("Expected %s inputs, but got %s." % (len(self.input_signature), len(x_flat)))
+        return self.concrete_function(*[tf.cast(x_i, spec.dtype) for x_i, spec in zip(x_flat, self.input_signature)])
+
+    def dummy_input(self, batch_size: int = 1):
+        """Input of zeros for the signature, in which unknown dimensions other than the batch have size one.
+
+        Args:
+            batch_size (int): Number of samples. Default is 1.
+
+        Returns:
+            np.ndarray or list: Input arrays in the structure of the model input.
+        """
+        x = [np.zeros([batch_size] + [1 if dim is None else dim for dim in spec.shape.as_list()[1:]],
+                      dtype=spec.dtype.as_numpy_dtype) for spec in self.input_signature]
+        return x[0] if len(x) == 1 else x
+
+    def warmup(self, batch_size: int = 1, predict: bool = True):
+        """Call the function and optionally keras predict on dummy input and record the time of each call.
+
+        Args:
+            batch_size (int): Number of samples of the dummy input. Default is 1.
+            predict (bool): Whether to also trace the predict function of the keras model. Default is True.
+
+        Returns:
+            dict: Time in seconds of tracing, the first and second call and the first call of predict.
+        """
+        x = self.dummy_input(batch_size)
+        for key in ["first_call", "second_call"]:
+            start = time.perf_counter()
+            tf.nest.map_structure(lambda y: y.numpy(), self(x))
+            self.timings[key] = time.perf_counter() - start
+        if predict:
+            start = time.perf_counter()
+            self.model.predict(x, verbose=0)
+            self.timings["predict"] = time.perf_counter() - start
+        return self.timings
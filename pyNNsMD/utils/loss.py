@@ -18,8 +18,10 @@ class ScaledMeanAbsoluteError(tf.keras.metrics.MeanAbsoluteError):
             ks.backend.set_value(self.count, 0)
 
     def update_state(self, y_true, y_pred, sample_weight=None):
-        y_true = self.scale * y_true
-        y_pred = self.scale * y_pred
+        # Output of models can be float64 or float32 from mixed precision.
+        scale = tf.cast(self.scale, y_pred.dtype)
+        y_true = scale * tf.cast(y_true, y_pred.dtype)
+        y_pred = scale * y_pred
         return super(ScaledMeanAbsoluteError, self).update_state(y_true, y_pred, sample_weight=sample_weight)
 
     def get_config(self):
@@ -78,6 +80,7 @@ def r2_metric(y_true, y_pred):
         tf.tensor: r2 metric.
 
     """
+    y_true = tf.cast(y_true, y_pred.dtype)
     ss_res = ks.backend.sum(ks.backend.square(y_true - y_pred))
     ss_tot = ks.backend.sum(ks.backend.square(y_true - ks.backend.mean(y_true)))
     return 1 - ss_res / (ss_tot + ks.backend.epsilon())
@@ -0,0 +1,208 @@
+"""
+Neighbor lists of the nearest atoms within a cutoff for models with edge indices like SchNet.
+
+A :obj:`NeighborList` is stateful and keeps candidate pairs within the cutoff plus a Verlet skin for each molecule in
+the batch. The candidates are reused until an atom has moved more than half the skin since the last build, which is
+the usual case for small time steps in MD. Then only the distances of the candidate pairs are recomputed. Candidates
+are found from the full distance matrix for small molecules and with an O(N) cell list for large systems.
+
+.. code-block:: python
+
+    neighbors = NeighborList(cutoff=4.0, max_neighbours=10, skin=1.0)
+    index, mask = neighbors([coordinates])  # list of (atoms, max_neighbours) index and mask of each molecule.
+
+"""
+
+import itertools
+
+import numpy as np
+
+NEIGHBOR_METHODS = ["auto", "brute", "cell"]
+
+
+def candidate_pairs_brute(coordinates: np.ndarray, cutoff: float):
+    """Find all pairs of atoms within cutoff from the full distance matrix.
+
+    Args:
+        coordinates (np.ndarray): Coordinates of shape (atoms, 3).
+        cutoff (float): Cutoff distance.
+
+    Returns:
+        tuple: Index of the first and second atom of each pair, excluding self-pairs.
+    """
+    diff = np.expand_dims(coordinates, axis=1) - np.expand_dims(coordinates, axis=0)
+    dist = np.sqrt(np.sum(np.square(diff), axis=-1))
+    np.fill_diagonal(dist, np.inf)
+    pair_i, pair_j = np.nonzero(dist <= cutoff)
+    return pair_i.astype("int64"), pair_j.astype("int64")
+
+
+def candidate_pairs_cell(coordinates: np.ndarray, cutoff: float):
+    """Find all pairs of atoms within cutoff with a cell list.
+
+    Atoms are sorted into cubic cells with the size of the cutoff, so that only the 27 neighbouring cells of each atom
+    have to be searched.
+
+    Args:
+        coordinates (np.ndarray): Coordinates of shape (atoms, 3).
+        cutoff (float): Cutoff distance.
+
+    Returns:
+        tuple: Index of the first and second atom of each pair, excluding self-pairs.
+    """
+    num_atoms = len(coordinates)
+    cell = np.floor((coordinates - np.amin(coordinates, axis=0)) / cutoff).astype("int64")
+    dims = np.amax(cell, axis=0) + 1
+    cell_id = np.ravel_multi_index(cell.T, dims)
+    order = np.argsort(cell_id, kind="stable")
+    occupied, cell_start, cell_count = np.unique(cell_id[order], return_index=True, return_counts=True)
+    pair_i, pair_j = [], []
+    for offset in itertools.product([-1, 0, 1], repeat=3):
+        neighbor_cell = cell + np.array(offset, dtype="int64")
+        valid = np.all(np.logical_and(neighbor_cell >= 0, neighbor_cell < dims), axis=1)
+        atom_i = np.arange(num_atoms)[valid]
+        neighbor_id = np.ravel_multi_index(neighbor_cell[valid].T, dims)
+        position = np.minimum(np.searchsorted(occupied, neighbor_id), len(occupied) - 1)
+        found = occupied[position] == neighbor_id
+        atom_i, position = atom_i[found], position[found]
+        count = cell_count[position]
+        # Expand each atom to all atoms of the neighbouring cell.
+        within_cell = np.arange(np.sum(count)) - np.repeat(np.cumsum(count) - count, count)
+        pair_i.append(np.repeat(atom_i, count))
+        pair_j.append(order[np.repeat(cell_start[position], count) + within_cell])
+    pair_i, pair_j = np.concatenate(pair_i), np.concatenate(pair_j)
+    dist = np.sqrt(np.sum(np.square(coordinates[pair_i] - coordinates[pair_j]), axis=-1))
+    keep = np.logical_and(pair_i != pair_j, dist <= cutoff)
+    return pair_i[keep].astype("int64"), pair_j[keep].astype("int64")
+
+
+def nearest_neighbors_from_pairs(coordinates: np.ndarray, pair_i: np.ndarray, pair_j: np.ndarray, cutoff: float,
+                                 max_neighbours: int = None):
+    """Select the nearest neighbours within cutoff of each atom from candidate pairs.
+
+    Args:
+        coordinates (np.ndarray): Coordinates of shape (atoms, 3).
+        pair_i (np.ndarray): Index of the first atom of candidate pairs.
+        pair_j (np.ndarray): Index of the second atom of candidate pairs.
+        cutoff (float): Cutoff distance.
+        max_neighbours (int): Maximum number of neighbours. Default is None, which allows all atoms.
+
+    Returns:
+        tuple: Neighbour index of shape (atoms, width) sorted by distance and boolean mask of shape (atoms, width),
+            where width is `min(max_neighbours, atoms - 1)`. Slots without a neighbour within cutoff are masked and
+            have index 0, which must not be used without the mask.
+    """
+    num_atoms = len(coordinates)
+    width = num_atoms - 1 if max_neighbours is None else min(int(max_neighbours), num_atoms - 1)
+    width = max(width, 0)
+    dist = np.sqrt(np.sum(np.square(coordinates[pair_i] - coordinates[pair_j]), axis=-1))
+    keep = dist < cutoff
+    pair_i, pair_j, dist = pair_i[keep], pair_j[keep], dist[keep]
+    order = np.lexsort((dist, pair_i))
+    pair_i, pair_j = pair_i[order], pair_j[order]
+    count = np.bincount(pair_i, minlength=num_atoms)
+    rank = np.arange(len(pair_i)) - np.repeat(np.cumsum(count) - count, count)
+    selected = rank < width
+    # Masked slots are filled with index 0.
+    index = np.zeros((num_atoms, width), dtype="int64")
+    mask = np.zeros((num_atoms, width), dtype="bool")
+    index[pair_i[selected], rank[selected]] = pair_j[selected]
+    mask[pair_i[selected], rank[selected]] = True
+    return index, mask
+
+
+class NeighborList:
+    """Stateful neighbour list with Verlet skin for a batch of molecules."""
+
+    def __init__(self, cutoff: float, max_neighbours: int = None, skin: float = 0.0, method: str = "auto",
+                 cell_list_atoms: int = 512):
+        """Initialize neighbour list.
+
+        Args:
+            cutoff (float): Cutoff distance of neighbours.
+            max_neighbours (int): Maximum number of nearest neighbours per atom. Default is None.
+            skin (float): Verlet skin added to the cutoff for candidate pairs. Candidates are rebuilt if an atom moved
+                more than `skin/2`. Default is 0.0, which rebuilds for any displacement and keeps no candidates.
+            method (str): Method to find candidate pairs "brute", "cell" or "auto". Default is "auto".
+            cell_list_atoms (int): Number of atoms from which "auto" uses a cell list. Default is 512.
+        """
+        if method not in NEIGHBOR_METHODS:
+            raise ValueError("Unknown neighbor list method %s, must be in %s." % (method, NEIGHBOR_METHODS))
+        if skin < 0:
+            raise ValueError("Verlet skin must be positive, but got %s." % skin)
+        self.cutoff = float(cutoff)
+        self.max_neighbours = max_neighbours
+        self.skin = float(skin)
+        self.method = method
+        self.cell_list_atoms = int(cell_list_atoms)
+        self.num_builds = 0
+        self.num_updates = 0
+        self._states = []
+
+    def reset(self):
+        """Remove the candidate pairs of all molecules."""
+        self._states = []
+
+    def _build(self, coordinates: np.ndarray):
+        use_cell = self.method == "cell" or (self.method == "auto" and len(coordinates) >= self.cell_list_atoms)
+        if use_cell:
+            pairs = candidate_pairs_cell(coordinates, self.cutoff + self.skin)
+        else:
+            pairs = candidate_pairs_brute(coordinates, self.cutoff + self.skin)
+        self.num_builds += 1
+        return {"coordinates": np.array(coordinates), "pairs": pairs}
+
+    def _needs_build(self, state, coordinates: np.ndarray):
+        if state is None or state["coordinates"].shape != coordinates.shape:
+            return True
+        displacement = np.sqrt(np.amax(np.sum(np.square(coordinates - state["coordinates"]), axis=-1)))
+        return displacement > self.skin / 2
+
+    def update(self, coordinates: np.ndarray, position: int = 0, keep_state: bool = True):
+        """Neighbour index and mask of a single molecule.
+
+        Args:
+            coordinates (np.ndarray): Coordinates of shape (atoms, 3).
+            position (int): Position of the molecule in the batch to keep its candidate pairs. Default is 0.
+            keep_state (bool): Whether to keep the candidate pairs for the next update. Candidate pairs are never
+                kept for zero skin, since they can not be reused. Default is True.
+
+        Returns:
+            tuple: Neighbour index of shape (atoms, width) and boolean mask of shape (atoms, width).
+        """
+        coordinates = np.asarray(coordinates)
+        self.num_updates += 1
+        if not keep_state or self.skin <= 0:
+            pair_i, pair_j = self._build(coordinates)["pairs"]
+            return nearest_neighbors_from_pairs(coordinates, pair_i, pair_j, self.cutoff, self.max_neighbours)
+        if len(self._states) <= position:
+            self._states.extend([None] * (position + 1 - len(self._states)))
+        if self._needs_build(self._states[position], coordinates):
+            self._states[position] = self._build(coordinates)
+        pair_i, pair_j = self._states[position]["pairs"]
+        return nearest_neighbors_from_pairs(coordinates, pair_i, pair_j, self.cutoff, self.max_neighbours)
+
+    def __call__(self, coordinates: list, keep_state: bool = True):
+        """Neighbour index and mask of a batch of molecules.
+
+        Candidate pairs are kept for each position in the batch, e.g. for each trajectory in MD.
+
+        Args:
+            coordinates (list): List of coordinates of shape (atoms, 3) or array of shape (batch, atoms, 3).
+            keep_state (bool): Whether to keep the candidate pairs of the batch. If False, the candidate pairs of
+                previous batches are removed, e.g. for the prediction of a dataset. Default is True.
+
+        Returns:
+            tuple: List of neighbour index and list of boolean mask of each molecule.
+        """
+        if not keep_state:
+            self.reset()
+        if len(coordinates) < len(self._states):
+            self._states = self._states[:len(coordinates)]
+        out = [self.update(x, position=i, keep_state=keep_state) for i, x in enumerate(coordinates)]
+        return [x[0] for x in out], [x[1] for x in out]
+
+    def get_config(self):
+        """Config of neighbour list."""
+        return {"cutoff": self.cutoff, "max_neighbours": self.max_neighbours, "skin": self.skin,
+                "method": self.method, "cell_list_atoms": self.cell_list_atoms}
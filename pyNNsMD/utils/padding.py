@@ -0,0 +1,106 @@
+"""
+Padding of lists of arrays with different shape to a batch array with mask, e.g. for molecules with different number
+of atoms as input of SchNet.
+
+Padding is done for the whole batch with a few numpy operations instead of a loop over molecules, so that large
+datasets can be packed at once or in chunks.
+"""
+
+import itertools
+
+import numpy as np
+
+
+def _valid_entries(shapes: np.ndarray, max_shape: np.ndarray):
+    # Boolean index of valid entries of shape (batch, ) + max_shape. In row-major order, valid entries of each sample
+    # match the order of the flattened arrays.
+    num_dims = len(max_shape)
+    valid = np.ones((len(shapes),) + tuple([int(x) for x in max_shape]), dtype="bool")
+    for i in range(num_dims):
+        valid_dim = np.arange(max_shape[i]) < shapes[:, i:i + 1]
+        valid &= np.reshape(valid_dim, (len(shapes),) + (1,) * i + (int(max_shape[i]),) + (1,) * (num_dims - i - 1))
+    return valid
+
+
+def pad_batch(values: list, max_shape: tuple = None, dtype=None, chunk_size: int = None):
+    """Pad arrays to a common shape and stack them along a new batch dimension.
+
+    Arrays of the same shape are only stacked. Otherwise, the arrays are concatenated and written with a single
+    boolean index of the valid entries, which is also the mask.
+
+    Args:
+        values (list): List of arrays with the same number of dimensions, e.g. coordinates of shape (atoms, 3).
+        max_shape (tuple): Shape to pad each array to. Default is None, which uses the largest shape of `values`.
+        dtype (str): Dtype of the padded array. Default is None, which uses the dtype of the first array.
+        chunk_size (int): Number of arrays that are processed at once, to limit temporary memory for large
+            datasets. Default is None.
+
+    Returns:
+        tuple: Padded array of shape (batch, ) + max_shape and boolean mask of the same shape.
+    """
+    values = [np.asarray(x) for x in values]
+    if len(values) == 0:
+        raise ValueError("Can not pad an empty list of arrays.")
+    shape_list = [x.shape for x in values]
+    num_dims = len(shape_list[0])
+    if len(set([len(x) for x in set(shape_list)])) > 1:
+        raise ValueError("Arrays must have the same number of dimensions for padding.")
+    shapes = np.fromiter(itertools.chain.from_iterable(shape_list), dtype="int64", count=len(values) * num_dims)
+    shapes = np.reshape(shapes, (len(values), num_dims))
+    max_shape = np.amax(shapes, axis=0) if max_shape is None else np.array(max_shape, dtype="int64")
+    if np.any(shapes > max_shape):
+        raise ValueError("Arrays of shape %s exceed padded shape %s." % (np.amax(shapes, axis=0), max_shape))
+    dtype = values[0].dtype if dtype is None else dtype
+    final_shape = (len(values),) + tuple([int(x) for x in max_shape])
+    chunk_size = len(values) if chunk_size is None else int(chunk_size)
+
+    # Fast path for arrays of the same shape, e.g. molecules with fixed number of atoms.
+    if len(set(shape_list)) == 1 and shape_list[0] == final_shape[1:]:
+        if chunk_size >= len(values):
+            return np.array(values, dtype=dtype), np.ones(final_shape, dtype="bool")
+        padded = np.empty(final_shape, dtype=dtype)
+        for start in range(0, len(values), chunk_size):
+            padded[start:start + chunk_size] = np.array(values[start:start + chunk_size], dtype=dtype)
+        return padded, np.ones(final_shape, dtype="bool")
+
+    # If only the first dimension differs, e.g. number of atoms, arrays can be concatenated without flattening.
+    num_valid_dims = 1 if num_dims > 0 and np.all(shapes[:, 1:] == max_shape[1:]) else num_dims
+    padded = np.zeros(final_shape, dtype=dtype)
+    mask = np.empty(final_shape, dtype="bool")
+    for start in range(0, len(values), chunk_size):
+        end = start + chunk_size
+        valid = _valid_entries(shapes[start:end, :num_valid_dims], max_shape[:num_valid_dims])
+        if num_valid_dims == num_dims:
+            padded[start:end][valid] = np.concatenate([np.ravel(x) for x in values[start:end]])
+        else:
+            padded[start:end][valid] = np.concatenate(values[start:end], axis=0)
+        mask[start:end] = np.reshape(valid, valid.shape + (1,) * (num_dims - num_valid_dims))
+    return padded, mask
+
+
+def pack_schnet_input(atoms: list, coordinates: list, edge_indices: list, edge_masks: list, chunk_size: int = None,
+                      num_atoms: int = None, num_neighbours: int = None):
+    """Pad atoms, coordinates and neighbour indices of molecules to the input of the padded SchNet model.
+
+    Args:
+        atoms (list): Atomic numbers of each molecule of shape (atoms, ).
+        coordinates (list): Coordinates of each molecule of shape (atoms, 3).
+        edge_indices (list): Neighbour index of each atom of shape (atoms, neighbours).
+        edge_masks (list): Boolean mask of neighbours of shape (atoms, neighbours).
+        chunk_size (int): Maximum number of molecules that are stacked at once. Default is None.
+        num_atoms (int): Number of atoms to pad to. Default is None, which uses the largest molecule.
+        num_neighbours (int): Number of neighbours to pad to. Default is None, which uses the largest neighbour list.
+
+    Returns:
+        list: Padded `[coordinates, atoms, edge_indices, node_mask, edge_mask]` with masks of shape
+            (batch, atoms, 1) and (batch, atoms, neighbours, 1).
+    """
+    if num_atoms is None:
+        num_atoms = max([len(x) for x in atoms])
+    if num_neighbours is None:
+        num_neighbours = max([np.shape(x)[1] for x in edge_indices])
+    n, mask_n = pad_batch(atoms, max_shape=(num_atoms,), chunk_size=chunk_size)
+    pos, _ = pad_batch(coordinates, max_shape=(num_atoms, 3), chunk_size=chunk_size)
+    edi, _ = pad_batch(edge_indices, max_shape=(num_atoms, num_neighbours), chunk_size=chunk_size)
+    mask_e, _ = pad_batch(edge_masks, max_shape=(num_atoms, num_neighbours), chunk_size=chunk_size)
+    return [pos, n, edi, np.expand_dims(mask_n, axis=-1), np.expand_dims(mask_e, axis=-1)]
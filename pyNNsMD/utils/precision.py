@@ -0,0 +1,73 @@
+"""
+Precision modes of models, which set the keras dtype policy of their layers.
+
+Features, outputs and gradients with respect to coordinates are computed in float32, or in float64 for "float64".
+For "mixed_bfloat16" and "mixed_float16", only the hidden layers of the networks compute in 16-bit with float32
+variables, following keras mixed precision. Keras layers create their sublayers in `__init__` with the global
+policy, so that layers are created within :obj:`precision_scope`.
+
+.. code-block:: python
+
+    hidden_policy, io_dtype = get_precision_policy("mixed_bfloat16")
+    with precision_scope(hidden_policy):
+        mlp_layer = MLP(100)
+
+"""
+
+import contextlib
+
+import tensorflow as tf
+
+PRECISION_MODES = ["float32", "float64", "mixed_bfloat16", "mixed_float16"]
+
+
+def get_precision_policy(precision: str = "float32"):
+    """Dtype policy of hidden layers and dtype of input and output for a precision mode.
+
+    Args:
+        precision (str): Precision mode in :obj:`PRECISION_MODES`. Default is "float32".
+
+    Returns:
+        tuple: Policy name for hidden layers and dtype for features and output. Both are None for "float32", which
+            keeps the global policy.
+    """
+    if precision is None or precision == "float32":
+        return None, None
+    if precision not in PRECISION_MODES:
+        raise ValueError("Unknown precision mode %s, must be in %s." % (precision, PRECISION_MODES))
+    if precision == "float64":
+        return "float64", "float64"
+    return precision, "float32"
+
+
+@contextlib.contextmanager
+def precision_scope(policy=None):
+    """Context to create layers with a dtype policy.
+
+    Args:
+        policy (str): Name of keras dtype policy. Default is None, which does not change the global policy.
+    """
+    if policy is None:
+        yield
+        return
+    previous = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy(policy)
+    try:
+        yield
+    finally:
+        tf.keras.mixed_precision.set_global_policy(previous)
+
+
+def get_precision_optimizer(optimizer, precision: str = "float32"):
+    """Wrap optimizer with dynamic loss scaling for "mixed_float16", which is not required for bfloat16.
+
+    Args:
+        optimizer (ks.optimizers.Optimizer): Optimizer.
+        precision (str): Precision mode of the model. Default is "float32".
+
+    Returns:
+        ks.optimizers.Optimizer: Optimizer for training.
+    """
+    if precision == "mixed_float16" and not isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer):
+        return tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+    return optimizer
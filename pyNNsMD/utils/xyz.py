@@ -0,0 +1,295 @@
+"""
+Reading and writing of xyz-files with numpy arrays.
+
+The file is streamed in chunks of frames. The atom lines of all frames of a chunk are parsed at once by
+:obj:`np.loadtxt`, so that there is no python loop over atoms. Files of a fixed number of atoms can be read into
+arrays of shape `(frames, atoms, 3)` or converted to memory-mapped `.npy` files with bounded memory, files of
+different molecules into a list of arrays for each frame.
+The writer formats all frames of a chunk with a single string formatting operation.
+
+.. code-block:: python
+
+    elements, coordinates, comments = read_xyz_arrays("geometries.xyz")
+    write_xyz_file("copy.xyz", elements, coordinates, comments)
+
+"""
+
+import logging
+from itertools import islice
+
+import numpy as np
+
+module_logger = logging.getLogger(__name__)
+
+
+def _parse_atom_lines(lines: list, delimiter: str = None):
+    """Parse atom lines of the form `element x y z` into element symbols and coordinates."""
+    if delimiter is not None:
+        lines = [line.replace(delimiter, " ") for line in lines]
+    if len(lines[0].split()) != 4:
+        raise ValueError("Expected atom lines with element and three coordinates, but got '%s'." % lines[0].strip())
+    elements = np.array([line.split(None, 1)[0] for line in lines])
+    # Element symbols are capitalized for each unique symbol only.
+    unique, inverse = np.unique(elements, return_inverse=True)
+    elements = np.char.capitalize(unique)[inverse]
+    coordinates = np.loadtxt(lines, usecols=(1, 2, 3), dtype="float64", ndmin=2)
+    return elements, coordinates
+
+
+def _iter_xyz_flat(file_path: str, chunk_frames: int = 4096, delimiter: str = None):
+    """Yield flat elements and coordinates of all atoms of a chunk of frames with their atom counts and comments."""
+    with open(file_path, "r") as infile:
+        atom_lines, counts, comments = [], [], []
+        for line in infile:
+            count_line = line.strip() if delimiter is None else line.replace(delimiter, " ").strip()
+            if count_line == "":
+                module_logger.warning("Empty line in xyz file for mismatch in atom count found.")
+                continue
+            num = int(count_line)
+            comments.append(next(infile, "").rstrip("\n"))
+            block = list(islice(infile, num))
+            if len(block) != num:
+                raise ValueError("Expected %s atom lines, but xyz file ends after %s." % (num, len(block)))
+            atom_lines.extend(block)
+            counts.append(num)
+            if len(counts) >= chunk_frames:
+                yield _parse_atom_lines(atom_lines, delimiter) + (np.array(counts), comments)
+                atom_lines, counts, comments = [], [], []
+        if len(counts) > 0:
+            yield _parse_atom_lines(atom_lines, delimiter) + (np.array(counts), comments)
+
+
+def iter_xyz_chunks(file_path: str, chunk_frames: int = 4096, delimiter: str = None):
+    """Read a xyz-file in chunks of frames, which may have different number of atoms.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        chunk_frames (int): Number of frames that are parsed at once. Default is 4096.
+        delimiter (str): Delimiter of atom lines. Default is None, which splits at whitespace.
+
+    Yields:
+        tuple: List of element arrays, list of coordinate arrays of shape `(atoms, 3)` and list of comments for
+            each frame of the chunk.
+    """
+    for elements, coordinates, counts, comments in _iter_xyz_flat(file_path, chunk_frames, delimiter):
+        split_index = np.cumsum(counts)[:-1]
+        yield np.split(elements, split_index), np.split(coordinates, split_index), comments
+
+
+def iter_xyz_blocks(file_path: str, block_size: int = 4096, delimiter: str = None):
+    """Read a xyz-file with the same number of atoms in every frame in blocks of frames.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        block_size (int): Number of frames of each block. The last block can be smaller. Default is 4096.
+        delimiter (str): Delimiter of atom lines. Default is None, which splits at whitespace.
+
+    Yields:
+        tuple: Elements of shape `(block, atoms)`, coordinates of shape `(block, atoms, 3)` and list of comments.
+    """
+    num_atoms = None
+    for elements, coordinates, counts, comments in _iter_xyz_flat(file_path, block_size, delimiter):
+        num_atoms = counts[0] if num_atoms is None else num_atoms
+        if np.any(counts != num_atoms):
+            raise ValueError("Frames of xyz file have different number of atoms, use `iter_xyz_chunks()`.")
+        yield (np.reshape(elements, (len(counts), num_atoms)), np.reshape(coordinates, (len(counts), num_atoms, 3)),
+               comments)
+
+
+def count_xyz_frames(file_path: str, delimiter: str = None):
+    """Number of frames and atoms of a xyz-file with the same number of atoms in every frame.
+
+    Only the first line is parsed, the number of frames follows from the number of lines of the file.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        delimiter (str): Delimiter of atom lines. Default is None, which splits at whitespace.
+
+    Returns:
+        tuple: Number of frames and number of atoms.
+    """
+    with open(file_path, "r") as infile:
+        first_line = infile.readline()
+    if first_line.strip() == "":
+        return 0, 0
+    num_atoms = int(first_line.strip() if delimiter is None else first_line.replace(delimiter, " ").strip())
+    num_lines, last_char = 0, b"\n"
+    with open(file_path, "rb") as infile:
+        for block in iter(lambda: infile.read(2 ** 24), b""):
+            num_lines += block.count(b"\n")
+            last_char = block[-1:]
+    num_lines += 1 if last_char != b"\n" else 0
+    if num_lines % (num_atoms + 2) != 0:
+        raise ValueError("Number of lines %s of xyz file does not match frames of %s atoms." % (num_lines, num_atoms))
+    return num_lines // (num_atoms + 2), num_atoms
+
+
+def _read_xyz_into(file_path: str, allocate, block_size: int, delimiter: str, dtype, keep_comments: bool):
+    """Read blocks of frames into arrays from `allocate(name, shape, dtype)`, which may also return None."""
+    num_frames, num_atoms = count_xyz_frames(file_path, delimiter)
+    coordinates = allocate("coordinates", (num_frames, num_atoms, 3), dtype)
+    elements = None
+    comments = []
+    start = 0
+    for elements_block, coordinates_block, comments_block in iter_xyz_blocks(file_path, block_size, delimiter):
+        end = start + len(coordinates_block)
+        if coordinates_block.shape[1] != num_atoms or end > num_frames:
+            raise ValueError("Expected %s frames of %s atoms in xyz file." % (num_frames, num_atoms))
+        if elements is None:
+            # Symbols of up to three characters fit, e.g. if the first block only has 'H' and 'C'.
+            elements = allocate("elements", (num_frames, num_atoms),
+                                "U%i" % max(elements_block.dtype.itemsize // 4, 3))
+        if elements is not None:
+            if elements_block.dtype.itemsize > elements.dtype.itemsize:
+                raise ValueError("Element symbols are longer than %s." % elements.dtype)
+            elements[start:end] = elements_block
+        if coordinates is not None:
+            coordinates[start:end] = coordinates_block
+        if keep_comments:
+            comments.extend(comments_block)
+        start = end
+    if start != num_frames:
+        raise ValueError("Expected %s frames of %s atoms in xyz file, but got %s." % (num_frames, num_atoms, start))
+    if elements is None:
+        elements = allocate("elements", (num_frames, num_atoms), "U3")
+    return elements, coordinates, comments
+
+
+def read_xyz_arrays(file_path: str, chunk_frames: int = 4096, delimiter: str = None, dtype="float64"):
+    """Read a xyz-file with the same number of atoms in every frame into arrays.
+
+    The arrays are allocated from the number of lines of the file and filled in chunks of frames, so that there is
+    no second copy of the coordinates.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        chunk_frames (int): Number of frames that are parsed at once. Default is 4096.
+        delimiter (str): Delimiter of atom lines. Default is None, which splits at whitespace.
+        dtype: Dtype of coordinates. Default is "float64".
+
+    Returns:
+        tuple: Elements of shape `(frames, atoms)`, coordinates of shape `(frames, atoms, 3)` and list of comments.
+    """
+    return _read_xyz_into(file_path, lambda name, shape, dtype_i: np.empty(shape, dtype=dtype_i),
+                          chunk_frames, delimiter, dtype, keep_comments=True)
+
+
+def convert_xyz_to_npy(file_path: str, coordinates_path: str, elements_path: str = None, chunk_frames: int = 4096,
+                       delimiter: str = None, dtype="float64"):
+    """Convert a xyz-file with the same number of atoms in every frame to memory-mapped `.npy` files.
+
+    The `.npy` files are allocated first and filled in chunks of frames, so that peak memory is a single chunk
+    independent of the size of the file. Comments are not kept.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        coordinates_path (str): Path of `.npy` file of coordinates of shape `(frames, atoms, 3)`.
+        elements_path (str): Path of `.npy` file of elements of shape `(frames, atoms)`. Default is None, which does
+            not save elements.
+        chunk_frames (int): Number of frames that are parsed at once. Default is 4096.
+        delimiter (str): Delimiter of atom lines. Default is None, which splits at whitespace.
+        dtype: Dtype of coordinates. Default is "float64".
+
+    Returns:
+        tuple: Memory-mapped elements, or None if `elements_path` is None, and coordinates.
+    """
+    paths = {"coordinates": coordinates_path, "elements": elements_path}
+
+    def allocate(name, shape, dtype_i):
+        if paths[name] is None:
+            return None
+        return np.lib.format.open_memmap(paths[name], mode="w+", dtype=dtype_i, shape=shape)
+
+    elements, coordinates, _ = _read_xyz_into(file_path, allocate, chunk_frames, delimiter, dtype,
+                                              keep_comments=False)
+    for x in [elements, coordinates]:
+        if x is not None:
+            x.flush()
+    return elements, coordinates
+
+
+def format_xyz_frame(elements, coordinates, comment: str = "", fmt: str = "%.10f"):
+    """Format a single frame as xyz-string.
+
+    Args:
+        elements (list): Element symbols of shape `(atoms, )`.
+        coordinates (list): Coordinates of shape `(atoms, 3)`. Other number of columns are formatted as well.
+        comment (str): Comment for comment line. Default is "".
+        fmt (str): Format of each coordinate. Default is "%.10f".
+
+    Returns:
+        str: Frame in xyz format.
+    """
+    coordinates = np.asarray(coordinates, dtype="float64")
+    if len(elements) != len(coordinates):
+        raise ValueError("Number of atoms does not match number of coordinates for xyz string.")
+    if "\n" in comment:
+        raise ValueError("Line break must not be in the comment line for xyz string.")
+    num_columns = coordinates.shape[1] if coordinates.ndim > 1 else 0
+    values = np.empty((len(elements), num_columns + 1), dtype="object")
+    values[:, 0] = [str(x) for x in elements]
+    values[:, 1:] = np.reshape(coordinates, (len(elements), num_columns)).tolist()
+    line_format = "%s" + (" " + fmt) * num_columns + "\n"
+    return "%i\n%s\n" % (len(elements), comment) + (line_format * len(elements)) % tuple(values.ravel())
+
+
+def format_xyz_frames(elements, coordinates, comments: list = None, fmt: str = "%.10f"):
+    """Format frames with the same number of atoms as xyz-string with a single string formatting operation.
+
+    Args:
+        elements (np.ndarray): Element symbols of shape `(frames, atoms)` or `(atoms, )` for all frames.
+        coordinates (np.ndarray): Coordinates of shape `(frames, atoms, 3)`.
+        comments (list): Comment of each frame. Default is None, which writes empty comments.
+        fmt (str): Format of each coordinate. Default is "%.10f".
+
+    Returns:
+        str: Frames in xyz format.
+    """
+    coordinates = np.asarray(coordinates, dtype="float64")
+    num_frames, num_atoms, num_columns = coordinates.shape
+    elements = np.broadcast_to(np.asarray(elements, dtype="str"), (num_frames, num_atoms))
+    comments = [""] * num_frames if comments is None else list(comments)
+    if any(["\n" in x for x in comments]):
+        raise ValueError("Line break must not be in the comment line for xyz string.")
+    atom_values = np.empty((num_frames, num_atoms, num_columns + 1), dtype="object")
+    atom_values[:, :, 0] = elements
+    atom_values[:, :, 1:] = coordinates.tolist()
+    values = np.empty((num_frames, 2 + num_atoms * (num_columns + 1)), dtype="object")
+    values[:, 0] = num_atoms
+    values[:, 1] = comments
+    values[:, 2:] = atom_values.reshape((num_frames, -1))
+    frame_format = "%i\n%s\n" + ("%s" + (" " + fmt) * num_columns + "\n") * num_atoms
+    return (frame_format * num_frames) % tuple(values.ravel())
+
+
+def write_xyz_file(file_path: str, elements, coordinates, comments: list = None, fmt: str = "%.10f",
+                   chunk_frames: int = 4096, mode: str = "w"):
+    """Write frames to a xyz-file.
+
+    Arrays of coordinates of shape `(frames, atoms, 3)` are formatted in chunks by :obj:`format_xyz_frames`,
+    otherwise each frame is formatted by :obj:`format_xyz_frame`.
+
+    Args:
+        file_path (str): Path to xyz-file.
+        elements (list): Element symbols of each frame, or of shape `(atoms, )` for all frames.
+        coordinates (list): Coordinates of each frame as array of shape `(frames, atoms, 3)` or list of arrays.
+        comments (list): Comment of each frame. Default is None, which writes empty comments.
+        fmt (str): Format of each coordinate. Default is "%.10f".
+        chunk_frames (int): Number of frames that are written at once. Default is 4096.
+        mode (str): File mode, e.g. "a" to append. Default is "w".
+    """
+    num_frames = len(coordinates)
+    shared_elements = len(elements) > 0 and isinstance(elements[0], str)
+    fixed_size = isinstance(coordinates, np.ndarray) and coordinates.ndim == 3 and (
+        shared_elements or isinstance(elements, np.ndarray))
+    with open(file_path, mode) as outfile:
+        for start in range(0, num_frames, chunk_frames):
+            end = min(start + chunk_frames, num_frames)
+            if fixed_size:
+                outfile.write(format_xyz_frames(
+                    elements if shared_elements else elements[start:end], coordinates[start:end],
+                    comments=None if comments is None else comments[start:end], fmt=fmt))
+                continue
+            outfile.write("".join([format_xyz_frame(
+                elements if shared_elements else elements[i], coordinates[i],
+                comment="" if comments is None else comments[i], fmt=fmt) for i in range(start, end)]))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from pyNNsMD.utils.neighbors import NeighborList
+
+
+def _make_coordinates(num_samples, num_atoms=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.0, 4.0, size=(num_samples, num_atoms, 3))
+
+
+def test_no_state_for_zero_skin():
+    neighbors = NeighborList(cutoff=3.0, max_neighbours=4, skin=0.0)
+    neighbors(_make_coordinates(1000))
+    assert len(neighbors._states) == 0
+
+
+def test_no_state_for_dataset_prediction():
+    neighbors = NeighborList(cutoff=3.0, max_neighbours=4, skin=1.0)
+    trajectories = _make_coordinates(4)
+    neighbors(trajectories)
+    assert len(neighbors._states) == 4
+    index, mask = neighbors(_make_coordinates(1000, seed=1), keep_state=False)
+    assert len(index) == 1000 and len(mask) == 1000
+    assert len(neighbors._states) == 0
+
+
+def test_kept_state_matches_rebuild():
+    neighbors = NeighborList(cutoff=3.0, max_neighbours=4, skin=1.0)
+    reference = NeighborList(cutoff=3.0, max_neighbours=4, skin=0.0)
+    x = _make_coordinates(4)
+    neighbors(x)
+    x_step = x + 0.01
+    index, mask = neighbors(x_step)
+    index_ref, mask_ref = reference(x_step)
+    assert neighbors.num_builds == 4
+    for i, m, i_ref, m_ref in zip(index, mask, index_ref, mask_ref):
+        assert np.array_equal(m, m_ref)
+        assert np.array_equal(i[m], i_ref[m_ref])
+
+
+def test_schnet_predict_keeps_no_state():
+    pytest.importorskip("kgcnn")
+    from pyNNsMD.models.schnet_eg import SchNetEnergy
+    from pyNNsMD.hypers.hyper_schnet_e import DEFAULT_HYPER_PARAM_SCHNET_E
+    config = dict(DEFAULT_HYPER_PARAM_SCHNET_E["model"]["config"])
+    config["neighbor_args"] = {"skin": 1.0, "method": "auto"}
+    model = SchNetEnergy(**config)
+    coords = list(_make_coordinates(1000))
+    atoms = [np.ones(len(x), dtype="int64") for x in coords]
+    model.call_to_tensor_input([atoms[:2], coords[:2]])
+    assert len(model.neighbor_list._states) == 2
+    model.predict_to_tensor_input([atoms, coords])
+    assert len(model.neighbor_list._states) == 0
@@ -0,0 +1,62 @@
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from pyNNsMD.serve import EnsembleServer, InferenceClient, make_ensemble_function
+from pyNNsMD.src.batching import DynamicBatcher
+from pyNNsMD.src.shared import SharedMemoryServer, SharedMemoryClient
+
+
+class Float64Ensemble:
+    """Ensemble with precision "float64" that returns a sum of coordinates, which is not exact in float32."""
+
+    def _get_fused_dtype(self):
+        return tf.float64
+
+    def call_fused(self, x):
+        if x.dtype != np.float64:
+            raise TypeError("Expected float64 coordinates, got %s." % x.dtype)
+        energy = np.sum(x, axis=(1, 2))[:, None]
+        return [energy, -x], [np.zeros_like(energy), np.zeros_like(x)], []
+
+
+def _make_geometry():
+    return np.array([[[1.0 + 1e-12, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1e-10]]])
+
+
+def test_socket_float64_round_trip(tmp_path):
+    ensemble = Float64Ensemble()
+    batcher = DynamicBatcher(make_ensemble_function(ensemble), max_batch_size=4, batch_timeout=0.001).start()
+    socket_path = os.path.join(str(tmp_path), "nnsmd.sock")
+    server = EnsembleServer(socket_path, batcher, input_shape=(3, 3), dtype="float64")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        x = _make_geometry()
+        with InferenceClient(socket_path) as client:
+            assert client.dtype == np.float64
+            (energy, gradient), _ = client.call(x)
+        assert energy.dtype == np.float64 and gradient.dtype == np.float64
+        assert np.array_equal(energy, np.sum(x, axis=(1, 2))[:, None])
+        assert np.array_equal(gradient, -x)
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.stop()
+
+
+def test_shared_memory_float64_round_trip():
+    server = SharedMemoryServer(Float64Ensemble(), slots=2, atoms=3).start()
+    client = SharedMemoryClient(server.name, slot=1)
+    try:
+        x = _make_geometry()[0]
+        assert client.geometry.dtype == np.float64
+        (energy, gradient), _ = client.call(x, timeout=10.0)
+        assert energy.dtype == np.float64
+        assert np.array_equal(energy, [np.sum(x)])
+        assert np.array_equal(gradient, -x)
+    finally:
+        client.close()
+        server.close()